@@ -5,12 +5,25 @@ import wave
 from flask import Blueprint, Response, jsonify, request, send_file
 from modules.api_service import ApiService, submit_to_services
 from modules.audio_stream_io import read_audio_file_to_numpy, save_numpy_as_audio_file
-from modules.segmentation import Preset, segment_file
+from modules.feature_store import FeatureStore
+from modules.pcm_cache import PcmCache
+from modules.segmentation import (
+    SPECTRAL_PRESETS,
+    Preset,
+    segment_file,
+    segment_file_coarse_to_fine,
+    segment_file_presets,
+)
 from pathvalidate import sanitize_filename
 from utils.file_name_formatter import format_file_name
+from utils.logger import log_info
 
 audio_bp = Blueprint("audio", __name__)
 
+pcm_cache = PcmCache()
+"""Decoded files, shared by all requests. Splitting a file writes it to the cache, so
+identifying, previewing and storing its segments reads them without decoding them again."""
+
 
 @audio_bp.route("/split", methods=["POST"])
 def split():
@@ -27,10 +40,44 @@ def split():
     if not os.path.exists(file_path):
         return "BE.FILE_NOT_EXIST", 400
 
-    generator = segment_file(file_path, preset)
-    segments, mismatch_offsets = ApiService().identify_all_from_generator(
+    coarse_to_fine = data.get("coarseToFine", False)
+    beat_sync = data.get("beatSync", False)
+    # segment_file_coarse_to_fine only compares frames
+    if coarse_to_fine and beat_sync:
+        return "BE.INCOMPATIBLE_OPTIONS", 400
+
+    stats = {}
+    # long recordings are cheaper to segment in two stages, see segment_file_coarse_to_fine
+    if coarse_to_fine:
+        generator = segment_file_coarse_to_fine(
+            file_path,
+            preset,
+            stats=stats,
+            feature_store=FeatureStore(),
+            pcm_cache=pcm_cache,
+        )
+    else:
+        generator = segment_file(
+            file_path,
+            preset,
+            stats=stats,
+            feature_store=FeatureStore(),
+            beat_sync=beat_sync,
+            pcm_cache=pcm_cache,
+        )
+    segments, mismatch_offsets = ApiService(pcm_cache).identify_all_from_generator(
         generator, file_path
     )
+    # the stall times are missing if the features were loaded from the feature store
+    if "decode_stall" in stats:
+        log_info(
+            f"Split '{file_path}': waited {stats['decode_stall']:.2f}s for decoding, "
+            f"decoder waited {stats['compute_stall']:.2f}s for analysis"
+        )
+    if "refined_share" in stats:
+        log_info(
+            f"Split '{file_path}': refined {stats['refined_share']:.1%} of the file"
+        )
 
     result = {
         "segments": segments,
@@ -40,6 +87,45 @@ def split():
     return jsonify(result)
 
 
+@audio_bp.route("/split-presets", methods=["POST"])
+def split_presets():
+    """Split the provided file with several presets at once, without identifying the segments.
+    The file is only analysed once, so switching between the presets needs no new analysis.
+    This uses the logic from ``modules.segmentation``.
+
+    :returns: The segments for every preset as a JSON, if the file path and presets are valid.
+        A 400 error otherwise.
+    """
+    data = request.json
+    file_path = data["filePath"]
+    preset_names = data.get("presetNames", [preset.name for preset in SPECTRAL_PRESETS])
+    if not all(name in Preset.__members__ for name in preset_names):
+        return "BE.INVALID_PRESET", 400
+
+    if not os.path.exists(file_path):
+        return "BE.FILE_NOT_EXIST", 400
+
+    segments = segment_file_presets(
+        file_path,
+        [Preset[name] for name in preset_names],
+        feature_store=FeatureStore(),
+        beat_sync=data.get("beatSync", False),
+        pcm_cache=pcm_cache,
+    )
+
+    result = {
+        "presets": {
+            preset.name: [
+                {"offset": offset, "duration": duration}
+                for offset, duration in preset_segments
+            ]
+            for preset, preset_segments in segments.items()
+        }
+    }
+
+    return jsonify(result)
+
+
 @audio_bp.route("/get-segment", methods=["POST"])
 def get_segment():
     """Get the given segment of the provided file's audio.
@@ -59,7 +145,12 @@ def get_segment():
         return "BE.INVALID_OFFSET_DURATION", 400
 
     audio_data, sample_rate = read_audio_file_to_numpy(
-        file_path, mono=False, offset=offset, duration=duration, sample_rate=None
+        file_path,
+        mono=False,
+        offset=offset,
+        duration=duration,
+        sample_rate=None,
+        pcm_cache=pcm_cache,
     )
     audio_data = (audio_data * (2**15 - 1)).astype("<i2")
 
@@ -123,7 +214,12 @@ def store():
         return "BE.INVALID_OFFSET_DURATION", 400
 
     audio_data, sample_rate = read_audio_file_to_numpy(
-        file_path, mono=False, offset=offset, duration=duration, sample_rate=None
+        file_path,
+        mono=False,
+        offset=offset,
+        duration=duration,
+        sample_rate=None,
+        pcm_cache=pcm_cache,
     )
     save_numpy_as_audio_file(
         audio_data,
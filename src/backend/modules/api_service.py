@@ -9,7 +9,7 @@ from acoustid import (
     NoBackendError,
     WebServiceError,
 )
-from modules.audio_stream_io import read_audio_file_to_numpy
+from modules.audio_stream_io import AudioSegment
 from requests import exceptions
 from utils.env import get_env
 from utils.logger import log_error
@@ -57,12 +57,6 @@ EMPTY_METADATA_OPTIONS = [
 Constant defining empty metadata options.
 """
 
-SAMPLE_RATE_STANDARD = 44100
-"""
-Constant defining the standard sample rate of 44100Hz.
-Songs must be loaded at this sample rate for the Shazam API to work.
-"""
-
 
 def submit_to_services(file_name, metadata):
     """Logic to submit a song to song recognition APIs that allow submissions in order to
@@ -218,6 +212,13 @@ class ApiService:
         ]
     """
 
+    def __init__(self, pcm_cache=None):
+        """
+        :param pcm_cache: The :class:`modules.pcm_cache.PcmCache` to read segments through, or
+            None to decode them. (default: None)
+        """
+        self.pcm_cache = pcm_cache
+
     def identify_all_from_generator(
         self, generator: Generator[tuple, float, float], file_path: (str, str)
     ):
@@ -410,6 +411,10 @@ class ApiService:
         added, is irrelevant, although it would be best practice to order them by cost per request
         so as to limit fees for users.
 
+        The segment is never decoded as a whole. Every API reads the parts it needs in the format
+        it declares (``modules.apis.acoustid.FINGERPRINT_FORMAT``,
+        ``modules.apis.shazam.AUDIO_FORMAT``) from an :class:`modules.audio_stream_io.AudioSegment`.
+
         :param offset: The offset at which the segment begins, in seconds.
         :param duration: The duration of the segment, in seconds.
         :param file_path: The path to the analyzed file.
@@ -419,24 +424,28 @@ class ApiService:
             ConnectionErrors are caught within the function, but other errors are not.
             A detailed list of Exceptions ``requests`` can raise can be found at https://docs.python-requests.org/en/latest/user/quickstart/#errors-and-exceptions
         """
-        sample_rate = SAMPLE_RATE_STANDARD
-        song_data, sample_rate = read_audio_file_to_numpy(
-            file_path,
-            mono=False,
-            offset=offset,
-            duration=duration,
-            sample_rate=sample_rate,
-        )
+        with AudioSegment(file_path, offset, duration, self.pcm_cache) as segment:
+            return self._identify_segment(segment)
+
+    def _identify_segment(self, segment: AudioSegment):
+        """Identify a segment, see ``get_song_options``.
 
+        :param segment: The segment to identify.
+        :returns: ``SongOptionResult`` indicating the new state of the service.
+        """
+        offset, duration = segment.offset, segment.duration
         ACOUSTID_API_KEY = get_env("SERVICE_ACOUSTID_API_KEY")
         SHAZAM_API_KEY = get_env("SERVICE_SHAZAM_API_KEY")
 
         # first check using acoustID
         if ACOUSTID_API_KEY is not None:
             try:
-                duration, fingerprint = modules.apis.acoustid.create_fingerprint(
-                    song_data, sample_rate
+                fingerprint_format = modules.apis.acoustid.FINGERPRINT_FORMAT
+                _, fingerprint = modules.apis.acoustid.create_fingerprint(
+                    segment.read(fingerprint_format), fingerprint_format.sample_rate
                 )
+                # only the start of the segment was fingerprinted, but AcoustID compares
+                # the duration of the whole song
                 metadata = modules.apis.acoustid.lookup(
                     fingerprint, duration, ACOUSTID_API_KEY
                 )
@@ -452,14 +461,13 @@ class ApiService:
                 log_error(ex, "AcoustID request")
 
         # if acoustID doesn't find anything, try shazam
-        # If sample_rate inexplicably becomes something other than 44100Hz, shazam won't work
-        if SHAZAM_API_KEY is not None and sample_rate == SAMPLE_RATE_STANDARD:
+        if SHAZAM_API_KEY is not None:
             try:
-                metadata_start = modules.apis.shazam.lookup(
-                    song_data, SHAZAM_API_KEY, True
+                metadata_start = modules.apis.shazam.lookup_segment(
+                    segment, SHAZAM_API_KEY, True
                 )
-                metadata_end = modules.apis.shazam.lookup(
-                    song_data, SHAZAM_API_KEY, False
+                metadata_end = modules.apis.shazam.lookup_segment(
+                    segment, SHAZAM_API_KEY, False
                 )
                 metadata_start = [metadata_start] if metadata_start is not None else []
                 metadata_end = [metadata_end] if metadata_end is not None else []
@@ -8,12 +8,19 @@ this module will use the exception classes from ``acoustid``.
 """
 
 import os
+import subprocess
+import tempfile
 
 import acoustid
+import numpy as np
 import utils.list_helper
-from modules.audio_stream_io import save_numpy_as_audio_file
+from modules.audio_stream_io import AudioFormat, save_numpy_as_audio_file
 from utils.logger import log_error
 
+FINGERPRINT_FORMAT = AudioFormat(11025, 1, 120)
+"""The audio fingerprints are created from. Chromaprint converts audio to mono at 11025 Hz
+before fingerprinting it, and fpcalc only fingerprints the first 120 seconds."""
+
 METADATA_ALL = ["tracks", "recordings", "releasegroups"]
 """The metadata to query from the AcoustID API.
     * "tracks" offers the track title.
@@ -34,35 +41,117 @@ This is used to prevent duplicate submissions to the AcoustID database.
 def create_fingerprint(song_data, samplerate):
     """Create a chromaprint/AcoustID fingerprint for the given audio data
     in order to identify it using AcoustID.
-    As of current, this works by writing the data to a temporary file
-    and using the fpcalc command line tool to generate the fingerprint.
-    The temporary file is deleted immediately afterwards. It is also deleted if
-    an error is thrown during fingerprinting.
 
-    TODO: If it becomes feasible to build and distribute DLL versions of chromaprint
-    for all target platforms, this should be refactored to use that instead.
+    The audio is passed to chromaprint as 16-bit PCM, without encoding it to a file first:
+
+    1. through the chromaprint library, if ``pyacoustid`` could load it (see
+       ``acoustid.have_chromaprint``)
+    2. through the fpcalc command line tool, reading the samples from its standard input
+       (fpcalc 1.4 and newer)
+    3. if that fails, by writing the data to a temporary WAV file and passing that file to fpcalc.
+       The temporary file is deleted afterwards, even if fingerprinting fails.
 
     :param song_data: the audio data to generate a fingerprint from.
     :param samplerate: the audio data's sample rate.
     :returns: (song_duration, fingerprint).
-        ``song_duration`` is measured in seconds and used for the API call to AcoustID.
-        ``fingerprint`` is generated by fpcalc.
-    :raise acoustid.NoBackendError: if fpcalc is not installed.
+        ``song_duration`` is the duration of the audio data in seconds.
+        ``fingerprint`` is generated by chromaprint.
+    :raise acoustid.NoBackendError: if neither chromaprint nor fpcalc are installed.
     :raise acoustid.FingerprintGenerationError: if fingerprint generation fails.
     """
-    filename = "TEMP_FILE_FOR_FINGERPRINTING"
-    save_numpy_as_audio_file(song_data, os.path.abspath(filename), "", rate=samplerate)
+    pcm, channels = _to_pcm16(song_data)
+    max_duration = FINGERPRINT_FORMAT.max_duration
+    if acoustid.have_chromaprint:
+        fingerprint = acoustid.fingerprint(samplerate, channels, [pcm], max_duration)
+        return (len(pcm) / (2 * channels * samplerate), fingerprint)
+
+    try:
+        return _fingerprint_pcm_fpcalc(pcm, samplerate, channels, max_duration)
+    except acoustid.NoBackendError:
+        # a FingerprintGenerationError too, but there is no fpcalc to fall back to
+        raise
+    except acoustid.FingerprintGenerationError:
+        # fpcalc versions before 1.4 can only read files
+        pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        save_numpy_as_audio_file(
+            song_data, "fingerprint", directory, rate=samplerate, extension=".wav"
+        )
+        return acoustid.fingerprint_file(
+            os.path.join(directory, "fingerprint.wav"), max_duration, force_fpcalc=True
+        )
+
+
+def _to_pcm16(song_data):
+    """Convert audio data to interleaved 16-bit little endian PCM.
+
+    :param song_data: the audio data, as floats between -1 and 1. Either mono or formatted as
+        (channels x samples).
+    :returns: (pcm, channels). ``pcm`` is the PCM data as ``bytes``.
+    """
+    song_data = np.atleast_2d(song_data)
+    samples = np.clip(song_data.T, -1, 1) * 32767
+    return samples.astype("<i2").tobytes(), song_data.shape[0]
+
 
-    filename_with_path = os.path.abspath(filename + ".mp3")
+def _fingerprint_pcm_fpcalc(pcm: bytes, samplerate: int, channels: int, max_duration):
+    """Fingerprint PCM data by piping it to fpcalc.
+
+    :param pcm: the audio data as interleaved 16-bit little endian PCM, see ``_to_pcm16``.
+    :param samplerate: the audio data's sample rate.
+    :param channels: the audio data's number of channels.
+    :param max_duration: how many seconds of the audio data to fingerprint.
+    :returns: (song_duration, fingerprint), as returned by fpcalc.
+    :raise acoustid.NoBackendError: if fpcalc is not installed.
+    :raise acoustid.FingerprintGenerationError: if fpcalc fails, e.g. as it is too old to read
+        raw audio data.
+    """
+    fpcalc = os.environ.get(acoustid.FPCALC_ENVVAR, acoustid.FPCALC_COMMAND)
+    command = [
+        fpcalc,
+        "-format",
+        "s16le",
+        "-rate",
+        str(samplerate),
+        "-channels",
+        str(channels),
+        "-length",
+        str(max_duration),
+        "-",
+    ]
     try:
-        fingerprint_duration, fingerprint = acoustid.fingerprint_file(
-            filename_with_path, force_fpcalc=True
+        process = subprocess.run(
+            command, input=pcm, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+    except FileNotFoundError as ex:
+        raise acoustid.NoBackendError("fpcalc not found") from ex
+    except OSError as ex:
+        raise acoustid.FingerprintGenerationError(
+            f"fpcalc invocation failed: {ex}"
+        ) from ex
+    if process.returncode != 0:
+        raise acoustid.FingerprintGenerationError(
+            f"fpcalc exited with status {process.returncode}"
         )
-    except Exception as e:
-        os.remove(filename_with_path)
-        raise e
-    os.remove(filename_with_path)
-    return (fingerprint_duration, fingerprint)
+    return _parse_fpcalc_output(process.stdout)
+
+
+def _parse_fpcalc_output(output: bytes):
+    """Parse the duration and fingerprint fpcalc prints.
+
+    :param output: fpcalc's standard output.
+    :returns: (song_duration, fingerprint).
+    :raise acoustid.FingerprintGenerationError: if the output is incomplete or malformed.
+    """
+    values = dict(line.split(b"=", 1) for line in output.splitlines() if b"=" in line)
+    if b"DURATION" not in values or b"FINGERPRINT" not in values:
+        raise acoustid.FingerprintGenerationError("missing fpcalc output")
+    try:
+        duration = float(values[b"DURATION"])
+    except ValueError as ex:
+        raise acoustid.FingerprintGenerationError("fpcalc duration not numeric") from ex
+    return (duration, values[b"FINGERPRINT"])
 
 
 def submit(file_name: str, metadata: dict, api_key: str, user_key: str):
@@ -131,7 +220,7 @@ def lookup(fingerprint, fingerprint_duration, api_key):
     out from the metadata options to avoid excessive clutter.
 
     :param fingerprint: the fingerprint generated using ``_create_fingerprint``.
-    :param fingerprint_duration: duration of the fingerprinted data, in seconds.
+    :param fingerprint_duration: duration of the fingerprinted song, in seconds.
     :returns: A ``list`` of ``dict`` s containing the results.
         Example::
 
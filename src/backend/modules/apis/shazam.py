@@ -11,6 +11,7 @@ import base64
 import librosa
 import numpy as np
 import requests
+from modules.audio_stream_io import AudioFormat, AudioSegment
 
 SHAZAM_URL_DETECT_V2 = "https://shazam.p.rapidapi.com/songs/v2/detect"
 """The URL to send requests to."""
@@ -18,6 +19,11 @@ LOOKUP_SEGMENTS_DURATION = 4
 """duration of segments taken from the song data to be sent to the API, in seconds."""
 LOOKUP_OFFSET_INCREMENT = 10
 """amount of time to skip to the next segment if a segment isn't recognized, in seconds."""
+SAMPLE_RATE = 44100
+"""The sample rate song data has to be sent at, in Hz."""
+AUDIO_FORMAT = AudioFormat(SAMPLE_RATE, 1, LOOKUP_SEGMENTS_DURATION)
+"""The audio :func:`lookup_segment` reads: mono segments of ``LOOKUP_SEGMENTS_DURATION``
+seconds at ``SAMPLE_RATE``."""
 
 
 def lookup(song_data: np.ndarray, apikey: str, from_start: bool = True):
@@ -70,21 +76,55 @@ def lookup(song_data: np.ndarray, apikey: str, from_start: bool = True):
 
         print(result)
     """
-    offset = 0 if from_start else -(LOOKUP_SEGMENTS_DURATION * 44100)
-
     song_data = _format_song_data(song_data)
-    length = len(song_data)
-    matches, track = _lookup_segment_with_offset(song_data, apikey, offset)
-    while len(matches) == 0:
-        offset += (LOOKUP_OFFSET_INCREMENT * 44100) * (1 if from_start else -1)
-        if (from_start and offset > length) or (not from_start and offset < -length):
-            break
+    for offset in _lookup_offsets(len(song_data), from_start):
         matches, track = _lookup_segment_with_offset(song_data, apikey, offset)
-    if len(matches) != 0:
-        return _process_lookup_response(track)
+        if len(matches) != 0:
+            return _process_lookup_response(track)
+    return None
+
+
+def lookup_segment(segment: AudioSegment, apikey: str, from_start: bool = True):
+    """Attempt to identify the given segment of an audio file using the Shazam API, like
+    :func:`lookup`. Only the parts of the segment that are sent to the API are decoded,
+    see ``AUDIO_FORMAT``.
+
+    :param segment: The :class:`modules.audio_stream_io.AudioSegment` to identify.
+    :param apikey: The Shazam API key.
+    :param from_start: Whether to take a sample from the start or end of the song.
+    :returns: the retrieved metadata as a dict, or None if no matches are found.
+    :raise requests.exceptions.RequestException: if the request fails, see :func:`lookup`.
+    """
+    length = int(segment.duration * SAMPLE_RATE)
+    for offset in _lookup_offsets(length, from_start):
+        start = offset if offset >= 0 else max(0, length + offset)
+        song_data_segment = _format_song_data(
+            segment.read(AUDIO_FORMAT, start / SAMPLE_RATE, LOOKUP_SEGMENTS_DURATION)
+        )
+        matches, track = _lookup_song_data_segment(song_data_segment, apikey)
+        if len(matches) != 0:
+            return _process_lookup_response(track)
     return None
 
 
+def _lookup_offsets(length: int, from_start: bool):
+    """Generate the offsets of the segments to look up, until the song ends.
+    Looking up from the end, offsets are negative and the first segment ends at the song's end.
+
+    :param length: The length of the song data, in samples.
+    :param from_start: Whether to step through the song from its start or its end.
+    :returns: A Generator of offsets, in samples.
+    """
+    step = LOOKUP_OFFSET_INCREMENT * SAMPLE_RATE * (1 if from_start else -1)
+    offset = 0 if from_start else -(LOOKUP_SEGMENTS_DURATION * SAMPLE_RATE)
+    yield offset
+    while True:
+        offset += step
+        if (from_start and offset > length) or (not from_start and offset < -length):
+            return
+        yield offset
+
+
 def _lookup_segment_with_offset(song_data: np.ndarray, apikey: str, offset: int):
     """Look up a segment of the given song at the given offset.
     This function integrates functionality to create the payload required for a request,
@@ -101,7 +141,17 @@ def _lookup_segment_with_offset(song_data: np.ndarray, apikey: str, offset: int)
         too many redirections or other problems.
         A detailed list of Exceptions ``requests`` can raise can be found at (https://docs.python-requests.org/en/latest/user/quickstart/#errors-and-exceptions)
     """
-    song_data_segment = _get_song_data_segment(song_data, offset)
+    return _lookup_song_data_segment(_get_song_data_segment(song_data, offset), apikey)
+
+
+def _lookup_song_data_segment(song_data_segment: np.ndarray, apikey: str):
+    """Look up a segment of song data, see :func:`_lookup_segment_with_offset`.
+
+    :param song_data_segment: The segment, formatted using ``_format_song_data``.
+    :param apikey: The Shazam API key.
+    :returns: Tuple (matches, track) of the retrieved metadata.
+    :raise requests.exceptions.RequestException: If the request fails.
+    """
     payload = _create_payload_from_song_data(song_data_segment)
     response = _send_lookup_request(payload, apikey).json()
     if "track" in response and "matches" in response:
@@ -128,7 +178,7 @@ def _get_song_data_segment(song_data: np.ndarray, offset: int):
     :param offset: The offset the segment should start at, in seconds.
     :returns: ``numpy.ndarray`` containing the extracted segment.
     """
-    end_index = offset + (44100 * LOOKUP_SEGMENTS_DURATION)
+    end_index = offset + (SAMPLE_RATE * LOOKUP_SEGMENTS_DURATION)
     if end_index == 0:
         return song_data[offset:]
     return song_data[offset:end_index]
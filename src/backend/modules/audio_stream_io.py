@@ -1,15 +1,453 @@
-from itertools import pairwise
+import abc
+import json
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from math import gcd
 from os import path
 from typing import Generator, Tuple
 
+import audioread
 import librosa
 import music_tag
 import numpy as np
 import soundfile
+import soxr
+
+from .seek_index import FileRange, mp3_seek_index
+
+ANALYSIS_SAMPLE_RATE = 22050
+"""
+Default sample rate audio is decoded at for analysis, see :func:`read_audio_file_to_stream`.
+"""
+
+RESAMPLER_WARMUP = 2048
+"""
+How many samples (at the analysis sample rate) to resample before the first block when a stream
+starts in the middle of a file, so the resampler's filter is filled like in a stream started at
+the beginning.
+"""
+
+
+SOUNDFILE_EXTENSIONS = {".wav", ".wave", ".flac", ".ogg", ".oga", ".aif", ".aiff"}
+"""
+Containers that are decoded with :class:`SoundfileDecoder` first, see :func:`open_audio_file`.
+"""
+
+
+class AudioDecoder(abc.ABC):
+    """
+    Decodes an audio file into float32 blocks of shape (channels, samples).
+
+    Decoders are opened with :func:`open_audio_file`, which selects one by the file's container,
+    and can be used as context managers.
+    """
+
+    name = None
+    """Name of the decoder backend."""
+
+    samplerate: int
+    """Sample rate of the file."""
+
+    channels: int
+    """Number of channels of the file."""
+
+    frames: int
+    """Length of the file, in samples."""
+
+    @abc.abstractmethod
+    def blocks(
+        self, blocksize: int, offset=0, frames=None
+    ) -> Generator[np.ndarray, None, None]:
+        """
+        Decodes the file as blocks of the given size. Only the last block may be shorter.
+
+        :param blocksize: the size of the blocks, in samples
+        :param offset: the first sample to decode (Default: 0)
+        :param frames: the number of samples to decode, or None to decode up to the end of the
+            file (Default: None)
+        :returns: A Generator of blocks (channels x samples)
+        """
+
+    def read(self, offset=0, frames=None) -> np.ndarray:
+        """
+        Decodes a part of the file at once.
+
+        :param offset: the first sample to decode (Default: 0)
+        :param frames: the number of samples to decode, or None to decode up to the end of the
+            file (Default: None)
+        :returns: the decoded samples (channels x samples)
+        """
+        blocks = list(self.blocks(2**20, offset, frames))
+        if not blocks:
+            return np.zeros((self.channels, 0), dtype=np.float32)
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=-1)
+
+    def close(self):
+        """
+        Releases the file.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SoundfileDecoder(AudioDecoder):
+    """
+    Decodes files with libsndfile through :mod:`soundfile`, reading the blocks directly from the
+    file. Seeking is exact.
+
+    libsndfile walks all frames before an offset to seek in an MP3 file, so MP3 files are opened
+    again at the nearest frame of their :func:`modules.seek_index.mp3_seek_index` instead, see
+    :func:`_mp3_chunks`.
+
+    :param audiofile: Path to audiofile
+    """
+
+    name = "soundfile"
+
+    def __init__(self, audiofile):
+        self.audiofile = audiofile
+        self._file = soundfile.SoundFile(audiofile)
+        self.samplerate = self._file.samplerate
+        self.channels = self._file.channels
+        index = self._mp3_index()
+        self.frames = self._file.frames if index is None else index.frames
+
+    def _mp3_index(self):
+        """
+        Gets the seek index of an MP3 file.
+
+        :returns: the :class:`modules.seek_index.Mp3SeekIndex`, or None if the file is no MP3 file
+            or cannot be indexed.
+        """
+        if self._file.format != "MP3":
+            return None
+        return mp3_seek_index(self.audiofile)
+
+    def blocks(self, blocksize: int, offset=0, frames=None):
+        index = self._mp3_index()
+        if index is None or index.locate(offset) is None:
+            self._file.seek(offset)
+            for block in self._file.blocks(
+                blocksize,
+                frames=-1 if frames is None else frames,
+                dtype="float32",
+                always_2d=True,
+            ):
+                yield block.T
+            return
+
+        remaining = max(0, index.frames - offset)
+        frames = remaining if frames is None else min(frames, remaining)
+        yield from _split_blocks(
+            _mp3_chunks(self.audiofile, index, offset, frames, blocksize), blocksize
+        )
+
+    def read(self, offset=0, frames=None):
+        if self._mp3_index() is not None:
+            return super().read(offset, frames)
+        self._file.seek(offset)
+        return self._file.read(
+            -1 if frames is None else frames, dtype="float32", always_2d=True
+        ).T
+
+    def close(self):
+        self._file.close()
+
+
+def _mp3_chunks(audiofile, index, offset: int, frames: int, chunk_size: int):
+    """
+    Decodes a part of an MP3 file in chunks, starting at the nearest frame of its seek index.
+
+    libsndfile decodes the samples after a read that ends within a frame differently, so the file
+    is only read in whole frames. libsndfile also stops at the length it estimates for the opened
+    part of the file from the bitrate of its first frame. If that is too short, the file is
+    opened again where it stopped.
+
+    :param audiofile: Path to audiofile
+    :param index: the file's :class:`modules.seek_index.Mp3SeekIndex`
+    :param offset: the first sample to decode
+    :param frames: the number of samples to decode
+    :param chunk_size: the size of the chunks, in samples. Chunks are rounded up to whole frames
+        and the last one only reaches up to the frame holding the last sample.
+    :returns: A Generator of chunks (channels x samples)
+    """
+    samples_per_frame = index.samples_per_frame
+    chunk_size = -(-chunk_size // samples_per_frame) * samples_per_frame
+    end = offset + frames
+    while offset < end:
+        byte_offset, skip = index.locate(offset)
+        # the sample of the audio the opened part starts at
+        decoded = offset - skip
+        opened_at = offset
+        with FileRange(audiofile, byte_offset) as file_range, soundfile.SoundFile(
+            file_range
+        ) as file:
+            while offset < end:
+                # don't decode more whole frames than needed to reach the end
+                size = min(
+                    chunk_size,
+                    -(-(end - decoded) // samples_per_frame) * samples_per_frame,
+                )
+                chunk = file.read(size, dtype="float32", always_2d=True).T
+                start = max(offset, decoded)
+                stop = min(end, decoded + chunk.shape[-1])
+                if stop > start:
+                    yield chunk[:, start - decoded : stop - decoded]
+                    offset = stop
+                decoded += chunk.shape[-1]
+                if chunk.shape[-1] < size:
+                    break
+        if offset == opened_at:
+            return
+
+
+def _split_blocks(chunks, blocksize: int):
+    """
+    Splits a stream of chunks (channels x samples) into blocks of the given size.
+    Only the last block may be shorter.
+
+    :param chunks: the stream of chunks
+    :param blocksize: the size of the blocks, in samples
+    :returns: A Generator of blocks
+    """
+    buffer = None
+    for chunk in chunks:
+        buffer = chunk if buffer is None else np.concatenate((buffer, chunk), axis=-1)
+        while buffer.shape[-1] >= blocksize:
+            yield buffer[:, :blocksize]
+            buffer = buffer[:, blocksize:]
+    if buffer is not None and buffer.shape[-1] > 0:
+        yield buffer
+
+
+class FFmpegDecoder(AudioDecoder):
+    """
+    Decodes files with an ``ffmpeg`` process, which writes raw float32 samples to a pipe.
+    One process is started for every call of :meth:`blocks` and decodes the whole range,
+    so it is kept running while the blocks are read. Its messages are written to a temporary
+    file, as a pipe that is not read while decoding could fill up and block the process.
+    The file is probed with ``ffprobe``.
+
+    ``frames`` is computed from the duration of the container, which is only an estimate
+    for containers without an exact length, like MP3 or M4A. It is corrected once the file
+    has been decoded from its start to its end.
+
+    :param audiofile: Path to audiofile
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, audiofile):
+        self.audiofile = audiofile
+        probe = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "a:0",
+                "-show_entries",
+                "stream=sample_rate,channels:format=duration",
+                "-of",
+                "json",
+                audiofile,
+            ],
+            capture_output=True,
+            check=False,
+        )
+        info = json.loads(probe.stdout or "{}")
+        if probe.returncode != 0 or not info.get("streams"):
+            raise RuntimeError(
+                f"ffprobe cannot read {audiofile}: {probe.stderr.decode().strip()}"
+            )
+        self.samplerate = int(info["streams"][0]["sample_rate"])
+        self.channels = int(info["streams"][0]["channels"])
+        self.frames = round(float(info["format"]["duration"]) * self.samplerate)
+        self._processes = []
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Checks whether ``ffmpeg`` and ``ffprobe`` are installed.
+
+        :returns: True if both are found on the path
+        """
+        return (
+            shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+        )
+
+    def blocks(self, blocksize: int, offset=0, frames=None):
+        command = ["ffmpeg", "-nostdin", "-v", "error"]
+        if offset > 0:
+            command += ["-ss", f"{offset / self.samplerate:.9f}"]
+        command += ["-i", self.audiofile, "-map", "0:a:0"]
+        command += ["-ac", str(self.channels), "-ar", str(self.samplerate)]
+        command += ["-f", "f32le", "-acodec", "pcm_f32le", "-"]
+        with tempfile.TemporaryFile() as messages:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=messages,
+            )
+            self._processes.append(process)
+            remaining = np.inf if frames is None else frames
+            decoded = 0
+            try:
+                while remaining > 0:
+                    size = int(min(blocksize, remaining))
+                    block = self._read_block(process.stdout, size)
+                    if block.shape[-1] == 0:
+                        break
+                    remaining -= block.shape[-1]
+                    decoded += block.shape[-1]
+                    yield block
+                    if block.shape[-1] < size:
+                        break
+                if frames is None:
+                    if process.wait() != 0:
+                        messages.seek(0)
+                        raise RuntimeError(
+                            f"ffmpeg cannot decode {self.audiofile}:"
+                            f" {messages.read().decode(errors='replace').strip()}"
+                        )
+                    if offset == 0:
+                        self.frames = decoded
+            finally:
+                self._stop(process)
+
+    def _read_block(self, pipe, size: int) -> np.ndarray:
+        """
+        Reads a block of raw samples from the pipe, until it is full or the pipe ends.
+
+        :param pipe: the pipe to read from
+        :param size: the size of the block, in samples
+        :returns: the block (channels x samples)
+        """
+        buffer = bytearray(size * self.channels * 4)
+        view = memoryview(buffer)
+        filled = 0
+        while filled < len(buffer):
+            count = pipe.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+        filled -= filled % (self.channels * 4)
+        return (
+            np.frombuffer(buffer, dtype=np.float32, count=filled // 4)
+            .reshape(-1, self.channels)
+            .T
+        )
+
+    def _stop(self, process):
+        """
+        Stops a decoding process and closes its output pipe. Processes stopped by
+        :meth:`close` are stopped again when their blocks are finalized, which does nothing.
+
+        :param process: the process to stop
+        """
+        if process not in self._processes:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+        self._processes.remove(process)
+
+    def close(self):
+        for process in list(self._processes):
+            self._stop(process)
+
+
+class LibrosaDecoder(AudioDecoder):
+    """
+    Decodes files with :func:`librosa.load`, which falls back to :mod:`audioread`
+    for containers libsndfile cannot read. The file is probed with :mod:`audioread` as well.
+    As librosa cannot stream those containers, the whole requested range is decoded at once.
+
+    :param audiofile: Path to audiofile
+    """
+
+    name = "librosa"
+
+    def __init__(self, audiofile):
+        self.audiofile = audiofile
+        with audioread.audio_open(audiofile) as file:
+            self.samplerate = file.samplerate
+            self.channels = file.channels
+            self.frames = round(file.duration * self.samplerate)
+
+    def blocks(self, blocksize: int, offset=0, frames=None):
+        audio = self.read(offset, frames)
+        for start in range(0, audio.shape[-1], blocksize):
+            yield audio[:, start : start + blocksize]
+
+    def read(self, offset=0, frames=None):
+        audio, _ = librosa.load(
+            self.audiofile,
+            sr=None,
+            mono=False,
+            offset=offset / self.samplerate,
+            duration=None if frames is None else frames / self.samplerate,
+        )
+        return np.atleast_2d(audio)
+
+
+def open_audio_file(audiofile, decoders=None) -> AudioDecoder:
+    """
+    Opens an audio file with the decoder that suits its container.
+
+    WAV, FLAC and OGG files (see :data:`SOUNDFILE_EXTENSIONS`) are decoded with the
+    :class:`SoundfileDecoder`, all other containers with the :class:`FFmpegDecoder` if ffmpeg
+    is installed. If a decoder cannot open the file, the next one is tried: libsndfile
+    (which also reads MP3 since version 1.1), ffmpeg and finally the :class:`LibrosaDecoder`.
+
+    :param audiofile: Path to audiofile
+    :param decoders: the decoder classes to try in order, or None to select them by the
+        container (Default: None)
+    :returns: the opened decoder
+    """
+    if decoders is None:
+        if path.splitext(str(audiofile))[1].lower() in SOUNDFILE_EXTENSIONS:
+            decoders = [SoundfileDecoder, FFmpegDecoder, LibrosaDecoder]
+        else:
+            decoders = [FFmpegDecoder, SoundfileDecoder, LibrosaDecoder]
+        decoders = [
+            decoder
+            for decoder in decoders
+            if decoder is not FFmpegDecoder or FFmpegDecoder.available()
+        ]
+    for decoder in decoders[:-1]:
+        try:
+            return decoder(audiofile)
+        except (RuntimeError, OSError):
+            pass
+    return decoders[-1](audiofile)
+
+
+def _open_decoder(audiofile, pcm_cache, decode=True) -> AudioDecoder:
+    """Opens an audio file through a :class:`modules.pcm_cache.PcmCache`, if one is given."""
+    if pcm_cache is None:
+        return open_audio_file(audiofile)
+    return pcm_cache.open(audiofile, decode=decode)
 
 
 def read_audio_file_to_numpy(
-    audiofile, mono=False, offset=0, duration=None, sample_rate=22050
+    audiofile,
+    mono=False,
+    offset=0,
+    duration=None,
+    sample_rate=22050,
+    pcm_cache=None,
 ) -> Tuple[np.ndarray, float]:
     """
     Reads an audiofile into an numpy array.
@@ -19,70 +457,443 @@ def read_audio_file_to_numpy(
     :param offset: Start of the segment to read, in seconds.
     :param duration: Duration of the segment to read, in seconds.
     :param sample_rate: Sample rate, defaults to Librosa standard 22050 Hz.
+    :param pcm_cache: :class:`modules.pcm_cache.PcmCache` to read the file through, or None to
+        decode it. The returned array can be read-only if the file is read through the cache.
+        (Default: None)
     :returns: Tuple[np.ndarray,float] array of sounddata
     """
-    return librosa.load(
-        audiofile, mono=mono, offset=offset, duration=duration, sr=sample_rate
+    with _open_decoder(audiofile, pcm_cache) as decoder:
+        sr = decoder.samplerate
+        audio = decoder.read(
+            int(offset * sr), None if duration is None else int(duration * sr)
+        )
+    audio = _to_mono(audio) if mono or audio.shape[0] == 1 else audio
+    if sample_rate is None:
+        return audio, sr
+    return (
+        librosa.resample(audio, orig_sr=sr, target_sr=sample_rate, res_type="soxr_hq"),
+        sample_rate,
     )
 
 
+AUDIO_SEGMENT_BLOCK_SIZE = 2**18
+"""Block size mono parts of an :class:`AudioSegment` are decoded in, in samples."""
+
+AudioFormat = namedtuple(
+    "AudioFormat", "sample_rate channels max_duration", defaults=(None,)
+)
+"""
+The audio a consumer of an :class:`AudioSegment`, like a song recognition API, needs:
+its sample rate, its number of channels (1 or 2) and how many seconds of it are used at most
+(None if there is no limit).
+"""
+
+
+class AudioSegment:
+    """
+    A segment of an audio file, which is only decoded where it is read.
+
+    Song recognition APIs only need small parts of a segment, like a few seconds at a time or
+    the first minutes at a low sample rate. They read these parts with :meth:`read`, in the
+    :data:`AudioFormat` they declare, so the segment is never decoded as a whole.
+
+    :param audiofile: Path to audiofile
+    :param offset: Start of the segment, in seconds.
+    :param duration: Duration of the segment, in seconds.
+    :param pcm_cache: :class:`modules.pcm_cache.PcmCache` to read the file through, or None to
+        decode it. (Default: None)
+    """
+
+    def __init__(self, audiofile, offset: float, duration: float, pcm_cache=None):
+        self.audiofile = audiofile
+        self.offset = offset
+        self.duration = duration
+        self._pcm_cache = pcm_cache
+        self._decoder = None
+
+    def read(self, audio_format: AudioFormat, start=0.0, duration=None) -> np.ndarray:
+        """
+        Reads a part of the segment.
+
+        :param audio_format: the :data:`AudioFormat` to read the part in
+        :param start: start of the part in seconds, counted from the end of the segment if it
+            is negative (Default: 0.0)
+        :param duration: duration of the part in seconds, or None to read up to the end of the
+            segment. Parts are cut to the end of the segment and the format's ``max_duration``.
+            (Default: None)
+        :returns: the audio, as a 1-dimensional array for one channel and as
+            (channels x samples) otherwise.
+        """
+        if start < 0:
+            start = max(0.0, self.duration + start)
+        end = (
+            self.duration if duration is None else min(self.duration, start + duration)
+        )
+        if audio_format.max_duration is not None:
+            end = min(end, start + audio_format.max_duration)
+
+        if self._decoder is None:
+            self._decoder = _open_decoder(self.audiofile, self._pcm_cache)
+        sr = self._decoder.samplerate
+        first = int((self.offset + start) * sr)
+        frames = max(0, int((self.offset + end) * sr) - first)
+        if audio_format.channels == 1:
+            # convert every block to mono right away, so the part is never held in full
+            blocks = (
+                _to_mono(block)
+                for block in self._decoder.blocks(
+                    AUDIO_SEGMENT_BLOCK_SIZE, first, frames
+                )
+            )
+            resampled = resample_stream(
+                blocks, sr, audio_format.sample_rate, AUDIO_SEGMENT_BLOCK_SIZE
+            )
+            return np.concatenate([np.zeros(0, dtype=np.float32), *resampled])
+
+        audio = self._decoder.read(first, frames)
+        if audio.shape[0] == 1:
+            audio = np.repeat(audio, audio_format.channels, axis=0)
+        if audio.shape[-1] == 0:
+            return audio.astype(np.float32)
+        return librosa.resample(
+            audio, orig_sr=sr, target_sr=audio_format.sample_rate, res_type="soxr_hq"
+        )
+
+    def close(self):
+        if self._decoder is not None:
+            self._decoder.close()
+            self._decoder = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def read_audio_file_to_stream(
-    audiofile, block_len=4096, mono=False
+    audiofile,
+    block_len=4096,
+    mono=False,
+    analysis_sample_rate=None,
+    start_block=0,
+    pcm_cache=None,
 ) -> (Generator[np.ndarray, None, None], float, int):
     """
     Reads an audiofile as blocks in a stream.
 
+    If an analysis sample rate is given, the audio is converted to mono and resampled to that
+    rate while decoding. The returned samplerate and hop length then refer to the analysis rate,
+    so frame indices convert to times in the original file without any rounding.
+
+    The stream can start at any block. Its blocks are then the same as the ones of a stream
+    started at the beginning of the file, except for the resampler's rounding.
+
     :param audiofile: Path to audiofile
     :param block_len: block length of stream
     :param mono: loads file as mono audio if true
+    :param analysis_sample_rate: sample rate to resample the (mono) audio to, or None to keep the
+        file's sample rate (Default: None)
+    :param start_block: index of the first block to stream (Default: 0)
+    :param pcm_cache: :class:`modules.pcm_cache.PcmCache` to read the file through, or None to
+        decode it. Files that are not cached yet are written to the cache when they are streamed
+        from the start to the end. (Default: None)
     :returns: Audiostream , samplerate, hop length
     """
-    # get rates
-    sr = librosa.get_samplerate(audiofile)
-    default_sr = 22050
+    decoder = _open_decoder(audiofile, pcm_cache, decode=False)
+    sr = decoder.samplerate
+    hop_length = _hop_length(sr)
+    if analysis_sample_rate is not None:
+        analysis_hop_length = _hop_length(analysis_sample_rate)
+        start, skip = _resampling_start(
+            sr, analysis_sample_rate, start_block * block_len * analysis_hop_length
+        )
+    else:
+        start, skip = start_block * block_len * hop_length, 0
 
-    frame_length = int(1024 * sr) // default_sr
-    hop_length = int(1024 * sr) // default_sr
+    stream = _decoded_stream(
+        decoder,
+        block_len * hop_length,
+        start,
+        mono=mono or analysis_sample_rate is not None,
+    )
+    if analysis_sample_rate is None:
+        return stream, sr, hop_length
 
     return (
-        librosa.stream(
-            audiofile,
-            block_length=block_len,
-            frame_length=frame_length,
-            hop_length=hop_length,
-            mono=mono,
+        resample_stream(
+            stream,
+            sr,
+            analysis_sample_rate,
+            block_len * analysis_hop_length,
+            skip=skip,
         ),
-        sr,
-        hop_length,
+        analysis_sample_rate,
+        analysis_hop_length,
     )
 
 
+def _decoded_stream(decoder: AudioDecoder, blocksize: int, offset: int, mono: bool):
+    """
+    Streams the blocks of a decoder and closes it at the end of the stream.
+    Files with one channel and mono blocks are streamed as 1-dimensional blocks.
+
+    :param decoder: the decoder to stream
+    :param blocksize: the size of the blocks, in samples
+    :param offset: the first sample to stream
+    :param mono: whether to convert the blocks to mono
+    :returns: A Generator of blocks
+    """
+    with decoder:
+        for block in decoder.blocks(blocksize, offset):
+            yield _to_mono(block) if mono or block.shape[0] == 1 else block
+
+
+def _to_mono(audio: np.ndarray) -> np.ndarray:
+    """
+    Averages the channels of audio, like :func:`librosa.to_mono`. Decoders return the transposed
+    samples of the decoded file, which a matrix-vector product averages much faster than
+    :func:`numpy.mean`. For one or two channels, the result is exactly the same.
+
+    :param audio: the audio (channels x samples), or mono audio
+    :returns: the mono audio
+    """
+    if audio.ndim == 1:
+        return audio
+    return np.full(audio.shape[0], 1 / audio.shape[0], dtype=audio.dtype) @ audio
+
+
+def _resampling_start(sample_rate: int, target_sample_rate: int, target_start: int):
+    """
+    Finds where to start decoding a file to resample it from the given position on.
+
+    Decoding starts :data:`RESAMPLER_WARMUP` samples early, at a sample that lies on the grid
+    of resampled samples, so the resampled samples are the same as when resampling the whole file.
+
+    :param sample_rate: the sample rate of the file
+    :param target_sample_rate: the sample rate to resample to
+    :param target_start: the first resampled sample that is needed
+    :returns: the sample to start decoding at, the number of resampled samples to skip.
+    """
+    if target_start == 0 or sample_rate == target_sample_rate:
+        return target_start, 0
+    grid = sample_rate // gcd(sample_rate, target_sample_rate)
+    warm_start = max(0, target_start - RESAMPLER_WARMUP)
+    start = warm_start * sample_rate // target_sample_rate // grid * grid
+    return start, target_start - start * target_sample_rate // sample_rate
+
+
+def analysis_rates(audiofile, analysis_sample_rate=None) -> Tuple[float, int]:
+    """
+    Gets the samplerate and hop length :func:`read_audio_file_to_stream` streams a file with,
+    without decoding it.
+
+    :param audiofile: Path to audiofile
+    :param analysis_sample_rate: sample rate the audio is resampled to, or None to keep the
+        file's sample rate (Default: None)
+    :returns: samplerate, hop length
+    """
+    sr = analysis_sample_rate
+    if sr is None:
+        with open_audio_file(audiofile) as decoder:
+            sr = decoder.samplerate
+    return sr, _hop_length(sr)
+
+
+def _hop_length(samplerate) -> int:
+    """
+    Scales the default hop length of 1024 samples at 22050 Hz to the given sample rate.
+
+    :param samplerate: the sample rate
+    :returns: the hop length
+    """
+    default_sr = 22050
+    return int(1024 * samplerate) // default_sr
+
+
+def resample_stream(stream, sample_rate, target_sample_rate, block_size: int, skip=0):
+    """
+    Resamples a stream of mono audio blocks and splits it into blocks of the given size.
+    Only the last block may be shorter.
+
+    :param stream: the stream of mono audio blocks
+    :param sample_rate: the sample rate of the stream
+    :param target_sample_rate: the sample rate to resample to
+    :param block_size: the size of the resulting blocks, in samples
+    :param skip: how many resampled samples to drop before the first block (Default: 0)
+    :returns: A Generator of resampled blocks
+    """
+    resampler = None
+    if sample_rate != target_sample_rate:
+        resampler = soxr.ResampleStream(
+            sample_rate, target_sample_rate, 1, dtype="float32"
+        )
+
+    stream = iter(stream)
+    buffer = np.zeros(0, dtype=np.float32)
+    block = next(stream, None)
+    while block is not None:
+        next_block = next(stream, None)
+        if resampler is not None:
+            block = resampler.resample_chunk(
+                block.astype(np.float32), last=next_block is None
+            )
+        buffer = np.concatenate((buffer, block))
+        if skip > 0:
+            dropped = min(skip, buffer.shape[0])
+            buffer = buffer[dropped:]
+            skip -= dropped
+        while buffer.shape[0] >= block_size:
+            yield buffer[:block_size]
+            buffer = buffer[block_size:]
+        block = next_block
+    if buffer.shape[0] > 0:
+        yield buffer
+
+
+class ReadAheadStream:
+    """
+    Wraps a stream so its next blocks are read on a background thread while the current block
+    is being processed. Up to ``depth`` blocks are read ahead and kept in a queue.
+
+    The time both sides spend waiting for each other is recorded:
+    ``decode_stall`` is the time spent waiting for the next block (the stream is decode-bound),
+    ``compute_stall`` is the time the reader spent waiting for a free slot in the queue
+    (the stream is compute-bound).
+    """
+
+    _END = object()
+
+    def __init__(self, stream, depth=2):
+        """
+        Starts reading ahead on the given stream.
+
+        :param stream: the stream to read from
+        :param depth: the maximum number of blocks to read ahead (Default: 2)
+        """
+        self.decode_stall = 0.0
+        self.compute_stall = 0.0
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._read, args=(stream,), daemon=True)
+        self._thread.start()
+
+    def _read(self, stream):
+        """
+        Reads the stream into the queue. Runs on the background thread.
+        Exceptions raised while reading are passed on to the consumer.
+
+        :param stream: the stream to read from
+        """
+        try:
+            for block in stream:
+                if not self._put(block):
+                    return
+        except Exception as ex:
+            self._put(ex)
+            return
+        self._put(self._END)
+
+    def _put(self, item):
+        """
+        Puts an item into the queue, waiting for a free slot until the stream is closed.
+
+        :param item: the item to put into the queue
+        :returns: False if the stream was closed before the item could be put, True otherwise
+        """
+        start = time.perf_counter()
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                self.compute_stall += time.perf_counter() - start
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self._queue.get()
+                self.decode_stall += time.perf_counter() - start
+                if item is self._END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops reading ahead. Blocks that were already read are discarded.
+        """
+        self._stopped.set()
+
+
+def overlap_bounds(curr_len: int, next_len: int):
+    """
+    Calculates where the overlapping blocks between two consecutive stream blocks start and end.
+    Each overlapping block consists of the end of the current block, starting at ``curr_start``,
+    followed by the start of the next block up to ``next_end``.
+
+    :param curr_len: length of the current block, in samples
+    :param next_len: length of the next block, in samples
+    :returns: A Generator of (curr_start, next_end) for each of the 4 overlapping blocks
+    """
+    for ratio in np.linspace(1, 0, 4, endpoint=False):
+        yield int(curr_len * (1 - ratio)), int(next_len * (1 - ratio))
+
+
 def overlapping_stream(stream):
     """
     Changes a stream of audiodata blocks into a stream of overlapping blocks.
-    These have to be in stereo.
+    The blocks can be mono (samples) or have several channels (channels x samples).
+
+    The current and the next block are kept next to each other in one buffer of two blocks, and
+    every overlapping block is a read-only view into it. So each block of the stream is copied
+    once into the buffer and moved to its front once, instead of copying it into every overlapping
+    block. As the buffer is reused, the views are only valid until the next block is read from
+    the stream, i.e. until the overlapping block after the last one of the current pair of blocks
+    is requested. Copy them to keep them for longer.
 
     :param stream: Takes a Generator
     :returns: A Generator with 75% Overlap between each instance
     """
-    for curr_block, next_block in pairwise(stream):
-        for ratio in np.linspace(1, 0, 4, endpoint=False):
-            if curr_block.ndim == 1:
-                curr_start_index = int((curr_block.shape[0] * (1 - ratio)))
-                next_end_index = int((next_block.shape[0] * (1 - ratio)))
-                yield np.append(
-                    curr_block[curr_start_index:], next_block[:next_end_index], axis=0
-                )
-            else:
-                curr_start_index = int((curr_block.shape[1] * (1 - ratio)))
-                next_end_index = int((next_block.shape[1] * (1 - ratio)))
-                yield np.append(
-                    curr_block[:, curr_start_index:],
-                    next_block[:, :next_end_index],
-                    axis=1,
-                )
-        if curr_block.shape != next_block.shape:
-            yield next_block
+    buffer = None
+    curr_shape = None
+    for block in stream:
+        if buffer is None:
+            buffer = np.empty(
+                block.shape[:-1] + (2 * block.shape[-1],), dtype=block.dtype
+            )
+            buffer[..., : block.shape[-1]] = block
+            curr_shape = block.shape
+            continue
+
+        curr_len = curr_shape[-1]
+        next_len = block.shape[-1]
+        if curr_len + next_len > buffer.shape[-1]:
+            grown = np.empty(
+                buffer.shape[:-1] + (curr_len + next_len,), dtype=buffer.dtype
+            )
+            grown[..., :curr_len] = buffer[..., :curr_len]
+            buffer = grown
+        buffer[..., curr_len : curr_len + next_len] = block
+
+        pair = buffer[..., : curr_len + next_len].view()
+        pair.flags.writeable = False
+        for curr_start_index, next_end_index in overlap_bounds(curr_len, next_len):
+            yield pair[..., curr_start_index : curr_len + next_end_index]
+        if curr_shape != block.shape:
+            yield pair[..., curr_len:]
+
+        # the next block becomes the current one. Channels are moved one by one, as numpy
+        # would copy all of them to a temporary array first, since their ranges interleave.
+        for channel in buffer.reshape(-1, buffer.shape[-1]):
+            channel[:next_len] = channel[curr_len : curr_len + next_len]
+        curr_shape = block.shape
 
 
 def save_numpy_as_audio_file(
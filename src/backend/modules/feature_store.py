@@ -0,0 +1,242 @@
+"""The feature store keeps the feature sequences extracted from audio files on disk,
+so segmenting a file again (e.g. with another preset) does not need to decode it again."""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+from utils.path import profile_dir
+
+FEATURE_STORE_DIR = os.path.join(profile_dir, "features")
+"""Default directory of the :class:`FeatureStore`."""
+
+FEATURE_STORE_VERSION = 2
+"""Version of the stored format. Entries of other versions are not used."""
+
+FEATURE_STORE_MAX_BYTES = 2**30
+"""Default size budget of the :class:`FeatureStore` on disk. Larger entries are not stored."""
+
+
+class FeatureStore:
+    """Stores the feature sequences of audio files as ``.npy`` files.
+
+    Entries are keyed by the path, size and modification time of the audio file and all
+    parameters the features depend on, so a changed file is analysed again. Every entry consists
+    of three files: the feature sequence, a table of the overlapping windows segmentation analyses
+    and the silence mask of the audio.
+    Feature sequences are loaded memory-mapped, so only the parts that are used are read.
+
+    Once a new entry is written, the least recently used entries are removed until all entries
+    fit into ``max_bytes``. Entries of older versions of a file are not used anymore, so they are
+    removed once they are the least recently used ones.
+
+    :param directory: The directory to keep the entries in. (default: ``FEATURE_STORE_DIR``)
+    :param max_bytes: The size budget of all entries. (default: ``FEATURE_STORE_MAX_BYTES``)
+    """
+
+    def __init__(self, directory=FEATURE_STORE_DIR, max_bytes=FEATURE_STORE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(
+        self,
+        path,
+        samplerate,
+        hop_length: int,
+        feature_type: str,
+        fft_window=2048,
+        block_len=4096,
+    ) -> str:
+        """Builds the key of an audio file's entry.
+
+        :param path: the path to the audio file
+        :param samplerate: the sample-rate the features are extracted at
+        :param hop_length: the hop-length the features are extracted with
+        :param feature_type: the name of the extracted feature type
+        :param fft_window: the window size of the fast-fourier-transformation (default: 2048)
+        :param block_len: the block length the audio is streamed with (default: 4096)
+        :returns: the key.
+        """
+        stat = os.stat(path)
+        identity = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return "_".join(
+            [
+                hashlib.sha256(identity.encode()).hexdigest(),
+                f"v{FEATURE_STORE_VERSION}",
+                f"{samplerate:g}Hz",
+                f"hop{hop_length}",
+                feature_type.lower(),
+                f"fft{fft_window}",
+                f"block{block_len}",
+            ]
+        )
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".features.npy", base + ".windows.npy", base + ".silence.npy"
+
+    def load(self, key: str):
+        """Loads an entry.
+
+        :param key: the entry's key, see :meth:`key`
+        :returns: the memory-mapped feature sequence (features x frames), the window table and the
+            silence mask (one value per frame), or None if there is no such entry.
+            Every row of the window table holds a window's first frame, number of feature frames
+            and length in frames.
+        """
+        features_path, windows_path, silence_path = self._paths(key)
+        if not os.path.exists(features_path):
+            return None
+        try:
+            entry = (
+                np.load(features_path, mmap_mode="r"),
+                np.load(windows_path),
+                np.load(silence_path),
+            )
+        except (OSError, ValueError):
+            return None
+        # the modification time of the window table marks when the entry was used last
+        try:
+            os.utime(windows_path)
+        except OSError:
+            pass
+        return entry
+
+    def writer(self, key: str):
+        """Creates a writer adding an entry to the store.
+
+        :param key: the entry's key, see :meth:`key`
+        :returns: the :class:`FeatureStoreWriter`.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        return FeatureStoreWriter(self, key)
+
+    def _size(self, key: str) -> int:
+        """Gets the size of an entry on disk, in bytes."""
+        return sum(
+            os.path.getsize(entry_path)
+            for entry_path in self._paths(key)
+            if os.path.exists(entry_path)
+        )
+
+    def _evict(self, key: str):
+        """Removes the least recently used entries that don't fit into the size budget next to
+        a new entry anymore.
+
+        :param key: the new entry's key
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".windows.npy") or name == key + ".windows.npy":
+                continue
+            other_key = name[: -len(".windows.npy")]
+            try:
+                mtime = os.path.getmtime(os.path.join(self.directory, name))
+                entries.append((mtime, other_key, self._size(other_key)))
+            except OSError:
+                continue
+        size = self._size(key)
+        for _, other_key, entry_size in sorted(entries, reverse=True):
+            if size + entry_size > self.max_bytes:
+                self._remove(other_key)
+            else:
+                size += entry_size
+
+    def _remove(self, key: str):
+        """Removes an entry from the store. The feature sequence is removed first, so the entry
+        cannot be loaded anymore even if its other files cannot be removed yet."""
+        for entry_path in self._paths(key):
+            try:
+                os.remove(entry_path)
+            except OSError:
+                # e.g. a feature sequence that is still memory-mapped on Windows
+                pass
+
+
+class FeatureStoreWriter:
+    """Writes an entry of a :class:`FeatureStore` while its windows are analysed.
+
+    The frames are appended to a temporary file as they arrive, so the whole feature sequence
+    never has to be kept in memory. The entry only becomes visible once :meth:`commit` is called.
+
+    :param store: The store to add the entry to.
+    :param key: The entry's key, see :meth:`FeatureStore.key`.
+    """
+
+    def __init__(self, store: FeatureStore, key: str):
+        self.key = key
+        self.features_path, self.windows_path, self.silence_path = store._paths(key)
+        self._store = store
+        fd, self._raw_path = tempfile.mkstemp(dir=store.directory, suffix=".raw")
+        self._raw = os.fdopen(fd, "wb")
+        self._frames = 0
+        self._num_features = None
+        self._dtype = None
+        self._windows = []
+        self._silence = []
+        self._silence_frames = 0
+
+    def add(self, feature, offset: int, length: int, silence):
+        """Adds a window. Windows have to be added in order.
+
+        :param feature: the window's feature sequence (features x frames)
+        :param offset: the window's first frame
+        :param length: the window's length, in frames
+        :param silence: the window's silence mask, one value per frame
+        """
+        offset = int(offset)
+        num_frames = feature.shape[1]
+        if self._num_features is None:
+            self._num_features = feature.shape[0]
+            self._dtype = feature.dtype
+        new_frames = offset + num_frames - self._frames
+        if new_frames > 0:
+            self._raw.write(
+                np.ascontiguousarray(
+                    feature[:, num_frames - new_frames :].T, dtype=self._dtype
+                ).tobytes()
+            )
+            self._frames += new_frames
+        new_silence = offset + len(silence) - self._silence_frames
+        if new_silence > 0:
+            self._silence.append(np.asarray(silence[len(silence) - new_silence :]))
+            self._silence_frames += new_silence
+        self._windows.append((offset, num_frames, length))
+
+    def commit(self):
+        """Writes the entry to the store and removes the entries that don't fit into its size
+        budget anymore. Entries larger than the budget are dropped."""
+        self._raw.close()
+        if self._frames == 0 or os.path.getsize(self._raw_path) > self._store.max_bytes:
+            self.discard()
+            return
+        frames = np.memmap(
+            self._raw_path,
+            dtype=self._dtype,
+            mode="r",
+            shape=(self._frames, self._num_features),
+        )
+        self._save(self.windows_path, np.array(self._windows, dtype=np.int64))
+        self._save(
+            self.silence_path,
+            np.concatenate(self._silence or [np.zeros(0, dtype=bool)]),
+        )
+        # the transposed frames are saved in fortran order, so they load as features x frames
+        self._save(self.features_path, frames.T)
+        del frames
+        os.remove(self._raw_path)
+        self._store._evict(self.key)
+
+    def discard(self):
+        """Drops the entry."""
+        self._raw.close()
+        if os.path.exists(self._raw_path):
+            os.remove(self._raw_path)
+
+    @staticmethod
+    def _save(path, array):
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, array)
+        os.replace(temp_path, path)
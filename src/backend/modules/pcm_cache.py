@@ -0,0 +1,498 @@
+"""The PCM cache keeps decoded audio files on disk, so the parts of a file that are read again and
+again (to segment, identify, preview and store its songs) are copied instead of decoded."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from utils.path import profile_dir
+
+from .audio_stream_io import AudioDecoder, open_audio_file
+
+PCM_CACHE_DIR = os.path.join(profile_dir, "pcm")
+"""Default directory of the :class:`PcmCache`."""
+
+PCM_CACHE_MAX_BYTES = 4 * 2**30
+"""Default size budget of the :class:`PcmCache` on disk. Larger files are not cached."""
+
+PCM_CACHE_HOT_BYTES = 256 * 2**20
+"""Default size budget of the ranges the :class:`PcmCache` keeps in memory."""
+
+PCM_CACHE_BLOCK_SIZE = 2**20
+"""Block size files are decoded into the :class:`PcmCache` with, in samples."""
+
+
+class PcmCache:
+    """Stores decoded audio files as raw float32 samples (samples x channels) at their own sample
+    rate, next to a ``.json`` file with the sample rate, number of channels and length.
+
+    Entries are keyed by the path, size and modification time of the audio file, so a changed
+    file is decoded again. Once a new entry is written, the entries of older versions of the
+    file are removed, and the least recently used entries are removed until all entries fit into
+    ``max_bytes``. Entries are memory-mapped, and the ranges that were read last are kept in
+    memory up to ``hot_bytes``, so reading the same segment again (e.g. to identify, preview and
+    store it) is only a lookup.
+
+    Files are opened through the cache with :meth:`open`.
+
+    :param directory: The directory to keep the entries in. (default: ``PCM_CACHE_DIR``)
+    :param max_bytes: The size budget of all entries. (default: ``PCM_CACHE_MAX_BYTES``)
+    :param hot_bytes: The size budget of the ranges kept in memory.
+        (default: ``PCM_CACHE_HOT_BYTES``)
+    """
+
+    def __init__(
+        self,
+        directory=PCM_CACHE_DIR,
+        max_bytes=PCM_CACHE_MAX_BYTES,
+        hot_bytes=PCM_CACHE_HOT_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._hot = OrderedDict()
+        self._hot_size = 0
+
+    def key(self, path) -> str:
+        """Builds the key of an audio file's entry.
+
+        :param path: the path to the audio file
+        :returns: the key.
+        """
+        stat = os.stat(path)
+        identity = f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".f32", base + ".json"
+
+    def open(self, path, decode=True) -> AudioDecoder:
+        """Opens an audio file through the cache.
+
+        If the file is cached, or is being written to the cache, a :class:`CachedDecoder` is
+        returned. Otherwise, the whole file is decoded into the cache first if ``decode`` is set.
+        If not, the returned decoder writes the file to the cache when it is streamed from the
+        start to the end, see :class:`CachingDecoder`. Files that don't fit into the size budget
+        are opened with :func:`modules.audio_stream_io.open_audio_file`.
+
+        :param path: the path to the audio file
+        :param decode: whether to decode a file that is not cached yet right away
+            (default: True)
+        :returns: the opened decoder
+        """
+        key = self.key(path)
+        entry = self._entry(key)
+        if entry is not None:
+            return CachedDecoder(self, entry, path)
+
+        decoder = open_audio_file(path)
+        if decoder.frames * decoder.channels * 4 > self.max_bytes:
+            return decoder
+        decoder = CachingDecoder(self, key, path, decoder)
+        if not decode:
+            return decoder
+        with decoder:
+            for _ in decoder.blocks(PCM_CACHE_BLOCK_SIZE):
+                pass
+        entry = self._entry(key)
+        if entry is None:
+            return open_audio_file(path)
+        return CachedDecoder(self, entry, path)
+
+    def _entry(self, key: str):
+        """Gets an entry, loading it from disk if it is not loaded yet, and marks it as used.
+
+        :param key: the entry's key, see :meth:`key`
+        :returns: the :class:`PcmEntry` or :class:`PcmCacheWriter`, or None if there is no such
+            entry.
+        """
+        raw_path, meta_path = self._paths(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                try:
+                    with open(meta_path) as file:
+                        meta = json.load(file)
+                    entry = PcmEntry(
+                        key,
+                        meta["samplerate"],
+                        meta["channels"],
+                        meta["frames"],
+                        raw_path,
+                    )
+                except (OSError, ValueError, KeyError):
+                    return None
+                self._entries[key] = entry
+        if isinstance(entry, PcmEntry):
+            # the modification time of the metadata marks when the entry was used last
+            try:
+                os.utime(meta_path)
+            except OSError:
+                pass
+        return entry
+
+    def writer(self, key: str, path, samplerate: int, channels: int, frames: int):
+        """Creates a writer adding an entry to the cache. The entry can be read while it is
+        written.
+
+        :param key: the entry's key, see :meth:`key`
+        :param path: the path to the audio file
+        :param samplerate: the sample rate of the audio file
+        :param channels: the number of channels of the audio file
+        :param frames: the length of the audio file, in samples
+        :returns: the :class:`PcmCacheWriter`.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        writer = PcmCacheWriter(self, key, path, samplerate, channels, frames)
+        with self._lock:
+            self._entries.setdefault(key, writer)
+        return writer
+
+    def read(self, entry, offset: int, frames: int) -> np.ndarray:
+        """Reads a range of an entry, keeping the ranges that were read last in memory.
+
+        :param entry: the :class:`PcmEntry` or :class:`PcmCacheWriter` to read from
+        :param offset: the first sample to read
+        :param frames: the number of samples to read
+        :returns: the read-only samples (channels x samples), or None if the entry was removed
+            meanwhile.
+        """
+        range_key = (entry.key, offset, frames)
+        with self._lock:
+            audio = self._hot.get(range_key)
+            if audio is not None:
+                self._hot.move_to_end(range_key)
+                return audio
+
+        audio = entry.read(offset, frames)
+        if audio is None:
+            return None
+        audio.flags.writeable = False
+        if audio.nbytes <= self.hot_bytes:
+            with self._lock:
+                if range_key not in self._hot:
+                    self._hot[range_key] = audio
+                    self._hot_size += audio.nbytes
+                while self._hot_size > self.hot_bytes:
+                    _, dropped = self._hot.popitem(last=False)
+                    self._hot_size -= dropped.nbytes
+        return audio
+
+    def _commit(self, writer):
+        """Adds a written entry to the cache and removes the entries of older versions of the
+        file and the least recently used entries that don't fit into the size budget anymore.
+
+        :param writer: the :class:`PcmCacheWriter` of the entry
+        """
+        raw_path, meta_path = self._paths(writer.key)
+        with self._lock:
+            entry = self._entries.pop(writer.key, None)
+        # mapped files cannot be replaced on Windows
+        if isinstance(entry, PcmEntry):
+            entry.close()
+        try:
+            writer.move(raw_path)
+        except OSError:
+            writer.discard()
+            return
+        temp_path = meta_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(
+                {
+                    "path": os.path.abspath(writer.path),
+                    "samplerate": writer.samplerate,
+                    "channels": writer.channels,
+                    "frames": writer.frames,
+                },
+                file,
+            )
+        os.replace(temp_path, meta_path)
+        with self._lock:
+            self._entries[writer.key] = PcmEntry(
+                writer.key, writer.samplerate, writer.channels, writer.frames, raw_path
+            )
+
+        entries = []
+        for name in os.listdir(self.directory):
+            key, extension = os.path.splitext(name)
+            if extension != ".json" or key == writer.key:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    meta = json.load(file)
+                entries.append((os.path.getmtime(file.name), key, meta["path"]))
+            except (OSError, ValueError, KeyError):
+                continue
+        size = writer.frames * writer.channels * 4
+        for _, key, path in sorted(entries, reverse=True):
+            try:
+                entry_size = os.path.getsize(self._paths(key)[0])
+            except OSError:
+                entry_size = None
+            if (
+                entry_size is None
+                or path == os.path.abspath(writer.path)
+                or size + entry_size > self.max_bytes
+            ):
+                self._remove(key)
+            else:
+                size += entry_size
+
+    def _remove(self, key: str):
+        """Removes an entry from the cache. Decoders reading the entry decode their file
+        instead."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            for range_key in [
+                range_key for range_key in self._hot if range_key[0] == key
+            ]:
+                self._hot_size -= self._hot.pop(range_key).nbytes
+        # mapped files cannot be removed on Windows
+        if isinstance(entry, PcmEntry):
+            entry.close()
+        # the samples are removed first, so an entry that is still in use by another
+        # process keeps its metadata and is removed again later
+        for entry_path in self._paths(key):
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                break
+
+    def _discard(self, writer):
+        """Forgets an entry that was not written completely."""
+        with self._lock:
+            if self._entries.get(writer.key) is writer:
+                del self._entries[writer.key]
+
+
+class PcmEntry:
+    """An entry of a :class:`PcmCache`, memory-mapped from its raw samples.
+
+    :param key: The entry's key.
+    :param samplerate: The sample rate of the audio file.
+    :param channels: The number of channels of the audio file.
+    :param frames: The length of the audio file, in samples.
+    :param raw_path: The path to the raw samples.
+    """
+
+    def __init__(self, key: str, samplerate: int, channels: int, frames: int, raw_path):
+        self.key = key
+        self.samplerate = samplerate
+        self.channels = channels
+        self.frames = frames
+        self.available = frames
+        self._lock = threading.Lock()
+        self._samples = np.memmap(
+            raw_path, dtype=np.float32, mode="r", shape=(frames, channels)
+        )
+
+    def read(self, offset: int, frames: int) -> np.ndarray:
+        """Reads a range of samples.
+
+        :param offset: the first sample to read
+        :param frames: the number of samples to read
+        :returns: the samples (channels x samples), or None if the entry was closed.
+        """
+        with self._lock:
+            if self._samples is None:
+                return None
+            return np.array(self._samples[offset : offset + frames]).T
+
+    def close(self):
+        """Unmaps the raw samples, so their file can be removed or replaced."""
+        with self._lock:
+            self._samples = None
+            self.available = 0
+
+
+class PcmCacheWriter:
+    """Writes an entry of a :class:`PcmCache` while its file is decoded.
+
+    The samples are appended to a temporary file as they arrive, and the samples that were
+    written already can be read from it. The entry becomes an entry on disk once :meth:`commit`
+    is called.
+
+    :param cache: The cache to add the entry to.
+    :param key: The entry's key.
+    :param path: The path to the audio file.
+    :param samplerate: The sample rate of the audio file.
+    :param channels: The number of channels of the audio file.
+    :param frames: The length of the audio file, in samples.
+    """
+
+    def __init__(
+        self, cache, key: str, path, samplerate: int, channels: int, frames: int
+    ):
+        self.key = key
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.frames = frames
+        self.available = 0
+        self._cache = cache
+        self._lock = threading.Lock()
+        fd, self.raw_path = tempfile.mkstemp(dir=cache.directory, suffix=".raw")
+        self._raw = os.fdopen(fd, "wb")
+
+    def add(self, block: np.ndarray):
+        """Appends a block of samples. Blocks have to be added in order.
+
+        :param block: the samples (channels x samples)
+        """
+        samples = np.ascontiguousarray(block.T, dtype=np.float32)
+        with self._lock:
+            self._raw.write(memoryview(samples).cast("B"))
+            self._raw.flush()
+            self.available += samples.shape[0]
+
+    def read(self, offset: int, frames: int) -> np.ndarray:
+        """Reads a range of the samples that were written already.
+
+        :param offset: the first sample to read
+        :param frames: the number of samples to read
+        :returns: the samples (channels x samples), or None if the entry was removed.
+        """
+        with self._lock:
+            frames = max(0, min(frames, self.available - offset))
+            try:
+                samples = np.fromfile(
+                    self.raw_path,
+                    dtype=np.float32,
+                    count=frames * self.channels,
+                    offset=offset * self.channels * 4,
+                )
+            except OSError:
+                return None
+        return samples.reshape(-1, self.channels).T
+
+    def commit(self):
+        """Writes the entry to the cache. The length of the entry is the number of samples
+        that were written. Empty entries are dropped, as they cannot be memory-mapped.
+        """
+        with self._lock:
+            self._raw.close()
+            self.frames = self.available
+        if self.frames == 0:
+            self.discard()
+            return
+        self._cache._commit(self)
+
+    def move(self, raw_path):
+        """Moves the written samples to the entry's file, where they are read from afterwards.
+
+        :param raw_path: the path to the entry's raw samples
+        """
+        with self._lock:
+            os.replace(self.raw_path, raw_path)
+            self.raw_path = raw_path
+
+    def discard(self):
+        """Drops the entry."""
+        self._cache._discard(self)
+        with self._lock:
+            self._raw.close()
+            self.available = 0
+            try:
+                os.remove(self.raw_path)
+            except OSError:
+                pass
+
+
+class CachedDecoder(AudioDecoder):
+    """Reads an audio file from a :class:`PcmCache`. Ranges that are not in the cache yet
+    (as the file is still being written to it) are decoded from the file.
+
+    :param cache: The cache to read from.
+    :param entry: The file's :class:`PcmEntry` or :class:`PcmCacheWriter`.
+    :param audiofile: Path to audiofile
+    """
+
+    name = "cache"
+
+    def __init__(self, cache: PcmCache, entry, audiofile):
+        self.audiofile = audiofile
+        self.samplerate = entry.samplerate
+        self.channels = entry.channels
+        self.frames = entry.frames
+        self._cache = cache
+        self._entry = entry
+
+    def _end(self, offset: int, frames):
+        return self.frames if frames is None else min(self.frames, offset + frames)
+
+    def blocks(self, blocksize: int, offset=0, frames=None):
+        end = self._end(offset, frames)
+        for start in range(offset, end, blocksize):
+            block = None
+            if end <= self._entry.available:
+                block = self._entry.read(start, min(blocksize, end - start))
+            if block is None:
+                with open_audio_file(self.audiofile) as decoder:
+                    yield from decoder.blocks(blocksize, start, end - start)
+                return
+            yield block
+
+    def read(self, offset=0, frames=None):
+        end = self._end(offset, frames)
+        if end <= self._entry.available:
+            audio = self._cache.read(self._entry, offset, max(0, end - offset))
+            if audio is not None:
+                return audio
+        with open_audio_file(self.audiofile) as decoder:
+            return decoder.read(offset, frames)
+
+
+class CachingDecoder(AudioDecoder):
+    """Wraps a decoder to write its file to a :class:`PcmCache` when the whole file is streamed
+    through :meth:`blocks`. The samples that were streamed already can be read from the cache
+    while the file is being streamed.
+
+    :param cache: The cache to write to.
+    :param key: The file's key, see :meth:`PcmCache.key`.
+    :param audiofile: Path to audiofile
+    :param decoder: The decoder to wrap.
+    """
+
+    def __init__(self, cache: PcmCache, key: str, audiofile, decoder: AudioDecoder):
+        self.name = decoder.name
+        self.audiofile = audiofile
+        self.samplerate = decoder.samplerate
+        self.channels = decoder.channels
+        self.frames = decoder.frames
+        self._cache = cache
+        self._key = key
+        self._decoder = decoder
+
+    def blocks(self, blocksize: int, offset=0, frames=None):
+        if offset > 0 or frames is not None:
+            yield from self._decoder.blocks(blocksize, offset, frames)
+            return
+
+        writer = self._cache.writer(
+            self._key, self.audiofile, self.samplerate, self.channels, self.frames
+        )
+        try:
+            for block in self._decoder.blocks(blocksize):
+                writer.add(block)
+                yield block
+            writer.commit()
+            writer = None
+        finally:
+            # drop partially written entries, e.g. if the stream was closed early
+            if writer is not None:
+                writer.discard()
+
+    def read(self, offset=0, frames=None):
+        return self._decoder.read(offset, frames)
+
+    def close(self):
+        self._decoder.close()
@@ -0,0 +1,257 @@
+"""Seek indices let decoders start decoding compressed audio files near an offset,
+instead of parsing or decoding everything before it.
+
+MP3 files have no index of their own, so seeking in them means walking the frames from the start
+of the file. :func:`mp3_seek_index` walks them once and keeps the position of every frame."""
+
+import mmap
+import os
+from functools import lru_cache
+
+import numpy as np
+
+MP3_WARMUP_FRAMES = 8
+"""
+How many frames to decode before the frame an offset lies in. Layer III frames borrow bits from
+the frames before them and the synthesis filterbank keeps state across frames, so decoding only
+gives the same samples as decoding from the start after a few frames.
+"""
+
+MP3_DECODER_DELAY = 529
+"""Samples every layer III decoder adds to the start of the audio."""
+
+MP3_GAPLESS_ENCODERS = (b"LAME", b"Lavf", b"Lavc")
+"""Encoders whose info tag holds the encoder delay and padding, see :func:`mp3_seek_index`."""
+
+_MP3_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_BITRATES[0] = _MP3_BITRATES[2]
+_MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+
+class Mp3SeekIndex:
+    """
+    The position of every audio frame of an MP3 file.
+
+    Decoders that handle gapless playback drop the encoder delay and the decoder delay from the
+    start of the audio (and the encoder padding from its end) if the file has an info tag. So the
+    first sample of a decoded file is the decoded stream's sample ``start``.
+
+    :param offsets: The byte offset of every audio frame.
+    :param samples_per_frame: The number of samples per frame.
+    :param start: The first sample of the decoded stream that belongs to the audio.
+    :param frames: The length of the audio, in samples.
+    """
+
+    def __init__(self, offsets: np.ndarray, samples_per_frame: int, start: int, frames):
+        self.offsets = offsets
+        self.samples_per_frame = samples_per_frame
+        self.start = start
+        self.frames = frames
+
+    def locate(self, sample: int, warmup=MP3_WARMUP_FRAMES):
+        """
+        Finds where to start decoding to get the audio from a sample on.
+
+        :param sample: the sample of the audio to start at
+        :param warmup: how many frames to decode before the sample's frame
+            (Default: ``MP3_WARMUP_FRAMES``)
+        :returns: the byte offset of the frame to start decoding at and the number of decoded
+            samples to skip from there, or None if the sample lies beyond the indexed frames.
+        """
+        stream_sample = sample + self.start
+        frame = stream_sample // self.samples_per_frame
+        if frame >= len(self.offsets):
+            return None
+        first = max(0, frame - warmup)
+        return int(self.offsets[first]), stream_sample - first * self.samples_per_frame
+
+
+def mp3_seek_index(path):
+    """
+    Gets the seek index of an MP3 file. Indices are cached as long as the file does not change.
+
+    :param path: the path to the MP3 file
+    :returns: the :class:`Mp3SeekIndex`, or None if the file's frames cannot be indexed.
+    """
+    stat = os.stat(path)
+    return _cached_mp3_seek_index(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def _cached_mp3_seek_index(path, mtime_ns: int, size: int):
+    """
+    Builds the seek index of an MP3 file, see :func:`mp3_seek_index`.
+    The modification time and size are only used as part of the cache key.
+    """
+    if size == 0:
+        return None
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        return build_mp3_seek_index(data)
+
+
+def build_mp3_seek_index(data):
+    """
+    Builds the seek index of an MP3 file by walking its layer III frame headers.
+
+    Files are only indexed if their frames can be walked from the first one up to the end of the
+    file or a trailing ID3v1/APE tag. Decoders skip damaged or inserted data and go on with
+    concatenated streams of another format, but it is not known how many samples they decode
+    around them, so such files are left to the decoder's own length and seeking.
+    Files with a first frame holding a Xing/Info tag are only indexed if the tag tells the
+    encoder delay, as only then is it known which sample the decoded audio starts at.
+
+    :param data: the content of the MP3 file (bytes or a memory map)
+    :returns: the :class:`Mp3SeekIndex`, or None if the file cannot be indexed.
+    """
+    first_frame = position = _first_frame(data)
+    offsets = []
+    start = 0
+    padding = 0
+    stream_format = None
+    while position + 4 <= len(data):
+        header = int.from_bytes(data[position : position + 4], "big")
+        version = header >> 19 & 3
+        bitrate_index = header >> 12 & 15
+        sample_rate_index = header >> 10 & 3
+        if (
+            header >> 21 != 0x7FF
+            or version == 1
+            or header >> 17 & 3 != 1
+            or bitrate_index in (0, 15)
+            or sample_rate_index == 3
+        ):
+            break
+        if stream_format is None:
+            stream_format = (version, sample_rate_index)
+        elif stream_format != (version, sample_rate_index):
+            break
+        sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+        bitrate = _MP3_BITRATES[version][bitrate_index] * 1000
+        frame_size = (144 if version == 3 else 72) * bitrate // sample_rate
+        frame_size += header >> 9 & 1
+
+        if position == first_frame:
+            info = _mp3_info_tag(data, position, header, frame_size)
+            if info is False:
+                return None
+            if info is not None:
+                start, padding = info
+                position += frame_size
+                continue
+        offsets.append(position)
+        position += frame_size
+
+    # the last frame may be cut off, and less than a header may be left after it
+    if not offsets or position + 4 <= _audio_end(data):
+        return None
+    samples_per_frame = 1152 if stream_format[0] == 3 else 576
+    frames = len(offsets) * samples_per_frame - start
+    # decoders drop the padding, but not the decoder delay at the end of the audio
+    frames -= max(0, padding - MP3_DECODER_DELAY)
+    return Mp3SeekIndex(
+        np.array(offsets, dtype=np.int64), samples_per_frame, start, frames
+    )
+
+
+def _audio_end(data: bytes) -> int:
+    """Gets the byte offset the audio frames end at, right before trailing tags."""
+    end = len(data)
+    if end >= 128 and data[end - 128 : end - 125] == b"TAG":
+        end -= 128
+    if end >= 32 and data[end - 32 : end - 24] == b"APETAGEX":
+        # the size counts the items and the footer, the flags tell if there is a header too
+        size = int.from_bytes(data[end - 20 : end - 16], "little")
+        flags = int.from_bytes(data[end - 12 : end - 8], "little")
+        end -= size + (32 if flags & 1 << 31 else 0)
+    return max(0, end)
+
+
+def _first_frame(data: bytes) -> int:
+    """Gets the byte offset of the first frame, right after the ID3v2 tag if there is one."""
+    if data[:3] != b"ID3":
+        return 0
+    size = data[6:10]
+    return 10 + (size[0] << 21 | size[1] << 14 | size[2] << 7 | size[3])
+
+
+def _mp3_info_tag(data: bytes, position: int, header: int, frame_size: int):
+    """
+    Reads the Xing/Info tag of a first frame.
+
+    :returns: None if the frame holds no tag (so it is an audio frame), False if it holds a tag
+        without the encoder delay, or the first sample of the decoded stream belonging to the
+        audio and the encoder padding.
+    """
+    version = header >> 19 & 3
+    mono = header >> 6 & 3 == 3
+    if version == 3:
+        side_info = 17 if mono else 32
+    else:
+        side_info = 9 if mono else 17
+    tag = position + 4 + side_info
+    if data[position + 36 : position + 40] == b"VBRI":
+        return False
+    if data[tag : tag + 4] not in (b"Xing", b"Info"):
+        return None
+    flags = int.from_bytes(data[tag + 4 : tag + 8], "big")
+    # the optional frame count, byte count, table of contents and quality fields
+    encoder = (
+        tag
+        + 8
+        + sum(size for flag, size in [(1, 4), (2, 4), (4, 100), (8, 4)] if flags & flag)
+    )
+    if encoder + 24 > position + frame_size:
+        return False
+    if data[encoder : encoder + 4] not in MP3_GAPLESS_ENCODERS:
+        return False
+    delay = data[encoder + 21 : encoder + 24]
+    encoder_delay = delay[0] << 4 | delay[1] >> 4
+    encoder_padding = (delay[1] & 15) << 8 | delay[2]
+    return encoder_delay + MP3_DECODER_DELAY, encoder_padding
+
+
+class FileRange:
+    """
+    A read-only file object for the part of a file from a byte offset on,
+    so decoders can read it as if it were a file of its own.
+
+    :param path: the path to the file
+    :param offset: the byte offset the range starts at
+    """
+
+    def __init__(self, path, offset: int):
+        self._file = open(path, "rb")
+        self._offset = offset
+        self._file.seek(offset)
+
+    def seek(self, offset: int, whence=os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            offset += self._offset
+        return self._file.seek(offset, whence) - self._offset
+
+    def tell(self) -> int:
+        return self._file.tell() - self._offset
+
+    def read(self, size=-1) -> bytes:
+        return self._file.read(size)
+
+    def readinto(self, buffer) -> int:
+        return self._file.readinto(buffer)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,28 +1,131 @@
-from collections import namedtuple
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from itertools import pairwise
+from functools import lru_cache, partial
+from itertools import chain, islice, pairwise
 
 import librosa
 import numpy as np
-from scipy import signal
+from scipy import fft, ndimage
 
 from .audio_stream_io import (
+    ANALYSIS_SAMPLE_RATE,
+    ReadAheadStream,
+    analysis_rates,
+    open_audio_file,
+    overlap_bounds,
     overlapping_stream,
+    read_audio_file_to_numpy,
     read_audio_file_to_stream,
 )
 
 # TODO: Implement debugging mode (plots, prints) -> needs UI as well
 
 
+NOVELTY_KERNEL_SIZE = 8
+"""Length of one quadrant of the checkerboard kernel used to compute the novelty function."""
+
+STACK_MEMORY_STEPS = 4
+"""Number of delayed copies a feature is stacked from before computing the SSM."""
+
+STACK_MEMORY_DELAY = 8
+"""Delay between the stacked copies of a feature, in feature frames."""
+
+
 class FeatureType(Enum):
     """This enum represent the different features we can extract and use for splitting."""
 
     CHROMA = 1
     SPECTRAL = 2
+    CHROMA_SPECTRAL = 3
+    """Chroma and mel-spectrogram stacked, see :func:`extract_chroma_spectro`."""
+    ENERGY_FLUX = 4
+    """Frame energy and spectral flux, see :func:`extract_energy_flux`. These are segmented
+    without a self similarity matrix, see :func:`segment_energy_flux_sequence`."""
+
+
+class Precision(Enum):
+    """This enum represents the numeric precision used for smoothing, the SSM and the novelty
+    function.
+
+    - FLOAT64: double precision everywhere. This is the reference for the other presets.
+    - FLOAT32: single precision everywhere. This is the default.
+    """
+
+    FLOAT64 = 1
+    FLOAT32 = 2
+
+
+class Projection(Enum):
+    """This enum represents the projections that can reduce the dimension of the features before
+    they are stacked and compared, see :class:`FeatureProjection`.
+
+    - NONE: the features are used as they are. This is the default.
+    - RANDOM: a fixed random gaussian projection. It roughly keeps the angles between features,
+      so the self similarity matrix barely changes.
+    - PCA: the principal components of the file's features, fitted on its first analysed window.
+      The features are not centered, so the angles between them are kept as far as possible.
+    """
+
+    NONE = 1
+    RANDOM = 2
+    PCA = 3
+
+
+PROJECTION_DIM = 32
+"""Default number of dimensions :class:`FeatureProjection` reduces every feature frame to.
+Stacking multiplies it by :data:`STACK_MEMORY_STEPS`."""
+
+PROJECTION_SEED = 0
+"""Seed of the :attr:`Projection.RANDOM` projection, so every file is projected the same way."""
+
+
+SILENCE_RMS_THRESHOLD = -50.0
+"""RMS level in dBFS below which audio can count as silent, see :func:`silence_envelope`."""
+
+SILENCE_PEAK_THRESHOLD = -30.0
+"""Peak level in dBFS below which audio can count as silent, see :func:`silence_envelope`."""
+
+MIN_SILENCE_GAP = 1.0
+"""Minimum length in seconds of a silence between songs that is used as a transition."""
+
+SILENT_WINDOW_SHARE = 0.5
+"""Share of silent frames from which on a window is skipped instead of segmented. Skipped
+windows don't vote for any transitions, see :func:`segment_file`."""
+
+FLUX_FFT_WINDOW = 256
+"""Window size of the short fourier-transformations :func:`extract_energy_flux` computes the
+spectral flux with."""
+
+ENERGY_DIP_RANGE = 30.0
+"""Drop in loudness, in dB, that :func:`segment_energy_flux_sequence` maps to a novelty of 1."""
+
+ENERGY_REFERENCE_LENGTH = 15.0
+"""Length in seconds of the surroundings :func:`segment_energy_flux_sequence` compares each
+frame's loudness to."""
+
+MIN_BEAT_TEMPO = 60.0
+"""Slowest tempo, in BPM, :func:`track_beats` looks for."""
+
+MAX_BEAT_TEMPO = 200.0
+"""Fastest tempo, in BPM, :func:`track_beats` looks for."""
+
+BEAT_VOTE_TOLERANCE = 16
+"""Distance in audio frames up to which votes of beat-synchronous windows count for the same
+transition, see :class:`TransitionVoter`. The windows' beats may differ around a transition."""
+
+MEDIAN_CHUNK_SIZE = 2**22
+"""Maximum number of values :func:`median_downsample_feature_sequence` copies at once."""
 
 
 class Preset(
-    namedtuple("Preset", "name filter_length downsampling peak_threshold"), Enum
+    namedtuple(
+        "Preset",
+        "name filter_length downsampling peak_threshold feature_type",
+        defaults=(FeatureType.SPECTRAL,),
+    ),
+    Enum,
 ):
     """This enum represents a preset of values used for splitting.
 
@@ -31,9 +134,21 @@ class Preset(
     - filter_length: the size of the median filter used for downsampling
     - downsampling: the factor to downsample the ssm
     - peak_threshold: a threshold by which peaks in the novelty function are selected
+    - feature_type: the feature type to segment, see :class:`FeatureType`
+      (default: SPECTRAL)
 
     Normal is the recommended preset, strict may result in too little segments and lenient may
     result in increasingly too many but inaccurate segments.
+
+    The energy presets don't compute a self similarity matrix, see
+    :func:`segment_energy_flux_sequence`. They are much faster, but only find transitions at
+    clear drops in loudness, like the gaps of vinyl or tape rips and concert recordings.
+    Their ``filter_length`` is the length of the loudness smoothing filter and their
+    ``peak_threshold`` is the depth of the drop, relative to :data:`ENERGY_DIP_RANGE`.
+
+    The harmonic preset compares chroma and the mel-spectrogram, see
+    :func:`extract_chroma_spectro`, which also tells apart songs of similar sound in different
+    keys. Its values are the ones of the normal preset.
     """
 
     EXTRA_STRICT = "extra strict", 57, 2, 0.6
@@ -41,8 +156,202 @@ class Preset(
     NORMAL = "normal", 41, 8, 0.5
     LENIENT = "lenient", 33, 16, 0.45
     EXTRA_LENIENT = "extra lenient", 25, 32, 0.4
+    ENERGY_STRICT = "energy strict", 41, 8, 0.6, FeatureType.ENERGY_FLUX
+    ENERGY_NORMAL = "energy normal", 41, 8, 0.5, FeatureType.ENERGY_FLUX
+    ENERGY_LENIENT = "energy lenient", 41, 8, 0.4, FeatureType.ENERGY_FLUX
+    HARMONIC = "harmonic", 41, 8, 0.5, FeatureType.CHROMA_SPECTRAL
     # Custom = 0, 0, 0
 
+    def __reduce_ex__(self, protocol):
+        # the namedtuple base is called Preset as well, so look presets up by their member name
+        return getattr, (Preset, self._name_)
+
+
+SPECTRAL_PRESETS = tuple(
+    preset for preset in Preset if preset.feature_type == FeatureType.SPECTRAL
+)
+"""The presets segmenting the mel-spectrogram, which all share one feature pass in
+:func:`segment_file_presets`. The energy and harmonic presets need passes of their own."""
+
+
+class BandedSSM:
+    """A self similarity matrix that only stores a band of diagonals around its main diagonal.
+    Detecting transitions with a checkerboard kernel of size 2 * n + 1 only ever reads
+    values up to 2 * n entries off the main diagonal, so storing the full N x N matrix is not
+    necessary. This reduces memory from O(N²) to O(N * width).
+
+    The band is stored diagonal-major: ``band[lag, i]`` holds the similarity between
+    frame ``i`` and frame ``i + lag``. As self similarity matrices are symmetric,
+    only non-negative lags are stored. Entries past the end of a diagonal are zero.
+    The band may have leading dimensions to hold the matrices of several equally long blocks,
+    see :func:`compute_self_similarity_batch`.
+    """
+
+    def __init__(self, band: np.ndarray):
+        """Create a banded SSM from the given diagonal-major band.
+
+        :param band: the band, of shape (width + 1, N) or (..., width + 1, N)
+        """
+        self.band = band
+
+    @classmethod
+    def from_feature(cls, feature, width: int):
+        """Compute the banded self similarity matrix for a (normalized) feature sequence.
+
+        :param feature: the feature sequence, of shape (dimensions, N), or several of them, of
+            shape (..., dimensions, N).
+        :param width: the highest lag (distance from the main diagonal) to compute
+        :returns: the banded SSM.
+        """
+        N = feature.shape[-1]
+        band = None
+        for lag in range(min(width, N - 1) + 1):
+            similarity = np.einsum(
+                "...ij,...ij->...j", feature[..., : N - lag], feature[..., lag:]
+            )
+            if band is None:
+                band = np.zeros(
+                    feature.shape[:-2] + (width + 1, N), dtype=similarity.dtype
+                )
+            band[..., lag, : N - lag] = similarity
+        return cls(band)
+
+    @property
+    def size(self):
+        """The size N of the represented N x N matrix."""
+        return self.band.shape[-1]
+
+    @property
+    def width(self):
+        """The highest lag stored in the band."""
+        return self.band.shape[-2] - 1
+
+    def diagonal(self, offset: int):
+        """Get a diagonal of the matrix, in the same format as :func:`numpy.diagonal`.
+
+        :param offset: offset of the diagonal from the main diagonal
+        :returns: the diagonal.
+        """
+        lag = abs(offset)
+        return self.band[..., lag, : self.size - lag]
+
+    def entries(self, rows, cols):
+        """Get the matrix' entries at the given row and column indices.
+        All requested entries need to be within the stored band.
+
+        :param rows: the row indices
+        :param cols: the column indices, broadcastable against ``rows``
+        :returns: the entries.
+        """
+        return self.band[..., np.abs(cols - rows), np.minimum(rows, cols)]
+
+    def to_dense(self):
+        """Expand the band into a full matrix. Values outside the band are set to 0.
+        This is meant for debugging and plotting, and only supports a single matrix.
+
+        :returns: the full self similarity matrix.
+        """
+        dense = np.zeros((self.size, self.size), dtype=self.band.dtype)
+        for lag in range(self.width + 1):
+            diagonal = self.diagonal(lag)
+            dense[np.arange(diagonal.size), np.arange(diagonal.size) + lag] = diagonal
+            dense[np.arange(diagonal.size) + lag, np.arange(diagonal.size)] = diagonal
+        return dense
+
+
+@lru_cache(maxsize=8)
+def get_fft_window(fft_window: int):
+    """Get the (periodic) hann window librosa uses for the short-time fourier transformation.
+    The result is cached and read-only.
+
+    :param fft_window: the window size
+    :returns: the window.
+    """
+    window = librosa.filters.get_window("hann", fft_window, fftbins=True)
+    window.setflags(write=False)
+    return window
+
+
+@lru_cache(maxsize=8)
+def get_mel_filterbank(samplerate, fft_window: int):
+    """Get the mel filterbank :func:`librosa.feature.melspectrogram` uses.
+    The result is cached and read-only.
+
+    :param samplerate: the sample-rate
+    :param fft_window: the window size of the fast-fourier-transformation
+    :returns: the filterbank (mel bands x frequency bins).
+    """
+    filterbank = librosa.filters.mel(sr=samplerate, n_fft=fft_window)
+    filterbank.setflags(write=False)
+    return filterbank
+
+
+@lru_cache(maxsize=64)
+def get_chroma_filterbank(samplerate, fft_window: int, tuning: float):
+    """Get the chroma filterbank :func:`librosa.feature.chroma_stft` uses.
+    The result is cached and read-only.
+
+    :param samplerate: the sample-rate
+    :param fft_window: the window size of the fast-fourier-transformation
+    :param tuning: the tuning deviation from A440, in fractions of a chroma bin
+    :returns: the filterbank (chroma bins x frequency bins).
+    """
+    filterbank = librosa.filters.chroma(sr=samplerate, n_fft=fft_window, tuning=tuning)
+    filterbank.setflags(write=False)
+    return filterbank
+
+
+def _power_spectrogram(feature, hop_length: int, fft_window=2048):
+    """Computes the power spectrogram of a sequence, without centering.
+
+    :param feature: The sequence to work on.
+    :param hop_length: The hop-length of the sequence.
+    :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
+    :return: The power spectrogram (frequency bins x frames).
+    """
+    # convert to mono
+    feature_mono = librosa.to_mono(feature)
+    return (
+        np.abs(
+            librosa.stft(
+                feature_mono,
+                n_fft=fft_window,
+                hop_length=hop_length,
+                window=get_fft_window(fft_window),
+                center=False,
+            )
+        )
+        ** 2
+    )
+
+
+def _chroma_from_spectrogram(spectrogram, samplerate, fft_window=2048):
+    """Projects a power spectrogram onto the chroma bins, like
+    :func:`librosa.feature.chroma_stft` does.
+
+    :param spectrogram: The power spectrogram.
+    :param samplerate: The sample-rate of the sequence
+    :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
+    :return: The chroma feature vector.
+    """
+    tuning = librosa.estimate_tuning(S=spectrogram, sr=samplerate, bins_per_octave=12)
+    filterbank = get_chroma_filterbank(samplerate, fft_window, float(tuning))
+    raw_chroma = np.einsum("cf,...ft->...ct", filterbank, spectrogram, optimize=True)
+    return librosa.util.normalize(raw_chroma, norm=np.inf, axis=-2)
+
+
+def _mel_from_spectrogram(spectrogram, samplerate, fft_window=2048):
+    """Projects a power spectrogram onto the mel bands, like
+    :func:`librosa.feature.melspectrogram` does.
+
+    :param spectrogram: The power spectrogram.
+    :param samplerate: The sample-rate of the sequence
+    :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
+    :return: The mel-spectrogram feature vector.
+    """
+    filterbank = get_mel_filterbank(samplerate, fft_window)
+    return np.einsum("...ft,mf->...mt", spectrogram, filterbank, optimize=True)
+
 
 def extract_chroma(feature, samplerate, hop_length: int, fft_window=2048):
     """Extracts the chroma feature vector from the given sequence, representing key
@@ -54,16 +363,8 @@ def extract_chroma(feature, samplerate, hop_length: int, fft_window=2048):
     :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
     :return: The chroma feature vector.
     """
-    # convert to mono
-    feature_mono = librosa.to_mono(feature)
-    # extract chroma feature
-    return librosa.feature.chroma_stft(
-        y=feature_mono,
-        sr=samplerate,
-        hop_length=hop_length,
-        center=False,
-        n_fft=fft_window,
-    )
+    spectrogram = _power_spectrogram(feature, hop_length, fft_window=fft_window)
+    return _chroma_from_spectrogram(spectrogram, samplerate, fft_window=fft_window)
 
 
 def extract_spectro(feature, samplerate, hop_length: int, fft_window=2048):
@@ -75,22 +376,360 @@ def extract_spectro(feature, samplerate, hop_length: int, fft_window=2048):
     :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
     :return: The mel-spectrogram feature vector.
     """
+    spectrogram = _power_spectrogram(feature, hop_length, fft_window=fft_window)
+    return _mel_from_spectrogram(spectrogram, samplerate, fft_window=fft_window)
+
+
+def extract_chroma_spectro(feature, samplerate, hop_length: int, fft_window=2048):
+    """Extracts the chroma and the mel-spectrogram feature vectors from the given sequence and
+    stacks them, chroma first. Both are projected from the same power spectrogram.
+
+    Chroma frames are normalized to a maximum of 1. The mel-spectrogram frames are scaled the
+    same way here, so both parts contribute to the similarity of two frames.
+
+    :param feature: The sequence to work on.
+    :param samplerate: The sample-rate of the sequence
+    :param hop_length: The hop-length of the sequence.
+    :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
+    :return: The stacked feature vector.
+    """
+    spectrogram = _power_spectrogram(feature, hop_length, fft_window=fft_window)
+    chroma = _chroma_from_spectrogram(spectrogram, samplerate, fft_window=fft_window)
+    mel = _mel_from_spectrogram(spectrogram, samplerate, fft_window=fft_window)
+    return np.concatenate(
+        (chroma, librosa.util.normalize(mel, norm=np.inf, axis=-2)), axis=-2
+    )
+
+
+def extract_energy_flux(feature, samplerate, hop_length: int, fft_window=2048):
+    """Extracts the frame energy and spectral flux from the given sequence, in dB.
+    The frames are the same as the ones of the other features, but no full-size fourier
+    transformation is computed: the flux is the change between the spectra of two short
+    windows (see :data:`FLUX_FFT_WINDOW`) at the center of each frame.
+
+    :param feature: The sequence to work on.
+    :param samplerate: The sample-rate of the sequence
+    :param hop_length: The hop-length of the sequence.
+    :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
+    :return: The feature vector, energy in the first row and flux in the second.
+    """
     # convert to mono
     feature_mono = librosa.to_mono(feature)
-    # extract mel-spectrogram
-    return librosa.feature.melspectrogram(
-        y=feature_mono,
-        sr=samplerate,
-        hop_length=hop_length,
-        center=False,
-        n_fft=fft_window,
+    if feature_mono.shape[-1] < fft_window:
+        return np.zeros((2, 0), dtype=np.float32)
+    num_frames = 1 + (feature_mono.shape[-1] - fft_window) // hop_length
+    starts = np.arange(num_frames) * hop_length
+
+    # frames overlap, so sum the squares of every hop (and of its first samples) once
+    # and add up the ones each frame consists of
+    whole_hops, rest = divmod(fft_window, hop_length)
+    hops = feature_mono[: feature_mono.shape[-1] // hop_length * hop_length]
+    hops = hops.reshape(-1, hop_length)
+    hop_energy = np.einsum("ij,ij->i", hops, hops).astype(np.float64)
+    energy = sum(hop_energy[first : first + num_frames] for first in range(whole_hops))
+    if rest:
+        heads = np.lib.stride_tricks.sliding_window_view(feature_mono, rest)
+        heads = heads[starts + whole_hops * hop_length]
+        energy = energy + np.einsum("ij,ij->i", heads, heads)
+    energy /= fft_window
+
+    center = fft_window // 2
+    short_windows = np.lib.stride_tricks.sliding_window_view(
+        feature_mono, FLUX_FFT_WINDOW
     )
+    window = get_fft_window(FLUX_FFT_WINDOW).astype(np.float32)
+    before = np.abs(
+        fft.rfft(short_windows[starts + center - FLUX_FFT_WINDOW] * window, axis=-1)
+    )
+    after = np.abs(fft.rfft(short_windows[starts + center] * window, axis=-1))
+    flux = np.sum(np.abs(after - before), axis=-1) / FLUX_FFT_WINDOW
+
+    tiny = np.finfo(np.float32).tiny
+    return (10 * np.log10(np.stack((energy, flux**2)) + tiny)).astype(np.float32)
+
+
+def extract_feature(
+    feature, samplerate, hop_length: int, feature_type: FeatureType, fft_window=2048
+):
+    """Extracts the feature vector of the given type from the given sequence.
+    See :func:`extract_chroma`, :func:`extract_spectro`, :func:`extract_chroma_spectro` and
+    :func:`extract_energy_flux`.
+
+    :param feature: The sequence to work on.
+    :param samplerate: The sample-rate of the sequence
+    :param hop_length: The hop-length of the sequence.
+    :param feature_type: The feature type to extract, see: :class:`FeatureType`
+    :param fft_window: The Window size for the fast-fourier-transformation (default: 2048)
+    :return: The feature vector.
+    """
+    if feature_type == FeatureType.CHROMA:
+        return extract_chroma(feature, samplerate, hop_length, fft_window=fft_window)
+    elif feature_type == FeatureType.SPECTRAL:
+        return extract_spectro(feature, samplerate, hop_length, fft_window=fft_window)
+    elif feature_type == FeatureType.CHROMA_SPECTRAL:
+        return extract_chroma_spectro(
+            feature, samplerate, hop_length, fft_window=fft_window
+        )
+    elif feature_type == FeatureType.ENERGY_FLUX:
+        return extract_energy_flux(
+            feature, samplerate, hop_length, fft_window=fft_window
+        )
+    raise TypeError("Illegal Feature Value.")
+
+
+FeatureWindow = namedtuple("FeatureWindow", "feature offset length silence")
+"""One analysis window of a :func:`overlapping_feature_stream`.
+
+- feature: the feature sequence of the window
+- offset: the position of the window's first frame in the file, in audio frames
+- length: the length of the window's audio, in audio frames
+- silence: the window's silence mask, one value per audio frame, see :func:`silence_envelope`
+"""
+
+
+def silence_envelope(
+    audio,
+    hop_length: int,
+    rms_threshold=SILENCE_RMS_THRESHOLD,
+    peak_threshold=SILENCE_PEAK_THRESHOLD,
+):
+    """Marks the silent audio frames of a mono sequence. A frame is silent if both its RMS
+    and its peak level are below the thresholds, so low noise (e.g. of vinyl or radio rips) still
+    counts as silence, while quiet music with transients does not.
+    A trailing part shorter than a frame is ignored.
+
+    :param audio: the mono sequence
+    :param hop_length: the hop-length of the sequence
+    :param rms_threshold: the RMS level below which a frame is silent, in dBFS
+        (default: ``SILENCE_RMS_THRESHOLD``)
+    :param peak_threshold: the peak level below which a frame is silent, in dBFS
+        (default: ``SILENCE_PEAK_THRESHOLD``)
+    :returns: the silence mask, one value per audio frame.
+    """
+    num_frames = audio.shape[-1] // hop_length
+    frames = np.reshape(audio[: num_frames * hop_length], (num_frames, hop_length))
+    mean_square = np.einsum("ij,ij->i", frames, frames) / hop_length
+    peak = np.max(np.abs(frames), axis=1, initial=0)
+    return (mean_square < 10 ** (rms_threshold / 10)) & (
+        peak < 10 ** (peak_threshold / 20)
+    )
+
+
+def overlapping_feature_stream(
+    stream, samplerate, hop_length: int, feature_type: FeatureType, fft_window=2048
+):
+    """Changes a stream of audio blocks into a stream of overlapping feature sequences.
+    The windows are the same as the ones :func:`modules.audio_stream_io.overlapping_stream`
+    yields, but the features are only extracted once for every part of the audio. For
+    ``SPECTRAL`` and ``ENERGY_FLUX``, the features are the same as the ones extracted from each
+    window on its own. The chroma features (``CHROMA`` and ``CHROMA_SPECTRAL``) differ, as the
+    tuning is estimated once for every extracted part of the stream instead of for every window.
+
+    Features are extracted without centering, so every feature frame only depends on the
+    ``fft_window`` samples it starts at. The frames are computed as the stream advances and kept
+    in a buffer holding the current and next block. Each overlapping window then
+    is a slice of that buffer. The stream's blocks should be a multiple of 4 audio frames long.
+
+    :param stream: the audio stream, see :func:`modules.audio_stream_io.read_audio_file_to_stream`
+    :param samplerate: the sample-rate of the stream
+    :param hop_length: the hop-length of the stream
+    :param feature_type: the feature type to extract, see: :class:`FeatureType`
+    :param fft_window: the Window size for the fast-fourier-transformation (default: 2048)
+    :returns: A Generator of :class:`FeatureWindow`.
+    """
+    frames = None
+    silence = np.zeros(0, dtype=bool)
+    frames_start = 0
+    remainder = np.zeros(0, dtype=np.float32)
+    block_start = 0
+
+    def extend(block):
+        nonlocal frames, silence, remainder
+        mono = librosa.to_mono(block)
+        silence = np.concatenate((silence, silence_envelope(mono, hop_length)))
+        audio = np.concatenate((remainder, mono))
+        if audio.shape[0] < fft_window:
+            remainder = audio
+            return
+        new_frames = extract_feature(
+            audio, samplerate, hop_length, feature_type, fft_window=fft_window
+        )
+        remainder = audio[new_frames.shape[1] * hop_length :]
+        frames = (
+            new_frames
+            if frames is None
+            else np.concatenate((frames, new_frames), axis=1)
+        )
+
+    def window(start, length):
+        # number of frames librosa extracts from this window without centering
+        num_frames = max(0, (length - fft_window) // hop_length + 1)
+        first = start // hop_length - frames_start
+        length = librosa.core.samples_to_frames(length, hop_length=hop_length)
+        return FeatureWindow(
+            frames[:, first : first + num_frames],
+            start // hop_length,
+            length,
+            silence[first : first + length],
+        )
+
+    first_block = True
+    for curr_block, next_block in pairwise(stream):
+        if first_block:
+            extend(curr_block)
+            first_block = False
+        extend(next_block)
+
+        curr_len = curr_block.shape[-1]
+        next_len = next_block.shape[-1]
+        for curr_start, next_end in overlap_bounds(curr_len, next_len):
+            yield window(block_start + curr_start, curr_len - curr_start + next_end)
+        block_start += curr_len
+        if curr_block.shape != next_block.shape:
+            yield window(block_start, next_len)
+
+        # drop frames that are only part of the current block
+        drop = block_start // hop_length - frames_start
+        frames = frames[:, drop:]
+        silence = silence[drop:]
+        frames_start += drop
+
+
+def stored_feature_windows(features, windows, silence):
+    """Yields the windows of a feature sequence loaded from a
+    :class:`modules.feature_store.FeatureStore`. These are the same windows
+    :func:`overlapping_feature_stream` yielded when the features were stored.
+
+    :param features: the stored feature sequence
+    :param windows: the stored window table
+    :param silence: the stored silence mask
+    :returns: A Generator of :class:`FeatureWindow`.
+    """
+    for offset, num_frames, length in windows.tolist():
+        yield FeatureWindow(
+            features[:, offset : offset + num_frames],
+            offset,
+            length,
+            silence[offset : offset + length],
+        )
+
+
+def _extract_overlapping_stream(
+    stream, samplerate, hop_length: int, feature_type: FeatureType, block_len: int
+):
+    """Extracts the features for every block of :func:`modules.audio_stream_io.overlapping_stream`
+    separately. This yields the same windows as :func:`overlapping_feature_stream`.
+
+    :param stream: the audio stream, see :func:`modules.audio_stream_io.read_audio_file_to_stream`
+    :param samplerate: the sample-rate of the stream
+    :param hop_length: the hop-length of the stream
+    :param feature_type: the feature type to extract, see: :class:`FeatureType`
+    :param block_len: the block length of the stream, in audio frames
+    :returns: A Generator of :class:`FeatureWindow`.
+    """
+    for idx, block in enumerate(overlapping_stream(stream)):
+        silence = silence_envelope(librosa.to_mono(block), hop_length)
+        yield FeatureWindow(
+            # if the block is mostly silent, it is skipped, so don't extract anything
+            None
+            if _mostly_silent(silence)
+            else extract_feature(block, samplerate, hop_length, feature_type),
+            idx * block_len * 0.25,
+            librosa.core.samples_to_frames(block.shape[-1], hop_length=hop_length),
+            silence,
+        )
+
+
+def _mostly_silent(silence):
+    """Checks whether a window is silent for the most part, see :data:`SILENT_WINDOW_SHARE`.
+
+    :param silence: the window's silence mask
+    :returns: whether the window should be skipped.
+    """
+    return np.count_nonzero(silence) >= SILENT_WINDOW_SHARE * len(silence)
+
+
+def _skip_window(window):
+    """Checks whether a window should be skipped instead of segmented, as it is silent for the
+    most part (see :func:`_mostly_silent`) or its features are constant. Constant audio that is
+    not silent (e.g. a DC offset or a held sample) has constant features, so its self similarity
+    matrix has no structure to find transitions in.
+
+    :param window: the :class:`FeatureWindow`
+    :returns: whether the window should be skipped.
+    """
+    if _mostly_silent(window.silence):
+        return True
+    feature = window.feature
+    if feature.shape[1] == 0:
+        return True
+    spread = np.max(np.ptp(feature, axis=1))
+    # the columns may differ in the last bits, as they are computed in batches
+    return spread <= 1e-6 * max(1.0, float(np.max(np.abs(feature))))
+
+
+class SilenceGaps:
+    """Finds the gaps of silence between songs while the overlapping windows of a file are
+    processed, see :func:`silence_envelope`.
+
+    Every silent stretch at least ``min_length`` audio frames long becomes a gap, except for
+    silence at the start and end of the file. Every audio frame is only looked at once, even
+    though the windows overlap.
+
+    :param min_length: The minimum length of a gap, in audio frames.
+    """
+
+    def __init__(self, min_length: int):
+        self.min_length = min_length
+        self._end = 0
+        self._run_start = None
+
+    @property
+    def pending(self):
+        """The start of the silent stretch at the end of the frames seen so far, which might
+        still become a gap, or None."""
+        return self._run_start
+
+    def update(self, silence, offset: int):
+        """Look at the frames of the next window that weren't seen yet.
+
+        :param silence: the window's silence mask
+        :param offset: the window's first frame
+        :return: the gaps that ended in the new frames, as pairs of their first frame and the
+            frame after their end.
+        """
+        offset = int(offset)
+        new = silence[max(0, self._end - offset) :]
+        start = max(self._end, offset)
+        self._end = max(self._end, offset + len(silence))
+        if len(new) == 0:
+            return []
+
+        # the frames at which silence starts or stops
+        changes = np.flatnonzero(np.diff(new.astype(np.int8), prepend=0, append=0))
+        bounds = (changes + start).tolist()
+        runs = list(zip(bounds[::2], bounds[1::2]))
+        if self._run_start is not None:
+            if new[0]:
+                runs[0] = (self._run_start, runs[0][1])
+            else:
+                runs.insert(0, (self._run_start, start))
+        self._run_start = None
+        if runs and runs[-1][1] == self._end:
+            self._run_start = runs.pop()[0]
+        return [
+            (first, stop)
+            for first, stop in runs
+            if first > 0 and stop - first >= self.min_length
+        ]
 
 
 def smooth_downsample_feature_sequence(
     feature, samplerate, filter_len: int, downsampling: int
 ):
     """Smooths and down-samples a given feature-sequence and its samplerate.
+    Only the columns kept after down-sampling are computed, using running sums.
+    The result is the same as convolving with a boxcar filter and dropping the other columns.
 
     :param feature: the feature sequence to smooth and down-sample
     :param samplerate: the samplerate of the feature sequence
@@ -101,19 +740,104 @@ def smooth_downsample_feature_sequence(
     if filter_len % 2 != 1:
         filter_len = filter_len + 1
 
-    filter_kernel = np.expand_dims(signal.get_window("boxcar", filter_len), axis=0)
-    feature_smooth = signal.convolve(feature, filter_kernel, mode="same") / filter_len
-    feature_smooth = feature_smooth[:, ::downsampling]
+    feature_smooth = _boxcar_columns(
+        feature, filter_len, range(0, feature.shape[1], downsampling)
+    )
     sr_feature = samplerate / downsampling
 
     return feature_smooth, sr_feature
 
 
+def _boxcar_columns(feature, filter_len: int, columns: range):
+    """Applies a centered boxcar filter to a feature sequence, but only computes the given columns.
+    The sequence is padded with zeros, like ``scipy.signal.convolve(..., mode="same")`` does.
+
+    This computes running sums over the whole sequence once (in double precision, to keep
+    rounding errors from accumulating), so the cost is linear in the number of frames.
+
+    :param feature: the feature sequence to smooth
+    :param filter_len: length of the smoothing filter, must be odd
+    :param columns: the columns to compute
+    :returns: the smoothed columns.
+    """
+    return _boxcar_from_running_sums(
+        _running_sums(feature),
+        filter_len,
+        columns,
+        np.result_type(feature.dtype, np.float32),
+    )
+
+
+def _running_sums(feature):
+    """Computes the running sums of a feature sequence along its frames, for
+    :func:`_boxcar_from_running_sums`.
+
+    :param feature: the feature sequence, may have leading dimensions
+    :returns: the running sums, with a leading column of zeros.
+    """
+    cumulative = np.zeros(feature.shape[:-1] + (feature.shape[-1] + 1,))
+    np.cumsum(feature, axis=-1, out=cumulative[..., 1:])
+    return cumulative
+
+
+def _boxcar_from_running_sums(cumulative, filter_len: int, columns: range, dtype):
+    """Applies a centered boxcar filter to the given columns of a feature sequence,
+    see :func:`_boxcar_columns`.
+
+    :param cumulative: the running sums of the feature sequence, see :func:`_running_sums`
+    :param filter_len: length of the smoothing filter, must be odd
+    :param columns: the columns to compute
+    :param dtype: the dtype of the result
+    :returns: the smoothed columns.
+    """
+    m = cumulative.shape[1] - 1
+    reach = filter_len // 2
+    columns = np.arange(columns.start, columns.stop, columns.step)
+    upper = np.minimum(columns + reach + 1, m)
+    lower = np.maximum(columns - reach, 0)
+    smoothed = (cumulative[:, upper] - cumulative[:, lower]) / filter_len
+    return smoothed.astype(dtype, copy=False)
+
+
+def _stacked_boxcar_columns(feature, filter_len: int, columns: range, dtype):
+    """Stacks a feature sequence on top of itself like :func:`librosa.feature.stack_memory` and
+    applies a centered boxcar filter to the given columns, see :func:`_boxcar_columns`.
+
+    The stacked copies are delayed versions of the feature sequence padded with zeros, so their
+    running sums are the running sums of the feature sequence, shifted by the delays.
+    Only the running sums of the feature sequence itself are computed, which are
+    ``STACK_MEMORY_STEPS`` times smaller, and the stacked sequence is never built.
+    The result is the same as stacking first and smoothing afterwards.
+
+    :param feature: the feature sequence, may have leading dimensions
+    :param filter_len: length of the smoothing filter, must be odd
+    :param columns: the columns to compute
+    :param dtype: the dtype of the result
+    :returns: the stacked and smoothed columns.
+    """
+    cumulative = _running_sums(feature)
+    m = feature.shape[-1]
+    reach = filter_len // 2
+    columns = np.arange(columns.start, columns.stop, columns.step)
+    delays = np.arange(STACK_MEMORY_STEPS)[:, np.newaxis] * STACK_MEMORY_DELAY
+    upper = np.clip(np.minimum(columns + reach + 1, m) - delays, 0, m)
+    lower = np.clip(np.maximum(columns - reach, 0) - delays, 0, m)
+    # (..., features, steps, columns) -> (..., steps * features, columns)
+    smoothed = (cumulative[..., upper] - cumulative[..., lower]) / filter_len
+    smoothed = np.swapaxes(smoothed, -3, -2).reshape(
+        feature.shape[:-2] + (-1, columns.size)
+    )
+    return smoothed.astype(dtype, copy=False)
+
+
 def median_downsample_feature_sequence(
     feature, samplerate, filter_len: int, downsampling: int
 ):
     """Smooths and down-samples a given feature-sequence and its samplerate
     using a median filter.
+    Only the columns kept after down-sampling are computed, taking the median of a sliding window
+    over the zero-padded sequence. The result is the same as filtering with
+    ``scipy.signal.medfilt2d`` and dropping the other columns.
 
     :param feature: the feature sequence to smooth and down-sample
     :param samplerate: the samplerate of the feature sequence
@@ -124,34 +848,56 @@ def median_downsample_feature_sequence(
     if filter_len % 2 != 1:
         filter_len = filter_len + 1
 
-    filter_len = [1, filter_len]
-    feature_smooth = signal.medfilt2d(feature, filter_len)
-    feature_smooth = feature_smooth[:, ::downsampling]
+    if feature.dtype not in (np.float32, np.float64):
+        feature = feature.astype(np.float64)
+    reach = filter_len // 2
+    padded = np.pad(feature, ((0, 0), (reach, reach)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, filter_len, axis=1)[
+        :, ::downsampling
+    ]
+
+    # the median copies its windows, so limit how many are processed at once
+    feature_smooth = np.empty(windows.shape[:2], dtype=feature.dtype)
+    chunk = max(1, MEDIAN_CHUNK_SIZE // (feature.shape[0] * filter_len))
+    for start in range(0, windows.shape[1], chunk):
+        feature_smooth[:, start : start + chunk] = np.median(
+            windows[:, start : start + chunk], axis=-1
+        )
     sr_feature = samplerate / downsampling
 
     return feature_smooth, sr_feature
 
 
-def normalize_feature_sequence(feature):
+def normalize_feature_sequence(feature, dtype=np.float64):
     """Normalize a given feature sequence using L2-norm.
 
-    :param feature: the feature sequence to normalize
+    :param feature: the feature sequence to normalize (features x frames), or several of them
+        (... x features x frames)
+    :param dtype: the data type of the result (default: float64)
     :returns: the normalized feature sequence.
     """
-    n, m = feature.shape
-    feature_norm = np.zeros((n, m))
+    n = feature.shape[-2]
+    feature = feature.astype(dtype, copy=False)
 
-    v = np.ones(n, dtype=np.float64) / np.sqrt(n)
-    for i in range(m):
-        s = np.sqrt(np.sum(feature[:, i] ** 2))
-        if s > 0.001:
-            feature_norm[:, i] = feature[:, i] / s
-        else:
-            feature_norm[:, i] = v
+    v = np.ones(n, dtype=dtype) / np.sqrt(n, dtype=dtype)
+    s = np.sqrt(np.sum(feature**2, axis=-2, keepdims=True))
+    valid = s > 0.001
+    feature_norm = np.empty(feature.shape, dtype=dtype)
+    feature_norm[...] = v[:, np.newaxis]
+    np.divide(feature, s, out=feature_norm, where=valid)
 
     return feature_norm
 
 
+def _precision_dtype(precision: Precision):
+    """Get the floating point type computations are done in for the given precision.
+
+    :param precision: the precision, see :class:`Precision`
+    :returns: the data type.
+    """
+    return np.float64 if precision == Precision.FLOAT64 else np.float32
+
+
 def create_gaussian_checkerboard_kernel(n: int, var=1.0, normalize=True):
     """Computes a gaussian checkerboard kernel to smooth and detect edges and
     corners in a given matrix.
@@ -175,29 +921,116 @@ def create_gaussian_checkerboard_kernel(n: int, var=1.0, normalize=True):
     return kernel
 
 
-def compute_self_similarity(feature, samplerate, filter_len=41, downsampling=8):
+@lru_cache(maxsize=32)
+def get_gaussian_checkerboard_kernel(n: int, var=1.0):
+    """Returns a cached, normalized gaussian checkerboard kernel.
+    Kernels are created once per (n, var) combination using
+    :func:`create_gaussian_checkerboard_kernel` and reused for every following call.
+    The returned array is read-only, since it is shared between all callers.
+
+    :param n: length of one quadrant in the resulting kernel
+    :param var: the variance of the resulting kernel (default: 1.0)
+    :returns: gaussian checkerboard kernel of length 2 * n + 1.
+    """
+    kernel = create_gaussian_checkerboard_kernel(n, var=var)
+    kernel.setflags(write=False)
+    return kernel
+
+
+class FeatureProjection:
+    """Projects the feature frames of one file to fewer dimensions, see :class:`Projection`.
+
+    The projection is applied to every frame before stacking. This is the same as projecting each
+    stacked copy with the same matrix, so the stacked feature is cut from
+    ``STACK_MEMORY_STEPS * features`` to ``STACK_MEMORY_STEPS * dim`` dimensions, and stacking,
+    smoothing, normalization and the self similarity matrix all get cheaper.
+    Every window of a file has to be projected the same way, so the PCA is fitted on the first
+    sequence the projection is called with and kept for all further ones.
+
+    :param projection: The projection to use. (default: RANDOM)
+    :param dim: The number of dimensions to project to. Features that don't have more dimensions
+        are not projected. (default: ``PROJECTION_DIM``)
+    """
+
+    def __init__(self, projection=Projection.RANDOM, dim=PROJECTION_DIM):
+        self.projection = projection
+        self.dim = dim
+        self._matrix = None
+
+    def __call__(self, feature):
+        """Project a feature sequence.
+
+        :param feature: the feature sequence (features x frames)
+        :returns: the projected feature sequence (dim x frames).
+        """
+        if self.projection == Projection.NONE or feature.shape[0] <= self.dim:
+            return feature
+        if self._matrix is None:
+            self._matrix = self._fit(feature).astype(feature.dtype)
+        return self._matrix @ feature
+
+    def _fit(self, feature):
+        """Create the projection matrix.
+
+        :param feature: the feature sequence to fit the PCA on
+        :returns: the projection matrix (dim x features).
+        """
+        if self.projection == Projection.RANDOM:
+            rng = np.random.default_rng(PROJECTION_SEED)
+            return rng.standard_normal((self.dim, feature.shape[0])) / np.sqrt(self.dim)
+        # the frames are compared by their angles, so they are not centered, and the
+        # components are the eigenvectors of the (small) gram matrix of the features
+        feature = feature.astype(np.float64)
+        _, eigenvectors = np.linalg.eigh(feature @ np.transpose(feature))
+        return np.transpose(eigenvectors[:, : -self.dim - 1 : -1])
+
+
+def compute_self_similarity(
+    feature,
+    samplerate,
+    filter_len=41,
+    downsampling=8,
+    band_width=None,
+    precision=Precision.FLOAT32,
+    stack_delay=STACK_MEMORY_DELAY,
+):
     """Computes the self similarity matrix for a given feature sequence.
     Before calculating the SSM, this function stacks the feature on top of itself,
     smooths and downsamples the input feature using :func:`smooth_downsample_feature_sequence` and
     normalizes it with :func:`normalize_feature_sequence`.
 
+    If a band width is given, only the diagonals up to that distance from the main diagonal are
+    computed and a :class:`BandedSSM` is returned instead of the full matrix.
+
     :param feature: the feature sequence
     :param samplerate: the sample-rate
     :param filter_len: length for the filter kernel, needs to be odd (incremented by one if even)
         (default: 41)
     :param downsampling: down-sampling rate for feature sequence (default: 8)
+    :param band_width: the highest lag to compute, or None to compute the full matrix
+        (default: None)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
+    :param stack_delay: the delay between the stacked copies of the feature, in columns
+        (default: ``STACK_MEMORY_DELAY``)
     :returns: the self similarity matrix, the resulting sample-rate.
     """
+    dtype = _precision_dtype(precision)
     # stack feature on top of itself, with a delay
-    chroma = librosa.feature.stack_memory(feature, n_steps=4, delay=8)
+    chroma = librosa.feature.stack_memory(
+        feature.astype(dtype, copy=False),
+        n_steps=STACK_MEMORY_STEPS,
+        delay=stack_delay,
+    )
     # feature smoothing
     chroma, downsampled_sr = smooth_downsample_feature_sequence(
         chroma, samplerate, filter_len=filter_len, downsampling=downsampling
     )
     # normalization
-    chroma = normalize_feature_sequence(chroma)
+    chroma = normalize_feature_sequence(chroma, dtype)
 
     # compute self similarity matrix
+    if band_width is not None:
+        return BandedSSM.from_feature(chroma, band_width), downsampled_sr
     ssm = np.dot(np.transpose(chroma), chroma)
 
     # Debug Plotting
@@ -208,12 +1041,281 @@ def compute_self_similarity(feature, samplerate, filter_len=41, downsampling=8):
     return ssm, downsampled_sr
 
 
-def compute_novelty_ssm(ssm, kernel=None, n=8, var=0.5, exclude=False):
+def compute_self_similarity_batch(
+    features,
+    samplerate,
+    filter_len=41,
+    downsampling=8,
+    band_width=2 * NOVELTY_KERNEL_SIZE,
+    precision=Precision.FLOAT32,
+):
+    """Computes the banded self similarity matrices of several equally long feature sequences at
+    once. The results are the same as calling :func:`compute_self_similarity` with the
+    ``band_width`` for each of them.
+
+    The sequences are processed as one 3D array, so stacking, smoothing, normalization and every
+    diagonal of the band are computed once for all of them instead of once per sequence.
+    Stacking and smoothing are combined, see :func:`_stacked_boxcar_columns`.
+
+    :param features: the feature sequences, of shape (blocks, features, frames)
+    :param samplerate: the sample-rate
+    :param filter_len: length for the filter kernel, needs to be odd (incremented by one if even)
+        (default: 41)
+    :param downsampling: down-sampling rate for feature sequence (default: 8)
+    :param band_width: the highest lag to compute (default: ``2 * NOVELTY_KERNEL_SIZE``)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
+    :returns: the :class:`BandedSSM` holding all matrices, the resulting sample-rate.
+    """
+    if filter_len % 2 != 1:
+        filter_len = filter_len + 1
+    dtype = _precision_dtype(precision)
+    columns = _stacked_boxcar_columns(
+        features.astype(dtype, copy=False),
+        filter_len,
+        range(0, features.shape[-1], downsampling),
+        dtype,
+    )
+    columns = normalize_feature_sequence(columns, dtype)
+    return BandedSSM.from_feature(columns, band_width), samplerate / downsampling
+
+
+class StackedWindow:
+    """The stacked feature sequence of a window and its running sums, computed once and shared
+    by several :class:`SelfSimilarityBuilder` with different smoothing and down-sampling.
+
+    :param feature: the feature sequence of the window
+    :param precision: the numeric precision to use, see :class:`Precision`
+        (default: FLOAT32)
+    """
+
+    def __init__(self, feature, precision=Precision.FLOAT32):
+        self.dtype = _precision_dtype(precision)
+        self._cumulative = _running_sums(
+            librosa.feature.stack_memory(
+                feature.astype(self.dtype, copy=False),
+                n_steps=STACK_MEMORY_STEPS,
+                delay=STACK_MEMORY_DELAY,
+            )
+        )
+
+    def smoothed_columns(self, filter_len: int, columns: range):
+        """Smooth the given columns of the stacked feature sequence.
+
+        :param filter_len: length of the smoothing filter, must be odd
+        :param columns: the columns to compute
+        :returns: the smoothed columns.
+        """
+        return _boxcar_from_running_sums(
+            self._cumulative, filter_len, columns, self.dtype
+        )
+
+
+class SelfSimilarityBuilder:
+    """Computes the self similarity matrices of consecutive, overlapping windows of one
+    feature sequence, equivalent to calling :func:`compute_self_similarity` for each of them.
+
+    Stacking and smoothing only depend on a few frames around each column, so columns that are
+    far enough from the window edges are the same in every window containing them.
+    The builder keeps the previous window's normalized columns and similarity values and only
+    computes the columns and similarities that are new or affected by the window edges.
+
+    This requires the overlapping frames of consecutive windows to hold the same values and
+    windows to advance by a multiple of the down-sampling rate. Otherwise, the whole window is
+    computed from scratch.
+    """
+
+    def __init__(
+        self,
+        samplerate,
+        filter_len=41,
+        downsampling=8,
+        band_width=None,
+        precision=Precision.FLOAT32,
+    ):
+        """Create a builder for the given parameters, see :func:`compute_self_similarity`.
+
+        :param samplerate: the sample-rate
+        :param filter_len: length for the filter kernel, needs to be odd
+            (incremented by one if even) (default: 41)
+        :param downsampling: down-sampling rate for feature sequence (default: 8)
+        :param band_width: the highest lag to compute, or None to compute the full matrix
+            (default: None)
+        :param precision: the numeric precision to use, see :class:`Precision`
+            (default: FLOAT32)
+        """
+        self.samplerate = samplerate
+        self.filter_len = filter_len if filter_len % 2 == 1 else filter_len + 1
+        self.downsampling = downsampling
+        self.band_width = band_width
+        self.precision = precision
+        self._offset = None
+        self._columns = None
+        self._stable = range(0)
+        self._ssm = None
+
+    def update(self, feature, offset: int, stacked=None):
+        """Compute the self similarity matrix for the next window.
+
+        :param feature: the feature sequence of the window
+        :param offset: the position of the window's first frame in the whole feature sequence
+        :param stacked: the window's :class:`StackedWindow`, if it is shared with other builders
+            (default: None)
+        :returns: the self similarity matrix, the resulting sample-rate.
+        """
+        offset = int(offset)
+        frames = feature.shape[1]
+        size = -(-frames // self.downsampling)
+        stable = self._stable_columns(frames)
+
+        # columns shared with and unaffected by the edges of the previous window
+        reused = range(0)
+        shift = 0
+        if (
+            self._offset is not None
+            and (offset - self._offset) % self.downsampling == 0
+            and self._columns.shape[0] == feature.shape[0] * STACK_MEMORY_STEPS
+        ):
+            shift = (offset - self._offset) // self.downsampling
+            start = max(stable.start, self._stable.start - shift)
+            stop = min(stable.stop, self._stable.stop - shift)
+            if stop > start:
+                reused = range(start, stop)
+
+        columns = np.empty(
+            (feature.shape[0] * STACK_MEMORY_STEPS, size),
+            dtype=_precision_dtype(self.precision),
+        )
+        if len(reused) > 0:
+            columns[:, reused.start : reused.stop] = self._columns[
+                :, reused.start + shift : reused.stop + shift
+            ]
+        for start, stop in [(0, reused.start), (reused.stop, size)]:
+            if stop > start:
+                columns[:, start:stop] = normalize_feature_sequence(
+                    self._smoothed_columns(feature, start, stop, stacked),
+                    _precision_dtype(self.precision),
+                )
+
+        if self.band_width is None:
+            ssm = self._dense_ssm(columns, reused, shift)
+        else:
+            ssm = self._banded_ssm(columns, reused, shift)
+
+        self._offset = offset
+        self._columns = columns
+        self._stable = stable
+        self._ssm = ssm
+        return ssm, self.samplerate / self.downsampling
+
+    def _stable_columns(self, frames: int):
+        """Get the down-sampled columns of a window that don't depend on the window's edges.
+
+        :param frames: the length of the window, in feature frames
+        :returns: the range of stable columns.
+        """
+        reach = self.filter_len // 2
+        history = (STACK_MEMORY_STEPS - 1) * STACK_MEMORY_DELAY
+        start = -(-(reach + history) // self.downsampling)
+        stop = (frames - reach - 1) // self.downsampling + 1
+        return range(start, max(start, stop))
+
+    def _smoothed_columns(self, feature, start: int, stop: int, stacked=None):
+        """Stack and smooth the given range of down-sampled columns of a window,
+        with the same results as stacking and smoothing the whole window.
+
+        :param feature: the feature sequence of the window
+        :param start: the first down-sampled column to compute
+        :param stop: the down-sampled column to stop at
+        :param stacked: the window's shared :class:`StackedWindow` (default: None)
+        :returns: the stacked and smoothed columns.
+        """
+        reach = self.filter_len // 2
+        history = (STACK_MEMORY_STEPS - 1) * STACK_MEMORY_DELAY
+        first = start * self.downsampling
+        last = (stop - 1) * self.downsampling
+        if stacked is not None:
+            return stacked.smoothed_columns(
+                self.filter_len, range(first, last + 1, self.downsampling)
+            )
+        smooth_start = max(0, first - reach)
+        smooth_stop = min(feature.shape[1], last + reach + 1)
+        stack_start = max(0, smooth_start - history)
+
+        dtype = _precision_dtype(self.precision)
+        stacked = librosa.feature.stack_memory(
+            feature[:, stack_start:smooth_stop].astype(dtype, copy=False),
+            n_steps=STACK_MEMORY_STEPS,
+            delay=STACK_MEMORY_DELAY,
+        )[:, smooth_start - stack_start :]
+        return _boxcar_columns(
+            stacked,
+            self.filter_len,
+            range(first - smooth_start, last - smooth_start + 1, self.downsampling),
+        )
+
+    def _dense_ssm(self, columns, reused: range, shift: int):
+        """Compute the full self similarity matrix, reusing the previous one where possible.
+
+        :param columns: the normalized columns of the window
+        :param reused: the columns taken over from the previous window
+        :param shift: how many columns the window moved
+        :returns: the self similarity matrix.
+        """
+        size = columns.shape[1]
+        ssm = np.empty((size, size), dtype=_precision_dtype(self.precision))
+        start, stop = reused.start, reused.stop
+        if stop > start:
+            ssm[start:stop, start:stop] = self._ssm[
+                start + shift : stop + shift, start + shift : stop + shift
+            ]
+        for rows in [slice(0, start), slice(stop, size)]:
+            ssm[rows, :] = np.dot(np.transpose(columns[:, rows]), columns)
+            ssm[:, rows] = np.transpose(ssm[rows, :])
+        return ssm
+
+    def _banded_ssm(self, columns, reused: range, shift: int):
+        """Compute the banded self similarity matrix, reusing the previous one where possible.
+
+        :param columns: the normalized columns of the window
+        :param reused: the columns taken over from the previous window
+        :param shift: how many columns the window moved
+        :returns: the :class:`BandedSSM`.
+        """
+        size = columns.shape[1]
+        band = np.zeros(
+            (self.band_width + 1, size), dtype=_precision_dtype(self.precision)
+        )
+        for lag in range(min(self.band_width, size - 1) + 1):
+            # entries where both columns were reused can be taken from the previous band
+            start = reused.start
+            stop = max(start, reused.stop - lag)
+            if stop > start:
+                band[lag, start:stop] = self._ssm.band[
+                    lag, start + shift : stop + shift
+                ]
+            for first, last in [(0, min(start, size - lag)), (stop, size - lag)]:
+                if last > first:
+                    band[lag, first:last] = np.einsum(
+                        "ij,ij->j",
+                        columns[:, first:last],
+                        columns[:, first + lag : last + lag],
+                    )
+        return BandedSSM(band)
+
+
+def compute_novelty_ssm(
+    ssm, kernel=None, n=8, var=0.5, exclude=False, precision=Precision.FLOAT32
+):
     """Computes the novelty function for the given self similarity matrix.
     The resulting function will be a 1D representation of the SSM where peaks
     indicate edges / corners. The SSM will be padded by reflecting values, therefore
     the first and last n values will be inaccurate (these can be excluded and set to 0).
-    The result will be normalized to a range of [0 - 1.0].
+    The result will be normalized to a range of [0 - 1.0]. A constant novelty function (e.g. of an
+    SSM that is too small for the kernel) is all zeros.
+
+    The SSM can either be a full matrix or a :class:`BandedSSM`. A banded SSM needs to store
+    at least 2 * n diagonals next to the main diagonal. Both may hold the matrices of several
+    blocks in their leading dimensions, then one novelty function is computed per block.
 
     :param ssm: the self similarity matrix
     :param kernel: the kernel for edge / corner detection (default: gaussian checkerboard)
@@ -221,27 +1323,96 @@ def compute_novelty_ssm(ssm, kernel=None, n=8, var=0.5, exclude=False):
     :param var: variance for the default gaussian checkerboard kernel (default: 0.5)
     :param exclude: whether to exclude the start and end of the resulting novelty function.
         If True this sets both the start and end to 0. (default: False)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
     :returns: the resulting novelty function. Peaks indicate edges / corners (transitions).
     """
     if kernel is None:
-        kernel = create_gaussian_checkerboard_kernel(n, var=var)
-
-    N = ssm.shape[0]
-    M = 2 * n + 1
-    nov = np.zeros(N)
-    ssm_padded = np.pad(ssm, n, mode="reflect")
-
-    for i in range(N):
-        nov[i] = np.sum(ssm_padded[i : i + M, i : i + M] * kernel)
+        kernel = get_gaussian_checkerboard_kernel(n, var=var)
+    dtype = _precision_dtype(precision)
+
+    if isinstance(ssm, BandedSSM):
+        if ssm.width < 2 * n:
+            raise ValueError("Band of the SSM is too narrow for the kernel.")
+        N = ssm.size
+        nov = _correlate_diagonal(N, n, kernel, ssm.diagonal, ssm.entries, dtype)
+    else:
+        N = ssm.shape[-1]
+        nov = _correlate_diagonal(
+            N,
+            n,
+            kernel,
+            lambda offset: np.diagonal(ssm, offset=offset, axis1=-2, axis2=-1),
+            lambda rows, cols: ssm[..., rows, cols],
+            dtype,
+        )
 
     # Normalize to [0.0 - 1.0]
-    nov = (nov - np.min(nov)) / (np.max(nov) - np.min(nov))
+    lowest = np.min(nov, axis=-1, keepdims=True)
+    span = np.max(nov, axis=-1, keepdims=True) - lowest
+    nov = np.divide(nov - lowest, span, out=np.zeros_like(nov), where=span > 0)
 
     if exclude:
         right = np.min([n, N])
         left = np.max([0, N - n])
-        nov[0:right] = 0
-        nov[left:N] = 0
+        nov[..., 0:right] = 0
+        nov[..., left:N] = 0
+
+    return nov
+
+
+def _correlate_diagonal(N: int, n: int, kernel, diagonal, entries, dtype=np.float64):
+    """Correlates the given kernel with a matrix along the matrix' main diagonal.
+    This is equivalent to placing the kernel on every diagonal entry of the matrix
+    (padded by reflecting values) and summing up the element-wise product, but only ever
+    reads the band of diagonals the kernel covers.
+
+    Windows that are fully inside the matrix are computed in one vectorized pass by
+    correlating every covered diagonal of the matrix with the matching diagonal of the kernel.
+    The first and last n windows reach into the reflected padding and are gathered explicitly.
+
+    :param N: the size of the (square) matrix
+    :param n: length of one quadrant of the kernel
+    :param kernel: the kernel to correlate with, of shape (2 * n + 1, 2 * n + 1)
+    :param diagonal: a function returning the diagonal of the matrix at the given offset,
+        in the same format as :func:`numpy.diagonal`. The diagonal may have leading dimensions
+        for several matrices.
+    :param entries: a function returning the matrix' entries at the given row and column indices
+    :param dtype: the data type to compute the correlation in (default: float64)
+    :returns: the correlation for each entry on the main diagonal.
+    """
+    M = 2 * n + 1
+    nov = np.zeros(diagonal(0).shape, dtype=dtype)
+    kernel = kernel.astype(dtype, copy=False)
+
+    # windows fully inside the matrix: sum over all diagonals the kernel covers
+    if N >= M:
+        for offset in range(-(M - 1), M):
+            kernel_diagonal = np.diagonal(kernel, offset=offset)
+            if nov.ndim == 1:
+                nov[n : N - n] += np.correlate(
+                    diagonal(offset).astype(dtype, copy=False),
+                    kernel_diagonal,
+                    mode="valid",
+                )
+            else:
+                nov[..., n : N - n] += (
+                    np.lib.stride_tricks.sliding_window_view(
+                        diagonal(offset).astype(dtype, copy=False),
+                        kernel_diagonal.shape[0],
+                        axis=-1,
+                    )
+                    @ kernel_diagonal
+                )
+
+    # windows reaching into the reflected padding
+    edges = np.arange(N) if N < M else np.r_[0:n, N - n : N]
+    if edges.size > 0:
+        reflected = np.pad(np.arange(N), n, mode="reflect")
+        indices = reflected[edges[:, np.newaxis] + np.arange(M)]
+        windows = entries(indices[:, :, np.newaxis], indices[:, np.newaxis, :])
+        nov[..., edges] = np.einsum(
+            "...ijk,jk->...i", windows.astype(dtype, copy=False), kernel
+        )
 
     return nov
 
@@ -283,6 +1454,8 @@ def select_peaks(novelty, peak_threshold=0.5, downsampling=8, offset=0.0):
     #     plt.vlines(x, ymin=0, ymax=0.01, colors='red', label=f'Peak: {x}')
     # plt.show()
 
+    # peak_pick returns a float array if there are no peaks
+    peaks = peaks.astype(int, copy=False)
     # upsampling
     peaks *= downsampling
     peaks += int(offset)
@@ -302,6 +1475,94 @@ def filter_peaks(peaks, n=3):
     return np.sort([k for k, v in dict(zip(unique, counts)).items() if v >= n])
 
 
+class TransitionVoter:
+    """Counts the votes of overlapping blocks for transitions while the blocks are processed.
+    This is the incremental version of :func:`filter_peaks`: a transition is accepted if at least
+    ``n`` blocks voted for it.
+
+    Blocks only vote for transitions at or after their own offset, so once blocks are processed in
+    order of their offsets, a transition before the current block's offset can't receive any
+    more votes and is final.
+    """
+
+    def __init__(self, n=3, tolerance=0):
+        """Create a voter.
+
+        :param n: The minimum number of votes for a transition to be accepted (default: 3)
+        :param tolerance: The distance in audio frames up to which votes count for the same
+            transition. The transition is placed at the position with the most votes.
+            (default: 0)
+        """
+        self.n = n
+        self.tolerance = tolerance
+        self._votes = Counter()
+        self._accepted = []
+        self._excluded = []
+
+    def vote(self, peaks):
+        """Add one vote for each of the given transitions.
+
+        :param peaks: The transitions, in audio frames
+        """
+        self._votes.update(int(peak) for peak in peaks)
+
+    def accept(self, transition, start, stop):
+        """Accept a transition without any votes, e.g. the middle of a gap of silence.
+        Voted transitions between ``start`` and ``stop`` are dropped in favour of it.
+
+        :param transition: The transition, in audio frames
+        :param start: The first audio frame in which voted transitions are dropped
+        :param stop: The audio frame after the last one in which voted transitions are dropped
+        """
+        self._accepted.append(int(transition))
+        self._excluded.append((int(start), int(stop)))
+
+    def finalize(self, before=None):
+        """Get all transitions that are final and remove them from the voter.
+
+        :param before: The offset of the next block to process, in audio frames.
+            If None, all remaining transitions are final. (default: None)
+        :return: The accepted final transitions, sorted.
+        """
+        accepted = []
+        for cluster in self._clusters():
+            # a later vote may still count for this transition
+            if before is not None and cluster[-1] + self.tolerance >= before:
+                break
+            peak = max(cluster, key=self._votes.__getitem__)
+            if sum(self._votes[position] for position in cluster) >= self.n and not any(
+                start <= peak < stop for start, stop in self._excluded
+            ):
+                accepted.append(peak)
+            for position in cluster:
+                del self._votes[position]
+
+        accepted += [peak for peak in self._accepted if before is None or peak < before]
+        self._accepted = [
+            peak for peak in self._accepted if before is not None and peak >= before
+        ]
+        # later transitions can't fall into ranges ending before the next block
+        self._excluded = [
+            (start, stop)
+            for start, stop in self._excluded
+            if before is not None and stop > before
+        ]
+        return sorted(set(accepted))
+
+    def _clusters(self):
+        """Group the positions voted for into transitions, see ``tolerance``.
+
+        :return: A list of sorted lists of positions, sorted by position.
+        """
+        clusters = []
+        for position in sorted(self._votes):
+            if clusters and position - clusters[-1][-1] <= self.tolerance:
+                clusters[-1].append(position)
+            else:
+                clusters.append([position])
+        return clusters
+
+
 def segment_block(
     block,
     samplerate,
@@ -311,6 +1572,8 @@ def segment_block(
     downsampling=8,
     threshold=0.5,
     offset=0.0,
+    full_ssm=False,
+    precision=Precision.FLOAT32,
 ):
     """Segments a data array into segments, where each segment represents
     a different part in the audio.
@@ -326,85 +1589,1270 @@ def segment_block(
     :param threshold: the threshold for peak selection (default: 0.5)
     :param offset: an offset (in audio frames) to calculate indices for consecutive
         calls correctly (default: 0.0)
+    :param full_ssm: whether to compute the full self similarity matrix instead of only the band
+        needed for the novelty function. This is meant for debugging. (default: False)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
     :returns: a list of indexes, where transitions should be.
     """
-    if feature == FeatureType.CHROMA:
-        feature_seq = extract_chroma(block, samplerate, hop_length, fft_window=2048)
-    elif feature == FeatureType.SPECTRAL:
-        feature_seq = extract_spectro(block, samplerate, hop_length, fft_window=2048)
-    else:
-        raise TypeError("Illegal Feature Value.")
+    feature_seq = extract_feature(
+        block, samplerate, hop_length, feature, fft_window=2048
+    )
+    return segment_feature_sequence(
+        feature_seq,
+        samplerate,
+        filter_len=filter_len,
+        downsampling=downsampling,
+        threshold=threshold,
+        offset=offset,
+        full_ssm=full_ssm,
+        precision=precision,
+    )
 
-    ssm, _ = compute_self_similarity(
-        feature_seq, samplerate, filter_len=filter_len, downsampling=downsampling
+
+def segment_feature_sequence(
+    feature_seq,
+    samplerate,
+    filter_len=41,
+    downsampling=8,
+    threshold=0.5,
+    offset=0.0,
+    full_ssm=False,
+    ssm_builder=None,
+    precision=Precision.FLOAT32,
+    stacked=None,
+    beat_sync=False,
+    hop_length=None,
+):
+    """Segments an already extracted feature sequence, see :func:`segment_block`.
+
+    :param feature_seq: the feature sequence of the current block
+    :param samplerate: sample rate of the audio stream
+    :param filter_len: the length of the filter (default: 41)
+    :param downsampling: the downsampling factor to use (default: 8)
+    :param threshold: the threshold for peak selection (default: 0.5)
+    :param offset: an offset (in audio frames) to calculate indices for consecutive
+        calls correctly (default: 0.0)
+    :param full_ssm: whether to compute the full self similarity matrix instead of only the band
+        needed for the novelty function. This is meant for debugging. (default: False)
+    :param ssm_builder: a :class:`SelfSimilarityBuilder` to compute the SSM with, reusing the
+        previous window's results. Its parameters take precedence over ``filter_len``,
+        ``downsampling``, ``full_ssm`` and ``precision``. (default: None)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
+    :param stacked: the :class:`StackedWindow` of the feature sequence, to pass on to the
+        ``ssm_builder`` (default: None)
+    :param beat_sync: whether to aggregate the features per beat first, see
+        :func:`segment_beat_sequence`. ``downsampling``, ``ssm_builder`` and ``stacked`` are
+        not used then. (default: False)
+    :param hop_length: hop length of the audio stream, needed with ``beat_sync`` to find the
+        beats (default: None)
+    :returns: a list of indexes, where transitions should be.
+    """
+    if beat_sync:
+        return segment_beat_sequence(
+            *beat_sync_feature_sequence(feature_seq, samplerate, hop_length),
+            samplerate,
+            filter_len=filter_len,
+            threshold=threshold,
+            offset=offset,
+            full_ssm=full_ssm,
+            precision=precision,
+        )
+    if ssm_builder is not None:
+        ssm, _ = ssm_builder.update(feature_seq, offset, stacked=stacked)
+        precision = ssm_builder.precision
+    else:
+        ssm, _ = compute_self_similarity(
+            feature_seq,
+            samplerate,
+            filter_len=filter_len,
+            downsampling=downsampling,
+            band_width=None if full_ssm else 2 * NOVELTY_KERNEL_SIZE,
+            precision=precision,
+        )
+    nov = compute_novelty_ssm(
+        ssm, n=NOVELTY_KERNEL_SIZE, exclude=False, precision=precision
     )
-    nov = compute_novelty_ssm(ssm, n=8, exclude=False)
     return select_peaks(
         nov, peak_threshold=threshold, downsampling=downsampling, offset=offset
     )
 
 
-def segment_file(path, preset=Preset.NORMAL):
+def segment_feature_batch(
+    features,
+    samplerate,
+    offsets,
+    filter_len=41,
+    downsampling=8,
+    threshold=0.5,
+    precision=Precision.FLOAT32,
+):
+    """Segments several equally long feature sequences at once, see
+    :func:`segment_feature_sequence`.
+    The self similarity matrices and novelty functions of all sequences are computed together,
+    see :func:`compute_self_similarity_batch`, so the cost per sequence does not depend on the
+    number of numpy calls. This pays off most for small matrices, e.g. with high down-sampling.
+    Only the peaks are picked per sequence.
+
+    :param features: the feature sequences, of shape (blocks, features, frames)
+    :param samplerate: sample rate of the audio stream
+    :param offsets: the offset (in audio frames) of every sequence
+    :param filter_len: the length of the filter (default: 41)
+    :param downsampling: the downsampling factor to use (default: 8)
+    :param threshold: the threshold for peak selection (default: 0.5)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
+    :returns: a list of indexes, where transitions should be, for every sequence.
+    """
+    ssm, _ = compute_self_similarity_batch(
+        features,
+        samplerate,
+        filter_len=filter_len,
+        downsampling=downsampling,
+        precision=precision,
+    )
+    novelty = compute_novelty_ssm(ssm, n=NOVELTY_KERNEL_SIZE, precision=precision)
+    return [
+        select_peaks(
+            nov, peak_threshold=threshold, downsampling=downsampling, offset=offset
+        )
+        for nov, offset in zip(novelty, offsets)
+    ]
+
+
+def track_beats(onset_envelope, samplerate, hop_length: int):
+    """Finds the beats of an onset strength envelope.
+    The tempo is the lag between :data:`MIN_BEAT_TEMPO` and :data:`MAX_BEAT_TEMPO` at which the
+    envelope's autocorrelation is strongest, and every frame with the strongest onset within one
+    beat length around it is a beat.
+
+    Unlike :func:`librosa.beat.beat_track`, every beat only depends on its surroundings, so
+    overlapping windows find the same beats where they overlap, and no dynamic programming
+    over the whole envelope is needed.
+
+    :param onset_envelope: the onset strength envelope
+    :param samplerate: the sample-rate of the audio stream
+    :param hop_length: the hop-length of the audio stream
+    :returns: the frames of the beats.
+    """
+    frames_per_minute = 60 * samplerate / hop_length
+    min_lag = int(frames_per_minute / MAX_BEAT_TEMPO)
+    max_lag = int(np.ceil(frames_per_minute / MIN_BEAT_TEMPO))
+    if len(onset_envelope) <= max_lag:
+        return np.zeros(0, dtype=int)
+    autocorrelation = librosa.autocorrelate(
+        onset_envelope - np.mean(onset_envelope), max_size=max_lag + 1
+    )
+    beat_len = min_lag + np.argmax(autocorrelation[min_lag:])
+    is_beat = (onset_envelope > 0) & (
+        onset_envelope
+        == ndimage.maximum_filter1d(onset_envelope, beat_len, mode="nearest")
+    )
+    return np.flatnonzero(is_beat)
+
+
+def beat_sync_feature_sequence(feature_seq, samplerate, hop_length: int):
+    """Aggregates a feature sequence per beat. The beats are found in the onset strength of the
+    features themselves, see :func:`track_beats`, and every beat's column is the mean of the
+    frames from its first frame up to the next beat.
+
+    :param feature_seq: the feature sequence
+    :param samplerate: the sample-rate of the audio stream
+    :param hop_length: the hop-length of the audio stream
+    :returns: the beat-synchronous feature sequence (features x beats) and the first frame of
+        every beat.
+    """
+    num_frames = feature_seq.shape[1]
+    if num_frames == 0:
+        return feature_seq, np.zeros(0, dtype=int)
+    onset_envelope = librosa.onset.onset_strength(S=librosa.power_to_db(feature_seq))
+    bounds = librosa.util.fix_frames(
+        track_beats(onset_envelope, samplerate, hop_length), x_min=0, x_max=num_frames
+    )
+    starts = bounds[:-1]
+    synced = np.add.reduceat(feature_seq, starts, axis=1) / np.diff(bounds)
+    return synced.astype(feature_seq.dtype, copy=False), starts
+
+
+def segment_beat_sequence(
+    beat_seq,
+    beat_frames,
+    samplerate,
+    filter_len=41,
+    threshold=0.5,
+    offset=0.0,
+    full_ssm=False,
+    precision=Precision.FLOAT32,
+):
+    """Segments a beat-synchronous feature sequence, see :func:`beat_sync_feature_sequence`.
+
+    The self similarity matrix has one column per beat instead of one per ``downsampling``
+    frames, so at 120 to 180 BPM it is several times smaller than the one of
+    :func:`segment_feature_sequence`. The smoothing filter and the stacking delay are given in
+    frames and converted to beats with the median beat length, so they cover the same time.
+    The transitions are the first frames of the beats the novelty function peaks at.
+
+    :param beat_seq: the beat-synchronous feature sequence of the current block
+    :param beat_frames: the first frame of every beat
+    :param samplerate: sample rate of the audio stream
+    :param filter_len: the length of the filter, in frames (default: 41)
+    :param threshold: the threshold for peak selection (default: 0.5)
+    :param offset: an offset (in audio frames) to calculate indices for consecutive
+        calls correctly (default: 0.0)
+    :param full_ssm: whether to compute the full self similarity matrix instead of only the band
+        needed for the novelty function. This is meant for debugging. (default: False)
+    :param precision: the numeric precision to use, see :class:`Precision` (default: FLOAT32)
+    :returns: a list of indexes, where transitions should be.
+    """
+    beat_len = np.median(np.diff(beat_frames)) if len(beat_frames) > 1 else 1
+    ssm, _ = compute_self_similarity(
+        beat_seq,
+        samplerate,
+        filter_len=max(1, round(filter_len / beat_len)),
+        downsampling=1,
+        band_width=None if full_ssm else 2 * NOVELTY_KERNEL_SIZE,
+        precision=precision,
+        stack_delay=max(1, round(STACK_MEMORY_DELAY / beat_len)),
+    )
+    nov = compute_novelty_ssm(
+        ssm, n=NOVELTY_KERNEL_SIZE, exclude=False, precision=precision
+    )
+    peaks = select_peaks(nov, peak_threshold=threshold, downsampling=1)
+    return beat_frames[peaks] + int(offset)
+
+
+def segment_energy_flux_sequence(
+    feature_seq,
+    samplerate,
+    hop_length,
+    filter_len=41,
+    downsampling=8,
+    threshold=0.5,
+    offset=0.0,
+):
+    """Segments a sequence of :attr:`FeatureType.ENERGY_FLUX` features without a self similarity
+    matrix, by looking for drops in loudness.
+
+    Energy and flux are averaged into one loudness curve, which is smoothed and downsampled
+    like the features of :func:`segment_feature_sequence`. Every frame is compared to the
+    loudest frame of its surroundings, :data:`ENERGY_REFERENCE_LENGTH` seconds around it.
+    How far a frame lies below that level, relative to :data:`ENERGY_DIP_RANGE`, is the
+    novelty. The quietest frames of the dips with a novelty of at least ``threshold`` are the
+    transitions.
+
+    :param feature_seq: the feature sequence of the current block
+    :param samplerate: sample rate of the audio stream
+    :param hop_length: hop length of the audio stream
+    :param filter_len: the length of the loudness smoothing filter (default: 41)
+    :param downsampling: the downsampling factor (default: 8)
+    :param threshold: the threshold for peak selection (default: 0.5)
+    :param offset: an offset (in audio frames) to calculate indices for consecutive
+        calls correctly (default: 0.0)
+    :returns: a list of indexes, where transitions should be.
+    """
+    frames = feature_seq.shape[1]
+    if frames == 0:
+        return np.zeros(0, dtype=int)
+    if filter_len % 2 != 1:
+        filter_len = filter_len + 1
+
+    loudness = np.mean(feature_seq, axis=0, dtype=np.float64)[np.newaxis, :]
+    loudness = _boxcar_columns(loudness, filter_len, range(0, frames, downsampling))[0]
+    frame_rate = samplerate / hop_length / downsampling
+    reference_len = int(ENERGY_REFERENCE_LENGTH * frame_rate) | 1
+    reference = ndimage.maximum_filter1d(
+        loudness, min(reference_len, len(loudness)), mode="nearest"
+    )
+    novelty = np.clip((reference - loudness) / ENERGY_DIP_RANGE, 0, 1)
+
+    # the reference differs between overlapping windows, so only use it to find the dips and
+    # take their quietest frames, which all windows agree on
+    edges = np.flatnonzero(np.diff(novelty >= threshold, prepend=False, append=False))
+    peaks = np.array(
+        [
+            start + np.argmin(loudness[start:stop])
+            for start, stop in zip(edges[::2], edges[1::2])
+        ],
+        dtype=int,
+    )
+    return peaks * downsampling + int(offset)
+
+
+def segment_file(
+    path,
+    preset=Preset.NORMAL,
+    block_len=4096,
+    stream_features=True,
+    prefetch=2,
+    stats=None,
+    analysis_sample_rate=ANALYSIS_SAMPLE_RATE,
+    precision=Precision.FLOAT32,
+    feature_store=None,
+    beat_sync=False,
+    projection=Projection.NONE,
+    projection_dim=PROJECTION_DIM,
+    batch_size=1,
+    pcm_cache=None,
+):
     """Segments a given file into a generator.
-    This function will stream the audio file in blocks of 4096 audio frames with an overlap of
-    25 % between blocks. Each block is segmented using :func:`segment_block`. Transitions will then
-    be filtered to values present more than 3 times.
+    This function will stream the audio file in blocks of ``block_len`` audio frames with an
+    overlap of 25 % between blocks. Each block is segmented using :func:`segment_block`.
+    Transitions will then be filtered to values present more than 3 times, see
+    :class:`TransitionVoter`.
     Finally, the transitions are converted into time units and returned in pairs, resulting in
-    usable audio segments.
+    usable audio segments. Each segment is yielded as soon as no later block can vote for its end
+    anymore, so segments are available before the whole file was analysed.
+
+    Gaps of (near) silence of at least :data:`MIN_SILENCE_GAP` seconds between songs are taken as
+    transitions directly, see :func:`silence_envelope` and :class:`SilenceGaps`. Transitions found
+    close to a gap are dropped in favour of it. Blocks that are at least
+    :data:`SILENT_WINDOW_SHARE` silent are skipped and don't vote at all, so transitions within
+    quiet passages need the votes of the other blocks. Blocks of constant audio are skipped, too.
+
+    By default, features are extracted only once per part of the audio using
+    :func:`overlapping_feature_stream` instead of once for every overlapping block.
+    Self similarity matrices are then built with a :class:`SelfSimilarityBuilder`, which reuses
+    the parts shared by consecutive blocks.
+
+    The next blocks are decoded on a background thread while the current one is analysed, see
+    :class:`modules.audio_stream_io.ReadAheadStream`. If a ``stats`` dict is given, the time spent
+    waiting for decoding (``"decode_stall"``) and the time the decoder spent waiting for the
+    analysis (``"compute_stall"``) are written to it once the file was analysed, in seconds.
+
+    The audio is decoded as mono at ``analysis_sample_rate``, regardless of the file's sample rate.
+    Segmentation does not need more bandwidth, and decoding, memory and STFT work all shrink with
+    the sample rate.
+
+    If a :class:`modules.feature_store.FeatureStore` is given, the extracted features are kept in
+    it. When the same file is segmented again with the same analysis parameters (e.g. with another
+    preset), the file is not decoded again. Its features are memory-mapped from the store instead,
+    and only smoothing, self similarity and peak picking are computed. This only applies
+    to ``stream_features``.
 
     :param path: The path to the File
     :param preset: The values preset used for segmentation (default: NORMAL). See: :class:`Preset`
+    :param block_len: The block length of the stream, in audio frames. Should be divisible
+        by 4. (default: 4096)
+    :param stream_features: Whether to extract the features once while streaming instead of
+        once for every overlapping block. (default: True)
+    :param prefetch: How many blocks to decode ahead. 0 disables decoding ahead. (default: 2)
+    :param stats: A dict to write the stall times to. (default: None)
+    :param analysis_sample_rate: The sample rate to analyse the audio at, or None to analyse it at
+        the file's sample rate. (default: ``ANALYSIS_SAMPLE_RATE``)
+    :param precision: The numeric precision to use, see :class:`Precision`. (default: FLOAT32)
+    :param feature_store: The :class:`modules.feature_store.FeatureStore` to keep the features
+        in, or None to always extract them. (default: None)
+    :param beat_sync: Whether to aggregate every window's features per beat before computing its
+        self similarity matrix, see :func:`segment_beat_sequence`. The preset's down-sampling
+        is not used then. Does not apply to the energy presets. (default: False)
+    :param projection: The projection to reduce the features' dimension with before they are
+        stacked, see :class:`FeatureProjection`. Does not apply to the energy presets.
+        (default: NONE)
+    :param projection_dim: The number of dimensions to project the features to.
+        (default: ``PROJECTION_DIM``)
+    :param batch_size: How many windows to segment at once with :func:`segment_feature_batch`.
+        The windows are then computed from scratch instead of with a
+        :class:`SelfSimilarityBuilder`, which is faster for high down-sampling rates, and
+        segments are yielded up to ``batch_size`` windows later. 1 segments every window on its
+        own. Does not apply to ``beat_sync`` and the energy presets. (default: 1)
+    :param pcm_cache: The :class:`modules.pcm_cache.PcmCache` to read the file through, or None
+        to decode it. A file that is not cached yet is written to the cache while it is
+        segmented, so it does not need to be decoded again to identify, preview or store its
+        songs. (default: None)
     :return: A generator that iterates over the found segments, consisting of the start time and
         duration for the original file.
     """
-    block_len = 4096
-    stream, samplerate, hop_length = read_audio_file_to_stream(
-        path, block_len=block_len
+    windows, samplerate, hop_length = _analysis_windows(
+        path,
+        block_len,
+        stream_features,
+        prefetch,
+        stats,
+        analysis_sample_rate,
+        feature_store,
+        feature_type=preset.feature_type,
+        pcm_cache=pcm_cache,
+    )
+
+    window_peaks = _segment_windows(
+        windows,
+        samplerate,
+        hop_length,
+        preset,
+        stream_features,
+        precision,
+        beat_sync,
+        projection,
+        projection_dim,
+        batch_size,
+    )
+    yield from _vote_segments(window_peaks, samplerate, hop_length, preset, beat_sync)
+
+
+def _vote_segments(window_peaks, samplerate, hop_length, preset, beat_sync):
+    """Votes for the transitions of a file's windows and turns them into segments,
+    see :func:`segment_file`.
+
+    :param window_peaks: every window of the file, in order, and its transitions, or None if it
+        is mostly silent, see :func:`_segment_windows`
+    :param samplerate: sample rate of the audio stream
+    :param hop_length: hop length of the audio stream
+    :param preset: the preset the windows were segmented with
+    :param beat_sync: whether the windows were aggregated per beat
+    :return: A generator that iterates over the found segments, consisting of the start time and
+        duration for the original file.
+    """
+    beat_sync = beat_sync and preset.feature_type != FeatureType.ENERGY_FLUX
+    voter = TransitionVoter(n=3, tolerance=BEAT_VOTE_TOLERANCE if beat_sync else 0)
+    last_transition = 0
+    last_frame_in_audiofile = 0
+    gaps = SilenceGaps(_min_gap_frames(samplerate, hop_length))
+    margin = preset.downsampling * NOVELTY_KERNEL_SIZE
+    for window, peaks in window_peaks:
+        for start, stop in gaps.update(window.silence, window.offset):
+            voter.accept((start + stop) // 2, start - margin, stop + margin)
+
+        # transitions before this block can't receive more votes, and transitions close to
+        # a silence that may still become a gap have to wait for it
+        before = window.offset
+        if gaps.pending is not None:
+            before = min(before, gaps.pending - margin)
+        for transition in voter.finalize(before=before):
+            yield _frames_to_segment(
+                last_transition, transition, samplerate, hop_length
+            )
+            last_transition = transition
+
+        # if the block is mostly silent, the gaps are all we need, so skip
+        if peaks is None:
+            continue
+
+        voter.vote(peaks)
+        last_frame_in_audiofile = window.length + window.offset
+
+    for transition in voter.finalize() + [last_frame_in_audiofile - 1]:
+        yield _frames_to_segment(last_transition, transition, samplerate, hop_length)
+        last_transition = transition
+
+
+def segment_file_presets(
+    path,
+    presets=SPECTRAL_PRESETS,
+    block_len=4096,
+    stream_features=True,
+    prefetch=2,
+    stats=None,
+    analysis_sample_rate=ANALYSIS_SAMPLE_RATE,
+    precision=Precision.FLOAT32,
+    feature_store=None,
+    beat_sync=False,
+    projection=Projection.NONE,
+    projection_dim=PROJECTION_DIM,
+    pcm_cache=None,
+):
+    """Segments a given file with several presets at once.
+    The results are the same as calling :func:`segment_file` for every preset, but the file is
+    only decoded once and its features are only extracted once. Presets of different feature
+    types need their own features, so there is one pass for every feature type.
+    With ``stream_features``, every window's features are also only stacked once, and the
+    running sums used for smoothing are shared by all presets, see :class:`StackedWindow`.
+    Only the smoothed columns, self similarity matrices and peak picking are computed per preset.
+    With ``beat_sync``, the beats of every window are tracked once for all presets, and with a
+    ``projection``, every window is projected once for all presets.
+
+    :param path: The path to the File
+    :param presets: The presets to segment the file with. (default: ``SPECTRAL_PRESETS``)
+        See: :class:`Preset`
+    :param block_len: The block length of the stream, in audio frames. Should be divisible
+        by 4. (default: 4096)
+    :param stream_features: Whether to extract the features once while streaming instead of
+        once for every overlapping block. (default: True)
+    :param prefetch: How many blocks to decode ahead. 0 disables decoding ahead. (default: 2)
+    :param stats: A dict to write the stall times to, see :func:`segment_file`. (default: None)
+    :param analysis_sample_rate: The sample rate to analyse the audio at, or None to analyse it at
+        the file's sample rate. (default: ``ANALYSIS_SAMPLE_RATE``)
+    :param precision: The numeric precision to use, see :class:`Precision`. (default: FLOAT32)
+    :param feature_store: The :class:`modules.feature_store.FeatureStore` to keep the features
+        in, or None to always extract them. (default: None)
+    :param beat_sync: Whether to aggregate the features per beat, see :func:`segment_file`.
+        (default: False)
+    :param projection: The projection to reduce the features' dimension with, see
+        :func:`segment_file`. (default: NONE)
+    :param projection_dim: The number of dimensions to project the features to.
+        (default: ``PROJECTION_DIM``)
+    :param pcm_cache: The :class:`modules.pcm_cache.PcmCache` to read the file through, see
+        :func:`segment_file`. (default: None)
+    :return: A dict mapping every preset to its list of segments, each consisting of the start
+        time and duration for the original file.
+    """
+    segments = {}
+    presets = list(dict.fromkeys(presets))
+    for feature_type in dict.fromkeys(preset.feature_type for preset in presets):
+        segments.update(
+            _segment_file_presets_pass(
+                path,
+                [preset for preset in presets if preset.feature_type == feature_type],
+                block_len,
+                stream_features,
+                prefetch,
+                stats,
+                analysis_sample_rate,
+                precision,
+                feature_store,
+                beat_sync,
+                projection,
+                projection_dim,
+                pcm_cache,
+            )
+        )
+    return {preset: segments[preset] for preset in presets}
+
+
+def _segment_file_presets_pass(
+    path,
+    presets,
+    block_len,
+    stream_features,
+    prefetch,
+    stats,
+    analysis_sample_rate,
+    precision,
+    feature_store,
+    beat_sync,
+    projection,
+    projection_dim,
+    pcm_cache,
+):
+    """Segments a given file with several presets of the same feature type in one pass,
+    see :func:`segment_file_presets` for the parameters.
+
+    :return: A dict mapping every preset to its list of segments.
+    """
+    feature_type = presets[0].feature_type
+    windows, samplerate, hop_length = _analysis_windows(
+        path,
+        block_len,
+        stream_features,
+        prefetch,
+        stats,
+        analysis_sample_rate,
+        feature_store,
+        feature_type=feature_type,
+        pcm_cache=pcm_cache,
     )
 
-    transitions = np.zeros(1)
+    use_ssm = feature_type != FeatureType.ENERGY_FLUX
+    beat_sync = beat_sync and use_ssm
+    tolerance = BEAT_VOTE_TOLERANCE if beat_sync else 0
+    voters = {preset: TransitionVoter(n=3, tolerance=tolerance) for preset in presets}
+    projector = FeatureProjection(projection, projection_dim) if use_ssm else None
+    ssm_builders = dict.fromkeys(presets)
+    if stream_features and use_ssm and not beat_sync:
+        ssm_builders = {
+            preset: SelfSimilarityBuilder(
+                samplerate,
+                filter_len=preset.filter_length,
+                downsampling=preset.downsampling,
+                band_width=2 * NOVELTY_KERNEL_SIZE,
+                precision=precision,
+            )
+            for preset in presets
+        }
     last_frame_in_audiofile = 0
-    for idx, block in enumerate(overlapping_stream(stream)):
-        # if the block is constant, we won't find anything, so skip
-        if np.unique(block).size == 1:
+    gaps = SilenceGaps(_min_gap_frames(samplerate, hop_length))
+    for window in windows:
+        for start, stop in gaps.update(window.silence, window.offset):
+            for preset in presets:
+                margin = preset.downsampling * NOVELTY_KERNEL_SIZE
+                voters[preset].accept(
+                    (start + stop) // 2, start - margin, stop + margin
+                )
+
+        # if the block is mostly silent, the gaps are all we need, so skip
+        if _skip_window(window):
             continue
 
-        offset = idx * block_len * 0.25
-        transitions = np.append(
-            transitions,
-            segment_block(
-                block,
+        window, beats = _prepare_window(
+            window, samplerate, hop_length, beat_sync, projector
+        )
+        stacked = None
+        if not beat_sync and stream_features and use_ssm and len(presets) > 1:
+            stacked = StackedWindow(window.feature, precision=precision)
+        for preset in presets:
+            voters[preset].vote(
+                _segment_window(
+                    window,
+                    samplerate,
+                    hop_length,
+                    preset,
+                    ssm_builders[preset],
+                    precision,
+                    stacked=stacked,
+                    beats=beats,
+                )
+            )
+        last_frame_in_audiofile = window.length + window.offset
+
+    segments = {}
+    for preset in presets:
+        transitions = [0] + voters[preset].finalize() + [last_frame_in_audiofile - 1]
+        segments[preset] = [
+            _frames_to_segment(start, end, samplerate, hop_length)
+            for start, end in pairwise(transitions)
+        ]
+    return segments
+
+
+def _segment_windows(
+    windows,
+    samplerate,
+    hop_length,
+    preset,
+    stream_features,
+    precision,
+    beat_sync,
+    projection,
+    projection_dim,
+    batch_size,
+):
+    """Segments the windows of a file with one preset, see :func:`segment_file` for the
+    parameters.
+    With a ``batch_size`` above 1, equally long windows are collected and segmented together with
+    :func:`segment_feature_batch`. The windows are still yielded in order.
+
+    :param windows: the :class:`FeatureWindow` of the file
+    :param samplerate: the sample-rate of the windows' audio stream
+    :param hop_length: the hop-length of the windows' audio stream
+    :returns: A Generator of every window, after :func:`_prepare_window`, and its transitions,
+        or None if it is mostly silent.
+    """
+    use_ssm = preset.feature_type != FeatureType.ENERGY_FLUX
+    beat_sync = beat_sync and use_ssm
+    projector = FeatureProjection(projection, projection_dim) if use_ssm else None
+    batch_size = batch_size if use_ssm and not beat_sync else 1
+    ssm_builder = None
+    if stream_features and use_ssm and not beat_sync and batch_size == 1:
+        ssm_builder = SelfSimilarityBuilder(
+            samplerate,
+            filter_len=preset.filter_length,
+            downsampling=preset.downsampling,
+            band_width=2 * NOVELTY_KERNEL_SIZE,
+            precision=precision,
+        )
+    # all windows not yielded yet, and whether they are mostly silent
+    pending = []
+    batch = []
+
+    def flush():
+        peaks = iter(
+            segment_feature_batch(
+                np.stack([window.feature for window in batch]),
                 samplerate,
-                hop_length,
-                FeatureType.SPECTRAL,
+                [window.offset for window in batch],
                 filter_len=preset.filter_length,
                 downsampling=preset.downsampling,
                 threshold=preset.peak_threshold,
-                offset=offset,
-            ),
+                precision=precision,
+            )
         )
+        for window, silent in pending:
+            yield window, None if silent else next(peaks)
+        pending.clear()
+        batch.clear()
+
+    for window in windows:
+        if _skip_window(window):
+            if batch:
+                pending.append((window, True))
+            else:
+                yield window, None
+            continue
 
-        if block.ndim == 1:
-            size = block.shape[0]
-        else:
-            size = block.shape[1]
+        window, beats = _prepare_window(
+            window, samplerate, hop_length, beat_sync, projector
+        )
+        if batch_size == 1:
+            yield window, _segment_window(
+                window,
+                samplerate,
+                hop_length,
+                preset,
+                ssm_builder,
+                precision,
+                beats=beats,
+            )
+            continue
+
+        if batch and window.feature.shape != batch[0].feature.shape:
+            yield from flush()
+        pending.append((window, False))
+        batch.append(window)
+        if len(batch) == batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
 
-        last_frame_in_audiofile = (
-            librosa.core.samples_to_frames(size, hop_length=hop_length) + offset
+
+def _prepare_window(window, samplerate, hop_length, beat_sync, projector):
+    """Aggregates a window's features per beat and projects them, if requested.
+
+    :param window: the :class:`FeatureWindow`
+    :param samplerate: sample rate of the audio stream
+    :param hop_length: hop length of the audio stream
+    :param beat_sync: whether to aggregate the features per beat,
+        see :func:`beat_sync_feature_sequence`
+    :param projector: the file's :class:`FeatureProjection`, or None
+    :returns: the window, with projected features unless they were aggregated per beat, and the
+        projected beat-synchronous features and beat frames for :func:`_segment_window`,
+        or None.
+    """
+    if beat_sync:
+        beat_seq, beat_frames = beat_sync_feature_sequence(
+            window.feature, samplerate, hop_length
         )
+        if projector is not None:
+            beat_seq = projector(beat_seq)
+        return window, (beat_seq, beat_frames)
+    if projector is not None:
+        window = window._replace(feature=projector(window.feature))
+    return window, None
 
-    # Filter peaks and insert boundaries
-    transitions = filter_peaks(transitions, n=3)
-    transitions = np.insert(transitions, 0, 0)
-    transitions = np.append(transitions, last_frame_in_audiofile - 1)
 
-    # Generate the segments consisting of start_time and duration
-    for start, end in pairwise(transitions):
-        start_time = librosa.core.frames_to_time(
-            start, sr=samplerate, hop_length=hop_length, n_fft=2048
+def _segment_window(
+    window,
+    samplerate,
+    hop_length,
+    preset,
+    ssm_builder,
+    precision,
+    stacked=None,
+    beats=None,
+):
+    """Segments one :class:`FeatureWindow` with the given preset, using
+    :func:`segment_energy_flux_sequence` for the energy presets,
+    :func:`segment_beat_sequence` if the window's beats are given and
+    :func:`segment_feature_sequence` for all others.
+
+    :param window: the window
+    :param samplerate: sample rate of the audio stream
+    :param hop_length: hop length of the audio stream
+    :param preset: the preset to segment with
+    :param ssm_builder: the :class:`SelfSimilarityBuilder` of the preset, or None
+    :param precision: the numeric precision to use, see :class:`Precision`
+    :param stacked: the :class:`StackedWindow` of the window (default: None)
+    :param beats: the window's beat-synchronous features and beat frames,
+        see :func:`beat_sync_feature_sequence` (default: None)
+    :returns: a list of indexes, where transitions should be.
+    """
+    if beats is not None:
+        return segment_beat_sequence(
+            *beats,
+            samplerate,
+            filter_len=preset.filter_length,
+            threshold=preset.peak_threshold,
+            offset=window.offset,
+            precision=precision,
         )
-        duration = librosa.core.frames_to_time(
-            end - start, sr=samplerate, hop_length=hop_length, n_fft=2048
+    if preset.feature_type == FeatureType.ENERGY_FLUX:
+        return segment_energy_flux_sequence(
+            window.feature,
+            samplerate,
+            hop_length,
+            filter_len=preset.filter_length,
+            downsampling=preset.downsampling,
+            threshold=preset.peak_threshold,
+            offset=window.offset,
         )
+    return segment_feature_sequence(
+        window.feature,
+        samplerate,
+        filter_len=preset.filter_length,
+        downsampling=preset.downsampling,
+        threshold=preset.peak_threshold,
+        offset=window.offset,
+        ssm_builder=ssm_builder,
+        precision=precision,
+        stacked=stacked,
+    )
+
+
+def segment_file_sharded(
+    path,
+    preset=Preset.NORMAL,
+    block_len=4096,
+    workers=None,
+    shard_blocks=None,
+    stream_features=True,
+    prefetch=2,
+    analysis_sample_rate=ANALYSIS_SAMPLE_RATE,
+    precision=Precision.FLOAT32,
+    beat_sync=False,
+    projection=Projection.NONE,
+    projection_dim=PROJECTION_DIM,
+    batch_size=1,
+):
+    """Segments a given file like :func:`segment_file`, but analyses it in several processes.
 
-        yield start_time, duration
+    The file's blocks are cut into shards of ``shard_blocks`` consecutive blocks. Every shard is
+    decoded and segmented in a process pool, together with the first block of the next shard,
+    which the windows starting in its last block reach into. So the shards yield exactly the
+    windows :func:`segment_file` analyses, and their transitions and silence masks are voted on
+    in order in this process, with the same rules. The segments are the same as the ones of
+    :func:`segment_file`, up to rounding of the resampler and of the self similarity matrices
+    of the first window of every shard. Only with the PCA projection, the projection is fitted
+    per shard.
+
+    Every shard decodes and extracts one block more than it segments, so fewer, longer shards
+    waste less work. By default, there is one shard per worker.
+
+    :param path: The path to the File
+    :param preset: The values preset used for segmentation (default: NORMAL). See: :class:`Preset`
+    :param block_len: The block length of the stream, in audio frames. Should be divisible
+        by 4. (default: 4096)
+    :param workers: The number of processes to use, or None to use one per CPU. With one
+        worker, the shards are segmented in this process. (default: None)
+    :param shard_blocks: The number of blocks per shard, or None to split the file evenly
+        between the workers. (default: None)
+    :param stream_features: Whether to extract the features once while streaming instead of
+        once for every overlapping block. (default: True)
+    :param prefetch: How many blocks to decode ahead in every worker. 0 disables decoding ahead.
+        (default: 2)
+    :param analysis_sample_rate: The sample rate to analyse the audio at, or None to analyse it at
+        the file's sample rate. (default: ``ANALYSIS_SAMPLE_RATE``)
+    :param precision: The numeric precision to use, see :class:`Precision`. (default: FLOAT32)
+    :param beat_sync: Whether to aggregate the features per beat, see :func:`segment_file`.
+        (default: False)
+    :param projection: The projection to reduce the features' dimension with, see
+        :func:`segment_file`. (default: NONE)
+    :param projection_dim: The number of dimensions to project the features to.
+        (default: ``PROJECTION_DIM``)
+    :param batch_size: How many windows to segment at once, see :func:`segment_file`.
+        (default: 1)
+    :return: A generator that iterates over the found segments, consisting of the start time and
+        duration for the original file.
+    """
+    samplerate, hop_length = analysis_rates(path, analysis_sample_rate)
+    with open_audio_file(path) as decoder:
+        samples = decoder.frames / decoder.samplerate * samplerate
+    blocks = max(1, int(np.ceil(samples / (block_len * hop_length))))
+    workers = workers or os.cpu_count() or 1
+    shard_blocks = shard_blocks or -(-blocks // workers)
+    segment_shard = partial(
+        _segment_shard,
+        path,
+        preset,
+        block_len,
+        shard_blocks,
+        blocks,
+        stream_features,
+        prefetch,
+        analysis_sample_rate,
+        precision,
+        beat_sync,
+        projection,
+        projection_dim,
+        batch_size,
+    )
+    shards = range(0, blocks, shard_blocks)
+
+    if workers == 1 or len(shards) == 1:
+        window_peaks = chain.from_iterable(map(segment_shard, shards))
+        yield from _vote_segments(
+            window_peaks, samplerate, hop_length, preset, beat_sync
+        )
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as executor:
+        # the shards' results arrive in order
+        window_peaks = chain.from_iterable(executor.map(segment_shard, shards))
+        yield from _vote_segments(
+            window_peaks, samplerate, hop_length, preset, beat_sync
+        )
+
+
+def _segment_shard(
+    path,
+    preset,
+    block_len,
+    shard_blocks,
+    blocks,
+    stream_features,
+    prefetch,
+    analysis_sample_rate,
+    precision,
+    beat_sync,
+    projection,
+    projection_dim,
+    batch_size,
+    start_block,
+):
+    """Segments the windows starting in one shard of a file, see :func:`segment_file_sharded`
+    for the parameters. This runs in the worker processes.
+
+    :param blocks: the estimated number of blocks of the file. The last shard is decoded until
+        the end of the file.
+    :param start_block: the shard's first block
+    :returns: a list of every window of the shard, without its features, and its transitions,
+        or None if it is mostly silent.
+    """
+    last_shard = start_block + shard_blocks >= blocks
+    windows, samplerate, hop_length = _analysis_windows(
+        path,
+        block_len,
+        stream_features,
+        prefetch,
+        None,
+        analysis_sample_rate,
+        None,
+        feature_type=preset.feature_type,
+        start_block=start_block,
+        num_blocks=None if last_shard else shard_blocks + 1,
+    )
+    return [
+        (window._replace(feature=None), peaks)
+        for window, peaks in _segment_windows(
+            windows,
+            samplerate,
+            hop_length,
+            preset,
+            stream_features,
+            precision,
+            beat_sync,
+            projection,
+            projection_dim,
+            batch_size,
+        )
+    ]
+
+
+COARSE_HOP_FACTOR = 4
+"""Default factor the coarse pass of :func:`segment_file_coarse_to_fine` increases the hop length
+by."""
+
+COARSE_DOWNSAMPLING = 8
+"""Default down-sampling rate of the coarse pass of :func:`segment_file_coarse_to_fine`,
+in coarse feature frames."""
+
+REFINE_RADIUS = 256
+"""Default number of feature frames :func:`segment_file_coarse_to_fine` analyses at full
+resolution on each side of a candidate transition. Presets with a high down-sampling rate
+analyse more, see :func:`segment_file_coarse_to_fine`."""
+
+
+def segment_file_coarse_to_fine(
+    path,
+    preset=Preset.NORMAL,
+    block_len=4096,
+    coarse_hop_factor=COARSE_HOP_FACTOR,
+    coarse_downsampling=COARSE_DOWNSAMPLING,
+    refine_radius=REFINE_RADIUS,
+    min_votes=3,
+    prefetch=2,
+    stats=None,
+    analysis_sample_rate=ANALYSIS_SAMPLE_RATE,
+    precision=Precision.FLOAT32,
+    feature_store=None,
+    pcm_cache=None,
+):
+    """Segments a given file in two stages, which is much cheaper for long recordings.
+
+    First, the whole file is segmented at a coarse resolution: features are extracted with a
+    ``coarse_hop_factor`` times larger hop length and down-sampled by ``coarse_downsampling``,
+    using the overlapping windows of :func:`segment_file`. Peaks of the windows lying close
+    together are merged into candidate transitions.
+    Coarse windows that are too short for the novelty kernel after down-sampling are skipped.
+    Then, only ``refine_radius`` feature frames on each side of every candidate are decoded again
+    and segmented with the preset, using :func:`segment_block`. The candidate is moved to the
+    nearest transition found there, or dropped if there is none. So that the kernel fits into
+    the refined range twice, at least ``2 * downsampling * NOVELTY_KERNEL_SIZE`` feature frames
+    of the preset are analysed on each side.
+    Both stages use :func:`compute_self_similarity`, :func:`compute_novelty_ssm` and
+    :func:`select_peaks`. Energy presets don't need this, so the file is segmented with
+    :func:`segment_file` for them.
+
+    If a ``stats`` dict is given, the share of the file that was analysed at full resolution
+    (``"refined_share"``) is written to it, in addition to the stall times of
+    :func:`segment_file`.
+
+    :param path: The path to the File
+    :param preset: The values preset used for both stages, except for the coarse stage's
+        down-sampling (default: NORMAL). See: :class:`Preset`
+    :param block_len: The block length of the stream in the coarse stage, in audio frames.
+        Should be divisible by 4 times ``coarse_hop_factor``. (default: 4096)
+    :param coarse_hop_factor: How many times larger the hop length of the coarse stage is.
+        (default: ``COARSE_HOP_FACTOR``)
+    :param coarse_downsampling: The down-sampling rate of the coarse stage, in coarse feature
+        frames. (default: ``COARSE_DOWNSAMPLING``)
+    :param refine_radius: How many feature frames to analyse at least on each side of a
+        candidate in the fine stage. (default: ``REFINE_RADIUS``)
+    :param min_votes: How many coarse peaks a candidate needs. (default: 3)
+    :param prefetch: How many blocks to decode ahead in the coarse stage. 0 disables decoding
+        ahead. (default: 2)
+    :param stats: A dict to write statistics to. (default: None)
+    :param analysis_sample_rate: The sample rate to analyse the audio at, or None to analyse it at
+        the file's sample rate. (default: ``ANALYSIS_SAMPLE_RATE``)
+    :param precision: The numeric precision to use, see :class:`Precision`. (default: FLOAT32)
+    :param feature_store: The :class:`modules.feature_store.FeatureStore` to keep the coarse
+        stage's features in, or None to always extract them. (default: None)
+    :param pcm_cache: The :class:`modules.pcm_cache.PcmCache` to read the file through in both
+        stages, see :func:`segment_file`. (default: None)
+    :return: A generator that iterates over the found segments, consisting of the start time and
+        duration for the original file.
+    """
+    if preset.feature_type == FeatureType.ENERGY_FLUX:
+        # this is cheap enough to run on the whole file
+        yield from segment_file(
+            path,
+            preset,
+            block_len=block_len,
+            prefetch=prefetch,
+            stats=stats,
+            analysis_sample_rate=analysis_sample_rate,
+            precision=precision,
+            feature_store=feature_store,
+            pcm_cache=pcm_cache,
+        )
+        return
+
+    windows, samplerate, coarse_hop_length = _analysis_windows(
+        path,
+        block_len,
+        True,
+        prefetch,
+        stats,
+        analysis_sample_rate,
+        feature_store,
+        hop_factor=coarse_hop_factor,
+        pcm_cache=pcm_cache,
+    )
+    hop_length = coarse_hop_length // coarse_hop_factor
+
+    # coarse stage, in coarse feature frames
+    coarse_peaks = []
+    gap_transitions = []
+    excluded = []
+    margin = coarse_downsampling * NOVELTY_KERNEL_SIZE
+    last_frame_in_audiofile = 0
+    gaps = SilenceGaps(_min_gap_frames(samplerate, coarse_hop_length))
+    for window in windows:
+        # gaps of silence are transitions already, they don't need to be refined
+        for start, stop in gaps.update(window.silence, window.offset):
+            gap_transitions.append((start + stop) // 2 * coarse_hop_factor)
+            excluded.append((start - margin, stop + margin))
+        # the kernel does not fit into the down-sampled SSM of short windows
+        columns = len(range(0, window.feature.shape[1], coarse_downsampling))
+        too_short = columns < 2 * NOVELTY_KERNEL_SIZE + 1
+        if not too_short and not _skip_window(window):
+            coarse_peaks.extend(
+                segment_feature_sequence(
+                    window.feature,
+                    samplerate,
+                    filter_len=preset.filter_length,
+                    downsampling=coarse_downsampling,
+                    threshold=preset.peak_threshold,
+                    offset=window.offset,
+                    precision=precision,
+                )
+            )
+        last_frame_in_audiofile = (window.length + window.offset) * coarse_hop_factor
+    candidates = _merge_peaks(
+        [
+            peak * coarse_hop_factor
+            for peak in coarse_peaks
+            if not any(start <= peak < stop for start, stop in excluded)
+        ],
+        2 * coarse_downsampling * coarse_hop_factor,
+        min_votes,
+    )
+
+    # fine stage
+    refine_radius = max(refine_radius, 2 * preset.downsampling * NOVELTY_KERNEL_SIZE)
+    transitions = gap_transitions
+    refined_frames = 0
+    for candidate in candidates:
+        start = max(0, candidate - refine_radius)
+        stop = min(last_frame_in_audiofile, candidate + refine_radius)
+        refined_frames += stop - start
+        audio, _ = read_audio_file_to_numpy(
+            path,
+            mono=True,
+            offset=start * hop_length / samplerate,
+            duration=(stop - start) * hop_length / samplerate,
+            sample_rate=samplerate,
+            pcm_cache=pcm_cache,
+        )
+        if np.min(audio, initial=0) == np.max(audio, initial=0):
+            continue
+        peaks = segment_block(
+            audio,
+            samplerate,
+            hop_length,
+            FeatureType.SPECTRAL,
+            filter_len=preset.filter_length,
+            downsampling=preset.downsampling,
+            threshold=preset.peak_threshold,
+            offset=start,
+            precision=precision,
+        )
+        if len(peaks) > 0:
+            transitions.append(int(peaks[np.argmin(np.abs(peaks - candidate))]))
+
+    if stats is not None:
+        stats["refined_share"] = refined_frames / max(1, last_frame_in_audiofile)
+
+    last_transition = 0
+    for transition in sorted(set(transitions)) + [last_frame_in_audiofile - 1]:
+        if transition <= last_transition:
+            continue
+        yield _frames_to_segment(last_transition, transition, samplerate, hop_length)
+        last_transition = transition
+
+
+def _min_gap_frames(samplerate, hop_length: int):
+    """Get the length of :data:`MIN_SILENCE_GAP` in audio frames.
+
+    :param samplerate: the sample-rate of the audio stream
+    :param hop_length: the hop-length of the audio stream
+    :return: the minimum length of a gap, in audio frames.
+    """
+    return int(np.ceil(MIN_SILENCE_GAP * samplerate / hop_length))
+
+
+def _merge_peaks(peaks, tolerance: int, min_votes: int):
+    """Merges peaks lying close together into candidate transitions.
+
+    :param peaks: the peaks of all windows, in audio frames
+    :param tolerance: the largest distance between neighbouring peaks of one candidate
+    :param min_votes: how many peaks a candidate needs
+    :return: the candidates' median positions, sorted.
+    """
+    candidates = []
+    group = []
+    for peak in sorted(int(peak) for peak in peaks):
+        if group and peak - group[-1] > tolerance:
+            if len(group) >= min_votes:
+                candidates.append(int(np.median(group)))
+            group = []
+        group.append(peak)
+    if len(group) >= min_votes:
+        candidates.append(int(np.median(group)))
+    return candidates
+
+
+def _analysis_windows(
+    path,
+    block_len,
+    stream_features,
+    prefetch,
+    stats,
+    analysis_sample_rate,
+    feature_store,
+    hop_factor=1,
+    feature_type=FeatureType.SPECTRAL,
+    start_block=0,
+    num_blocks=None,
+    pcm_cache=None,
+):
+    """Opens the overlapping feature windows of a file, see :func:`segment_file`
+    for the parameters. Features of the given type are extracted with ``hop_factor`` times the
+    stream's hop length.
+
+    Only ``num_blocks`` blocks from ``start_block`` on are decoded, if given. The windows then
+    are the ones starting in these blocks, except for the last one, and their offsets are still
+    counted from the beginning of the file.
+
+    :returns: A Generator of :class:`FeatureWindow`, the samplerate, the features' hop length.
+    """
+    stored = None
+    store_writer = None
+    if feature_store is not None and stream_features:
+        samplerate, hop_length = analysis_rates(path, analysis_sample_rate)
+        hop_length *= hop_factor
+        store_key = feature_store.key(
+            path,
+            samplerate,
+            hop_length,
+            feature_type.name,
+            block_len=block_len,
+        )
+        stored = feature_store.load(store_key)
+    if stored is not None:
+        return stored_feature_windows(*stored), samplerate, hop_length
+
+    stream, samplerate, hop_length = read_audio_file_to_stream(
+        path,
+        block_len=block_len,
+        analysis_sample_rate=analysis_sample_rate,
+        start_block=start_block,
+        pcm_cache=pcm_cache,
+    )
+    hop_length *= hop_factor
+    if num_blocks is not None:
+        stream = islice(stream, num_blocks)
+    if prefetch > 0:
+        stream = ReadAheadStream(stream, depth=prefetch)
+    if feature_store is not None and stream_features:
+        store_writer = feature_store.writer(store_key)
+
+    if stream_features:
+        windows = overlapping_feature_stream(
+            stream, samplerate, hop_length, feature_type
+        )
+    else:
+        windows = _extract_overlapping_stream(
+            stream, samplerate, hop_length, feature_type, block_len
+        )
+    if start_block > 0:
+        first_frame = start_block * block_len // hop_factor
+        windows = (
+            window._replace(offset=window.offset + first_frame) for window in windows
+        )
+    return (
+        _finish_windows(windows, stream, prefetch, stats, store_writer),
+        samplerate,
+        hop_length,
+    )
+
+
+def _finish_windows(windows, stream, prefetch, stats, store_writer):
+    """Passes on the windows of a decoded file. Once all windows were analysed, the stall times
+    are written to ``stats`` and the features are committed to the feature store.
+
+    :param windows: the windows to pass on
+    :param stream: the decoded stream
+    :param prefetch: how many blocks were decoded ahead
+    :param stats: the dict to write the stall times to, or None
+    :param store_writer: the :class:`modules.feature_store.FeatureStoreWriter`, or None
+    :returns: A Generator of :class:`FeatureWindow`.
+    """
+    try:
+        for window in windows:
+            if store_writer is not None:
+                store_writer.add(*window)
+            yield window
+
+        if store_writer is not None:
+            store_writer.commit()
+            store_writer = None
+        if stats is not None and prefetch > 0:
+            stats["decode_stall"] = stream.decode_stall
+            stats["compute_stall"] = stream.compute_stall
+    finally:
+        # drop partially written entries, e.g. if the generator was closed early
+        if store_writer is not None:
+            store_writer.discard()
+
+
+def _frames_to_segment(start, end, samplerate, hop_length):
+    """Converts a segment between two transitions into time units.
+
+    :param start: The segment's first audio frame
+    :param end: The audio frame the segment ends at
+    :param samplerate: The sample-rate of the audio stream
+    :param hop_length: The hop-length of the audio stream
+    :return: The segment, consisting of the start time and duration.
+    """
+    start_time = librosa.core.frames_to_time(
+        start, sr=samplerate, hop_length=hop_length, n_fft=2048
+    )
+    duration = librosa.core.frames_to_time(
+        end - start, sr=samplerate, hop_length=hop_length, n_fft=2048
+    )
+    return start_time, duration
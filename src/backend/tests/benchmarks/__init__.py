@@ -0,0 +1,21 @@
+"""Micro-benchmarks for the back-end.
+These are not collected by pytest. Run them from ``src/backend``, e.g.
+``python -m tests.benchmarks.benchmark_novelty``.
+"""
+
+import time
+
+
+def best_of(func, repeat=3):
+    """Run the given function several times and return the fastest run.
+
+    :param func: the function to time, called without arguments
+    :param repeat: how often to run the function (default: 3)
+    :returns: the fastest run time, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,97 @@
+"""Compares segmenting windows one at a time with segmenting them in batches
+(:func:`modules.segmentation.segment_feature_batch`, ``segment_file(..., batch_size=...)``).
+
+The first table times the self similarity, novelty and peak picking of 32 random windows of
+the default size, per window. The second one segments the synthetic songs of
+:mod:`tests.benchmarks.benchmark_beat_sync` from a warm
+:class:`modules.feature_store.FeatureStore`. Batch size 1 uses the
+:class:`modules.segmentation.SelfSimilarityBuilder`, which reuses the overlap of
+consecutive windows.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from modules.feature_store import FeatureStore
+from modules.segmentation import (
+    Preset,
+    segment_feature_batch,
+    segment_feature_sequence,
+    segment_file,
+)
+from tests.benchmarks import best_of
+from tests.benchmarks.benchmark_beat_sync import write_drum_mix
+
+PRESETS = [Preset.EXTRA_STRICT, Preset.NORMAL, Preset.LENIENT, Preset.EXTRA_LENIENT]
+BATCH_SIZES = [1, 2, 4, 8, 16]
+WINDOWS = 32
+WINDOW_FRAMES = 4095
+
+
+def segment_windows(features, preset, batch_size):
+    """Segment the given windows in batches, or one at a time for a batch size of 1."""
+    kwargs = dict(
+        filter_len=preset.filter_length,
+        downsampling=preset.downsampling,
+        threshold=preset.peak_threshold,
+    )
+    if batch_size == 1:
+        return [
+            segment_feature_sequence(feature, 22050, **kwargs) for feature in features
+        ]
+    peaks = []
+    for start in range(0, len(features), batch_size):
+        batch = features[start : start + batch_size]
+        peaks += segment_feature_batch(batch, 22050, [0] * len(batch), **kwargs)
+    return peaks
+
+
+def main():
+    rng = np.random.default_rng(0)
+    features = rng.random((WINDOWS, 128, WINDOW_FRAMES), dtype=np.float32)
+    print(f"ms per window of {WINDOW_FRAMES} frames x 128 mel bands")
+    print(f"{'preset':>13}" + "".join(f" {f'batch {size}':>9}" for size in BATCH_SIZES))
+    for preset in PRESETS:
+        timings = [
+            best_of(lambda: segment_windows(features, preset, size)) / WINDOWS * 1000
+            for size in BATCH_SIZES
+        ]
+        print(f"{preset.name:>13}" + "".join(f" {timing:>9.2f}" for timing in timings))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.wav")
+        write_drum_mix(path)
+        store = FeatureStore(os.path.join(directory, "features"))
+        list(segment_file(path, feature_store=store))
+
+        print()
+        print("segment_file from the feature store [s]")
+        print(
+            f"{'preset':>13}"
+            + "".join(f" {f'batch {size}':>9}" for size in BATCH_SIZES)
+        )
+        for preset in PRESETS:
+            reference = list(segment_file(path, preset, feature_store=store))
+            timings = []
+            for size in BATCH_SIZES:
+                segments = []
+                timings.append(
+                    best_of(
+                        lambda: segments.append(
+                            list(
+                                segment_file(
+                                    path, preset, feature_store=store, batch_size=size
+                                )
+                            )
+                        )
+                    )
+                )
+                assert np.allclose(segments[-1], reference)
+            print(
+                f"{preset.name:>13}" + "".join(f" {timing:>9.3f}" for timing in timings)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Compares beat-synchronous segmentation (``segment_file(..., beat_sync=True)``) with the
+frame-based one on synthetic songs with drums at 120 to 175 BPM.
+
+The features are loaded from a warm :class:`modules.feature_store.FeatureStore`, so the timings
+only cover the analysis, not decoding and feature extraction. The SSM size is the mean number
+of columns of a window's self similarity matrix.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import soundfile
+from modules.feature_store import FeatureStore
+from modules.segmentation import (
+    FeatureType,
+    Preset,
+    beat_sync_feature_sequence,
+    segment_file,
+    stored_feature_windows,
+)
+from tests.benchmarks import best_of
+
+SAMPLE_RATE = 22050
+SONG_DURATION = 120
+TEMPI = [120, 140, 165, 128, 175, 150, 132, 160]
+PRESETS = [Preset.EXTRA_STRICT, Preset.STRICT, Preset.NORMAL]
+
+
+def write_drum_mix(path):
+    """Write a mono file of chord 'songs' with a noise burst on every beat.
+
+    :returns: the times of the transitions, in seconds.
+    """
+    rng = np.random.default_rng(0)
+    time = np.arange(SONG_DURATION * SAMPLE_RATE) / SAMPLE_RATE
+    decay = np.exp(-np.arange(2000) / 300)
+    with soundfile.SoundFile(path, "w", SAMPLE_RATE, 1) as file:
+        for song, tempo in enumerate(TEMPI):
+            base = 110 * 2 ** ((song * 5 % 12) / 12)
+            tone = sum(
+                np.sin(2 * np.pi * base * ratio * time) for ratio in [1, 1.25, 1.5]
+            )
+            drums = np.zeros_like(time)
+            for beat in np.arange(0, len(time), SAMPLE_RATE * 60 / tempo).astype(int):
+                hit = decay[: len(time) - beat]
+                drums[beat : beat + len(hit)] += hit * rng.standard_normal(len(hit))
+            file.write(
+                0.15 * tone + 0.3 * drums + 0.01 * rng.standard_normal(time.shape)
+            )
+    return [song * SONG_DURATION for song in range(1, len(TEMPI))]
+
+
+def score(segments, transitions, tolerance=2):
+    """Count the transitions found and the ones that aren't transitions.
+
+    :returns: the number of found transitions, the number of wrong transitions.
+    """
+    found_transitions = [start for start, _ in segments[1:]]
+    found = sum(
+        any(abs(found - transition) <= tolerance for found in found_transitions)
+        for transition in transitions
+    )
+    wrong = len(found_transitions) - found
+    return found, wrong
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.wav")
+        transitions = write_drum_mix(path)
+        store = FeatureStore(os.path.join(directory, "features"))
+        list(segment_file(path, feature_store=store))
+
+        features, windows, silence = store.load(
+            store.key(path, SAMPLE_RATE, 1024, FeatureType.SPECTRAL.name)
+        )
+        feature_windows = list(stored_feature_windows(features, windows, silence))
+        frames = np.mean([window.feature.shape[1] for window in feature_windows])
+        beats = np.mean(
+            [
+                beat_sync_feature_sequence(window.feature, SAMPLE_RATE, 1024)[0].shape[
+                    1
+                ]
+                for window in feature_windows
+            ]
+        )
+        print(f"{len(TEMPI)} songs, {len(transitions)} transitions")
+        print(
+            f"{'preset':>13} {'mode':>6} {'SSM size':>9} {'time [s]':>9}"
+            f" {'found':>6} {'wrong':>6}"
+        )
+        for preset in PRESETS:
+            for beat_sync in [False, True]:
+                segments = []
+                duration = best_of(
+                    lambda: segments.append(
+                        list(
+                            segment_file(
+                                path, preset, feature_store=store, beat_sync=beat_sync
+                            )
+                        )
+                    )
+                )
+                size = beats if beat_sync else frames / preset.downsampling
+                found, wrong = score(segments[-1], transitions)
+                print(
+                    f"{preset.name:>13} {'beats' if beat_sync else 'frames':>6}"
+                    f" {size:>9.0f} {duration:>9.3f} {found:>6} {wrong:>6}"
+                )
+
+
+if __name__ == "__main__":
+    main()
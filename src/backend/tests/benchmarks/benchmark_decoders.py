@@ -0,0 +1,87 @@
+"""Measures the decoding throughput of the decoder backends of :mod:`modules.audio_stream_io`
+across containers.
+
+A minute of stereo audio at 44100 Hz is written as WAV, FLAC, OGG and MP3 and decoded
+in blocks of the default size (4096 frames with a hop length of 2048) by every backend.
+The throughput is given in seconds of audio decoded per second. Backends that cannot read
+a container (or are not installed) are marked "n/a". The last column decodes the file as
+:func:`modules.audio_stream_io.open_audio_file` selects the backend.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import soundfile
+from modules.audio_stream_io import (
+    FFmpegDecoder,
+    LibrosaDecoder,
+    SoundfileDecoder,
+    open_audio_file,
+)
+from tests.benchmarks import best_of
+
+SAMPLE_RATE = 44100
+SECONDS = 60
+BLOCK_SIZE = 4096 * 2048
+FORMATS = ["wav", "flac", "ogg", "mp3"]
+DECODERS = [SoundfileDecoder, FFmpegDecoder, LibrosaDecoder]
+
+
+def write_audio(path):
+    """Write a chord with a little noise, so lossy encoders have something to encode."""
+    rng = np.random.default_rng(0)
+    time = np.arange(SAMPLE_RATE * SECONDS) / SAMPLE_RATE
+    chord = sum(np.sin(2 * np.pi * freq * time) for freq in [220, 277.2, 329.6]) / 4
+    audio = chord[:, np.newaxis] + 0.02 * rng.standard_normal((time.shape[0], 2))
+    # libsndfile crashes when writing a long OGG file at once, so it is written in seconds
+    with soundfile.SoundFile(path, "w", SAMPLE_RATE, 2) as file:
+        for start in range(0, audio.shape[0], SAMPLE_RATE):
+            file.write(audio[start : start + SAMPLE_RATE])
+
+
+def decode(path, decoders):
+    """Decode the whole file in blocks."""
+    with open_audio_file(path, decoders) as decoder:
+        for _ in decoder.blocks(BLOCK_SIZE):
+            pass
+
+
+def throughput(path, decoders):
+    """Time decoding the file, in seconds of audio per second, or None if it cannot be read."""
+    try:
+        decode(path, decoders)
+    except Exception:
+        return None
+    return SECONDS / best_of(lambda: decode(path, decoders))
+
+
+def main():
+    columns = [decoder.name for decoder in DECODERS] + ["selected"]
+    print("decoded audio [s/s]")
+    print(f"{'format':>6}" + "".join(f" {column:>10}" for column in columns))
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in FORMATS:
+            if extension.upper() not in soundfile.available_formats():
+                print(f"{extension:>6} skipped, libsndfile cannot write it")
+                continue
+            path = os.path.join(directory, f"audio.{extension}")
+            write_audio(path)
+            timings = [
+                None
+                if decoder is FFmpegDecoder and not FFmpegDecoder.available()
+                else throughput(path, [decoder])
+                for decoder in DECODERS
+            ]
+            timings.append(throughput(path, None))
+            print(
+                f"{extension:>6}"
+                + "".join(
+                    f" {'n/a' if timing is None else f'{timing:.0f}':>10}"
+                    for timing in timings
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
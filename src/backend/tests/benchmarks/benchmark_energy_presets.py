@@ -0,0 +1,141 @@
+"""Compares the energy presets with the self similarity presets of
+:func:`modules.segmentation.segment_file` on synthetic material: songs separated by gaps of
+low noise, like the side breaks of tape rips. The gaps are too loud to count as silence, so
+every preset has to find them on its own.
+
+Each preset is timed twice: once from the audio file and once from a warm
+:class:`modules.feature_store.FeatureStore`. The latter is the time of the analysis itself.
+
+The stages of segmenting the file are timed on their own, too: decoding the analysis stream,
+the silence mask, and extracting the energy/flux and the mel features from the decoded blocks.
+Decoding and the silence mask are the same for all presets, so they bound how much faster the
+energy presets can be from the file.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import soundfile
+from modules.audio_stream_io import read_audio_file_to_stream
+from modules.feature_store import FeatureStore
+from modules.segmentation import (
+    ANALYSIS_SAMPLE_RATE,
+    Preset,
+    extract_energy_flux,
+    extract_spectro,
+    segment_file,
+    silence_envelope,
+)
+from tests.benchmarks import best_of
+
+SAMPLE_RATE = 22050
+SONGS = 20
+SONG_DURATION = 150
+GAP_DURATION = 3
+GAP_LEVEL = -40
+"""Level of the gaps' noise, in dBFS."""
+
+
+def write_gapped_mix(path):
+    """Write a mono file of chord 'songs' with a bit of noise, separated by gaps of noise.
+
+    :returns: the times of the gaps' centers, in seconds.
+    """
+    rng = np.random.default_rng(0)
+    time = np.arange(SONG_DURATION * SAMPLE_RATE) / SAMPLE_RATE
+    gap_noise = 10 ** (GAP_LEVEL / 20) * np.sqrt(2)
+    with soundfile.SoundFile(path, "w", SAMPLE_RATE, 1) as file:
+        for song in range(SONGS):
+            base = 110 * 2 ** ((song * 5 % 12) / 12)
+            tone = sum(
+                np.sin(2 * np.pi * base * ratio * time) for ratio in [1, 1.25, 1.5]
+            )
+            # songs get louder and quieter, so they aren't just constant
+            envelope = 0.6 + 0.4 * np.sin(2 * np.pi * time / 7 + song)
+            file.write(0.2 * envelope * tone + 0.01 * rng.standard_normal(time.shape))
+            if song < SONGS - 1:
+                file.write(gap_noise * rng.standard_normal(GAP_DURATION * SAMPLE_RATE))
+    return [
+        (song + 1) * SONG_DURATION + song * GAP_DURATION + GAP_DURATION / 2
+        for song in range(SONGS - 1)
+    ]
+
+
+def score(segments, gaps, tolerance=GAP_DURATION):
+    """Count the gaps found and the transitions that aren't at a gap.
+
+    :returns: the number of found gaps, the number of wrong transitions.
+    """
+    transitions = [start for start, _ in segments[1:]]
+    found = sum(
+        any(abs(transition - gap) <= tolerance for transition in transitions)
+        for gap in gaps
+    )
+    wrong = sum(
+        all(abs(transition - gap) > tolerance for gap in gaps)
+        for transition in transitions
+    )
+    return found, wrong
+
+
+def time_stages(path):
+    """Time the stages of segmenting the file, each over all of its blocks.
+
+    :returns: the name and run time of every stage.
+    """
+
+    def decode():
+        stream, samplerate, hop_length = read_audio_file_to_stream(
+            path, analysis_sample_rate=ANALYSIS_SAMPLE_RATE
+        )
+        return list(stream), samplerate, hop_length
+
+    blocks, samplerate, hop_length = decode()
+    stages = {
+        "decoding": decode,
+        "silence mask": lambda: [
+            silence_envelope(block, hop_length) for block in blocks
+        ],
+        "energy/flux": lambda: [
+            extract_energy_flux(block, samplerate, hop_length) for block in blocks
+        ],
+        "mel": lambda: [
+            extract_spectro(block, samplerate, hop_length) for block in blocks
+        ],
+    }
+    return [(name, best_of(stage, repeat=2)) for name, stage in stages.items()]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.wav")
+        gaps = write_gapped_mix(path)
+        store = FeatureStore(os.path.join(directory, "features"))
+        minutes = (SONGS * SONG_DURATION + (SONGS - 1) * GAP_DURATION) / 60
+        print(f"{minutes:.0f} minutes, {len(gaps)} gaps at {GAP_LEVEL} dBFS")
+        for name, duration in time_stages(path):
+            print(f"{name:>15}: {duration:.2f} s")
+        print(
+            f"{'preset':>15} {'file [s]':>9} {'analysis [s]':>13} {'found':>6} {'wrong':>6}"
+        )
+        # warm up librosa's lazy imports
+        list(segment_file(path, Preset.ENERGY_NORMAL))
+        for preset in Preset:
+            segments = []
+            from_file = best_of(
+                lambda: segments.append(list(segment_file(path, preset))), repeat=2
+            )
+            list(segment_file(path, preset, feature_store=store))
+            from_store = best_of(
+                lambda: list(segment_file(path, preset, feature_store=store)), repeat=2
+            )
+            found, wrong = score(segments[-1], gaps)
+            print(
+                f"{preset.name:>15} {from_file:>9.2f} {from_store:>13.3f}"
+                f" {found:>6} {wrong:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Compares the vectorized novelty engine in :func:`modules.segmentation.compute_novelty_ssm`
+with the previous row-by-row implementation for growing SSM sizes.
+"""
+
+import numpy as np
+from modules.segmentation import (
+    compute_novelty_ssm,
+    create_gaussian_checkerboard_kernel,
+)
+from tests.benchmarks import best_of
+
+SIZES = [500, 1000, 2000, 5000, 10000, 20000]
+
+
+def reference_novelty(ssm, n=8, var=0.5):
+    """The row-by-row novelty computation, as it was before vectorizing it."""
+    kernel = create_gaussian_checkerboard_kernel(n, var=var)
+    N = ssm.shape[0]
+    M = 2 * n + 1
+    nov = np.zeros(N)
+    ssm_padded = np.pad(ssm, n, mode="reflect")
+    for i in range(N):
+        nov[i] = np.sum(ssm_padded[i : i + M, i : i + M] * kernel)
+    return (nov - np.min(nov)) / (np.max(nov) - np.min(nov))
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'N':>6} {'loop [s]':>10} {'vectorized [s]':>15} {'speedup':>8}")
+    for size in SIZES:
+        # float32 keeps the 20 000 x 20 000 matrix (and its padded copy) in memory
+        feature = rng.random((16, size), dtype=np.float32)
+        ssm = np.dot(np.transpose(feature), feature)
+
+        assert np.allclose(compute_novelty_ssm(ssm), reference_novelty(ssm), atol=1e-6)
+        loop = best_of(lambda: reference_novelty(ssm), repeat=1)
+        vectorized = best_of(lambda: compute_novelty_ssm(ssm))
+        print(f"{size:>6} {loop:>10.4f} {vectorized:>15.4f} {loop / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
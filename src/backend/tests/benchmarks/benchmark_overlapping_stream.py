@@ -0,0 +1,90 @@
+"""Compares :func:`modules.audio_stream_io.overlapping_stream` with the previous implementation,
+which built every overlapping block with ``np.append``.
+
+The stream consists of default-sized blocks (4096 frames with a hop length of 1024) of mono and
+stereo float32 audio at 22050 Hz, ending with a short block. For every second of audio, the
+table shows the bytes that were allocated and copied for the overlapping blocks and the time it
+took to produce them. The ring buffer writes every block into itself once and moves it once,
+which is counted in the "buffer" column. The peak is the most memory allocated at once,
+measured with :mod:`tracemalloc`.
+"""
+
+import tracemalloc
+from itertools import pairwise
+
+import numpy as np
+from modules.audio_stream_io import overlap_bounds, overlapping_stream
+from tests.benchmarks import best_of
+
+SAMPLE_RATE = 22050
+BLOCK_SIZE = 4096 * 1024
+BLOCKS = 8
+LAST_BLOCK_SIZE = BLOCK_SIZE // 3
+
+
+def append_overlapping_stream(stream):
+    """The previous implementation of :func:`modules.audio_stream_io.overlapping_stream`."""
+    for curr_block, next_block in pairwise(stream):
+        for curr_start_index, next_end_index in overlap_bounds(
+            curr_block.shape[-1], next_block.shape[-1]
+        ):
+            yield np.append(
+                curr_block[..., curr_start_index:],
+                next_block[..., :next_end_index],
+                axis=-1,
+            )
+        if curr_block.shape != next_block.shape:
+            yield next_block
+
+
+def blocks(channels):
+    """Create the blocks of the stream. All full blocks are the same array."""
+    rng = np.random.default_rng(0)
+    block = rng.standard_normal(channels + (BLOCK_SIZE,), dtype=np.float32)
+    return [block] * BLOCKS + [block[..., :LAST_BLOCK_SIZE].copy()]
+
+
+def measure(implementation, stream_blocks):
+    """Run an implementation over the stream.
+
+    :returns: the bytes allocated for overlapping blocks, the peak of allocated memory.
+    """
+    allocated = 0
+    tracemalloc.start()
+    for window in implementation(iter(stream_blocks)):
+        if window.base is None:
+            allocated += window.nbytes
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated, peak
+
+
+def main():
+    print(
+        f"{'channels':>8} {'implementation':>14} {'windows [MB/s]':>15}"
+        f" {'buffer [MB/s]':>14} {'peak [MB]':>10} {'time [ms/s]':>12}"
+    )
+    for channels in [(), (2,)]:
+        stream_blocks = blocks(channels)
+        seconds = sum(block.shape[-1] for block in stream_blocks) / SAMPLE_RATE
+        # every block but the first is written into the buffer and then moved to its front
+        buffer_bytes = 2 * sum(block.nbytes for block in stream_blocks[1:])
+        for name, implementation, copied in [
+            ("np.append", append_overlapping_stream, 0),
+            ("ring buffer", overlapping_stream, buffer_bytes),
+        ]:
+            allocated, peak = measure(implementation, stream_blocks)
+            duration = best_of(
+                lambda: sum(1 for _ in implementation(iter(stream_blocks)))
+            )
+            print(
+                f"{len(channels) and channels[0] or 1:>8} {name:>14}"
+                f" {allocated / seconds / 1e6:>15.3f}"
+                f" {copied / seconds / 1e6:>14.3f}"
+                f" {peak / 1e6:>10.1f}"
+                f" {duration / seconds * 1000:>12.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
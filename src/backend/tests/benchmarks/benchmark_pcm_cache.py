@@ -0,0 +1,71 @@
+"""Compares reading segments of an MP3 file by decoding them with reading them from a
+:class:`modules.pcm_cache.PcmCache`.
+
+The half hour MP3 of :mod:`tests.benchmarks.benchmark_seek_index` is read 20 seconds every
+3 minutes at its own sample rate, like previewing and storing every song of a mix. The file is
+decoded into the cache once (its time is shown separately). The "cached" column reads from the
+memory-mapped entry, and the "hot" column reads ranges that were read before, which are kept in
+memory.
+"""
+
+import os
+import tempfile
+import time
+
+from modules.audio_stream_io import read_audio_file_to_numpy
+from modules.pcm_cache import PcmCache
+from tests.benchmarks import best_of
+from tests.benchmarks.benchmark_seek_index import (
+    MINUTES,
+    READ_EVERY_MINUTES,
+    READ_SECONDS,
+    write_mp3,
+)
+
+
+def read(path, minute, pcm_cache=None):
+    """Read the segment starting at a minute."""
+    return read_audio_file_to_numpy(
+        path,
+        offset=minute * 60,
+        duration=READ_SECONDS,
+        sample_rate=None,
+        pcm_cache=pcm_cache,
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.mp3")
+        write_mp3(path)
+        print(f"{MINUTES} minute MP3, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        PcmCache(os.path.join(directory, "pcm")).open(path).close()
+        print(f"decoding into the cache: {time.perf_counter() - start:.2f} s")
+        cold_cache = PcmCache(os.path.join(directory, "pcm"), hot_bytes=0)
+        hot_cache = PcmCache(os.path.join(directory, "pcm"))
+
+        print()
+        print(
+            f"{'offset [min]':>12} {'decoded [ms]':>13} {'cached [ms]':>12} {'hot [ms]':>9}"
+        )
+        totals = [0.0, 0.0, 0.0]
+        for minute in range(0, MINUTES, READ_EVERY_MINUTES):
+            timings = [
+                best_of(lambda: read(path, minute, pcm_cache))
+                for pcm_cache in [None, cold_cache, hot_cache]
+            ]
+            totals = [total + timing for total, timing in zip(totals, timings)]
+            print(
+                f"{minute:>12} {timings[0] * 1000:>13.1f}"
+                f" {timings[1] * 1000:>12.2f} {timings[2] * 1000:>9.3f}"
+            )
+        print(
+            f"{'total':>12} {totals[0] * 1000:>13.1f}"
+            f" {totals[1] * 1000:>12.2f} {totals[2] * 1000:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Shows the speed/accuracy trade-off of projecting the features to fewer dimensions before
+stacking them (``segment_file(..., projection=...)``), on the synthetic songs of
+:mod:`tests.benchmarks.benchmark_beat_sync`.
+
+The features are loaded from a warm :class:`modules.feature_store.FeatureStore`, so the timings
+only cover the analysis. "same" counts the transitions found without a projection that are
+found with it as well.
+"""
+
+import os
+import tempfile
+
+from modules.feature_store import FeatureStore
+from modules.segmentation import Preset, Projection, segment_file
+from tests.benchmarks import best_of
+from tests.benchmarks.benchmark_beat_sync import score, write_drum_mix
+
+PRESETS = [Preset.EXTRA_STRICT, Preset.NORMAL, Preset.LENIENT, Preset.EXTRA_LENIENT]
+DIMS = [8, 16, 32]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.wav")
+        transitions = write_drum_mix(path)
+        store = FeatureStore(os.path.join(directory, "features"))
+        list(segment_file(path, feature_store=store))
+
+        print(f"{len(transitions)} transitions, 128 mel bands")
+        print(
+            f"{'preset':>13} {'projection':>10} {'dim':>4} {'time [s]':>9}"
+            f" {'found':>6} {'wrong':>6} {'same':>5}"
+        )
+        for preset in PRESETS:
+            reference = None
+            runs = [(Projection.NONE, 128)] + [
+                (projection, dim)
+                for projection in [Projection.RANDOM, Projection.PCA]
+                for dim in DIMS
+            ]
+            for projection, dim in runs:
+                segments = []
+                duration = best_of(
+                    lambda: segments.append(
+                        list(
+                            segment_file(
+                                path,
+                                preset,
+                                feature_store=store,
+                                projection=projection,
+                                projection_dim=dim,
+                            )
+                        )
+                    )
+                )
+                starts = [start for start, _ in segments[-1][1:]]
+                if reference is None:
+                    reference = starts
+                found, wrong = score(segments[-1], transitions)
+                same, _ = score(segments[-1], reference, tolerance=1)
+                print(
+                    f"{preset.name:>13} {projection.name.lower():>10} {dim:>4}"
+                    f" {duration:>9.3f} {found:>6} {wrong:>6}"
+                    f" {same:>2}/{len(reference)}"
+                )
+
+
+if __name__ == "__main__":
+    main()
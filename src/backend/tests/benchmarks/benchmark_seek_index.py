@@ -0,0 +1,76 @@
+"""Compares offset reads from an MP3 file with libsndfile's own seeking and with the
+:func:`modules.seek_index.mp3_seek_index` of :class:`modules.audio_stream_io.SoundfileDecoder`.
+
+Half an hour of stereo audio at 44100 Hz is written as MP3 and 20 seconds are read every
+3 minutes, like identifying every song of a mix. libsndfile walks all frames before the offset
+for every read, so its reads get slower towards the end of the file and reading all songs takes
+quadratic time. The index is built once (its time is shown separately) and every read starts at
+most a few frames before its offset.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import soundfile
+from modules.audio_stream_io import SoundfileDecoder
+from modules.seek_index import mp3_seek_index
+from tests.benchmarks import best_of
+
+SAMPLE_RATE = 44100
+MINUTES = 30
+READ_SECONDS = 20
+READ_EVERY_MINUTES = 3
+
+
+def write_mp3(path):
+    """Write a sweeping tone with a little noise, a minute at a time."""
+    rng = np.random.default_rng(0)
+    with soundfile.SoundFile(path, "w", SAMPLE_RATE, 2) as file:
+        for minute in range(MINUTES):
+            seconds = np.arange(SAMPLE_RATE * 60) / SAMPLE_RATE
+            tone = 0.3 * np.sin(2 * np.pi * (220 + 5 * minute) * seconds)
+            noise = 0.02 * rng.standard_normal((len(seconds), 2))
+            file.write(tone[:, np.newaxis] + noise)
+
+
+def read_libsndfile(path, offset):
+    """Read with libsndfile seeking to the offset."""
+    with soundfile.SoundFile(path) as file:
+        file.seek(offset)
+        return file.read(READ_SECONDS * SAMPLE_RATE, dtype="float32")
+
+
+def read_indexed(path, offset):
+    """Read with the decoder, which starts at the nearest indexed frame."""
+    with SoundfileDecoder(path) as decoder:
+        return decoder.read(offset, READ_SECONDS * SAMPLE_RATE)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.mp3")
+        write_mp3(path)
+        print(f"{MINUTES} minute MP3, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        start = time.perf_counter()
+        mp3_seek_index(path)
+        print(f"building the index: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        print()
+        print(f"{'offset [min]':>12} {'libsndfile [ms]':>16} {'indexed [ms]':>13}")
+        totals = [0.0, 0.0]
+        for minute in range(0, MINUTES, READ_EVERY_MINUTES):
+            offset = minute * 60 * SAMPLE_RATE
+            timings = [
+                best_of(lambda: read(path, offset))
+                for read in [read_libsndfile, read_indexed]
+            ]
+            totals = [total + timing for total, timing in zip(totals, timings)]
+            print(f"{minute:>12} {timings[0] * 1000:>16.1f} {timings[1] * 1000:>13.1f}")
+        print(f"{'total':>12} {totals[0] * 1000:>16.1f} {totals[1] * 1000:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Times :func:`modules.segmentation.segment_file_sharded` against
+:func:`modules.segmentation.segment_file`, on the 50 minute mix (16 blocks) of
+:mod:`tests.benchmarks.benchmark_energy_presets`.
+
+Every shard decodes and extracts one block more than it segments. The first table runs the
+shards one after the other in this process, which shows that overhead without any parallelism.
+The second one runs one shard per worker, for worker counts up to the number of CPUs.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+from modules.segmentation import segment_file, segment_file_sharded
+from tests.benchmarks import best_of
+from tests.benchmarks.benchmark_energy_presets import write_gapped_mix
+
+SHARD_BLOCKS = [16, 8, 4, 2]
+WORKERS = [2, 4, 8, 16]
+
+
+def run(segments, **kwargs):
+    """Time one sharded run and check it against the sequential segments."""
+    results = []
+    duration = best_of(
+        lambda: results.append(list(segment_file_sharded(**kwargs))), repeat=1
+    )
+    same = len(results[-1]) == len(segments) and np.allclose(results[-1], segments)
+    return duration, "yes" if same else "no"
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "mix.wav")
+        write_gapped_mix(path)
+
+        # the first run loads and caches everything, so it is not timed
+        segments = list(segment_file(path))
+        sequential = best_of(lambda: list(segment_file(path)), repeat=1)
+        print(f"{cpus} CPUs, segment_file: {sequential:.2f} s")
+
+        print()
+        print(f"{'shard blocks':>12} {'time [s]':>9} {'overhead':>9} {'same':>5}")
+        for shard_blocks in SHARD_BLOCKS:
+            duration, same = run(
+                segments, path=path, workers=1, shard_blocks=shard_blocks
+            )
+            print(
+                f"{shard_blocks:>12} {duration:>9.2f}"
+                f" {duration / sequential - 1:>9.0%} {same:>5}"
+            )
+
+        print()
+        print(f"{'workers':>12} {'time [s]':>9} {'speed-up':>9} {'same':>5}")
+        for workers in WORKERS:
+            if workers > cpus:
+                print(f"{workers:>12} skipped, not enough CPUs")
+                continue
+            duration, same = run(segments, path=path, workers=workers)
+            print(
+                f"{workers:>12} {duration:>9.2f}"
+                f" {sequential / duration:>9.2f} {same:>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
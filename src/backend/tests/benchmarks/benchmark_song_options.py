@@ -0,0 +1,90 @@
+"""Compares the audio :meth:`modules.api_service.ApiService.get_song_options` decodes for the
+song recognition APIs with decoding the whole segment.
+
+A 12 minute song is written as stereo MP3 at 44100 Hz. Previously, the whole segment was
+decoded as stereo at 44100 Hz for all APIs. Now AcoustID reads the first 120 seconds as mono at
+11025 Hz, and Shazam reads 4 second windows as mono at 44100 Hz from both ends of the segment:
+one from each end if the song is recognised right away, and all windows up to the other end
+if it is not recognised at all. The peak is the most memory allocated at once, measured with
+:mod:`tracemalloc`.
+"""
+
+import os
+import tempfile
+import tracemalloc
+
+import numpy as np
+import soundfile
+from modules.apis import acoustid, shazam
+from modules.audio_stream_io import AudioSegment, read_audio_file_to_numpy
+from tests.benchmarks import best_of
+
+SAMPLE_RATE = 44100
+MINUTES = 12
+
+
+def write_mp3(path):
+    """Write a tone with a little noise, a minute at a time."""
+    rng = np.random.default_rng(0)
+    with soundfile.SoundFile(path, "w", SAMPLE_RATE, 2) as file:
+        for minute in range(MINUTES):
+            seconds = np.arange(SAMPLE_RATE * 60) / SAMPLE_RATE
+            tone = 0.3 * np.sin(2 * np.pi * (220 + 5 * minute) * seconds)
+            file.write(
+                tone[:, np.newaxis] + 0.02 * rng.standard_normal((len(seconds), 2))
+            )
+
+
+def read_whole_segment(path):
+    """Decode the segment like before, as stereo at 44100 Hz."""
+    read_audio_file_to_numpy(
+        path, offset=0, duration=MINUTES * 60, sample_rate=SAMPLE_RATE
+    )
+
+
+def read_for_apis(path, shazam_windows):
+    """Read what AcoustID and Shazam need, with ``shazam_windows`` windows from each end."""
+    with AudioSegment(path, 0, MINUTES * 60) as segment:
+        segment.read(acoustid.FINGERPRINT_FORMAT)
+        length = int(segment.duration * shazam.SAMPLE_RATE)
+        for from_start in [True, False]:
+            offsets = list(shazam._lookup_offsets(length, from_start))
+            for offset in offsets[:shazam_windows]:
+                start = offset if offset >= 0 else max(0, length + offset)
+                segment.read(
+                    shazam.AUDIO_FORMAT,
+                    start / shazam.SAMPLE_RATE,
+                    shazam.LOOKUP_SEGMENTS_DURATION,
+                )
+
+
+def peak_memory(func):
+    """Measure the most memory allocated at once while running a function."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "song.mp3")
+        write_mp3(path)
+        print(f"{MINUTES} minute MP3, {os.path.getsize(path) / 1e6:.1f} MB")
+        windows = len(list(shazam._lookup_offsets(MINUTES * 60 * SAMPLE_RATE, True)))
+
+        print()
+        print(f"{'reading':>26} {'time [ms]':>10} {'peak [MB]':>10}")
+        for name, func in [
+            ("whole segment", lambda: read_whole_segment(path)),
+            ("recognised right away", lambda: read_for_apis(path, 1)),
+            ("not recognised", lambda: read_for_apis(path, windows)),
+        ]:
+            duration = best_of(func)
+            peak = peak_memory(func)
+            print(f"{name:>26} {duration * 1000:>10.1f} {peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
+import os
+import sys
+
 import acoustid
+import numpy as np
+import pytest
 from modules.apis.acoustid import (
+    FINGERPRINT_FORMAT,
     _extract_recordings,
     _filter_out_compilations_from_releasegroups,
     _get_result_for_releasegroup,
     _get_results_for_recordings,
     _join_artist_names,
     _merge_matching_recordings,
+    _parse_fpcalc_output,
     _parse_lookup_result,
+    _to_pcm16,
+    create_fingerprint,
 )
 
 EXAMPLE_ACOUSTID_RESPONSE = {
@@ -1356,3 +1365,118 @@ def test_join_artist_names_multiple_artists():
         ]
     )
     assert result == "One of Two; The Other; And More!"
+
+
+def test_to_pcm16_mono():
+    pcm, channels = _to_pcm16(np.array([0.0, 0.5, -1.0, 2.0], dtype=np.float32))
+    assert channels == 1
+    assert np.frombuffer(pcm, dtype="<i2").tolist() == [0, 16383, -32767, 32767]
+
+
+def test_to_pcm16_interleaves_channels():
+    pcm, channels = _to_pcm16(np.array([[0.0, 0.5], [1.0, -0.5]], dtype=np.float32))
+    assert channels == 2
+    assert np.frombuffer(pcm, dtype="<i2").tolist() == [0, 32767, 16383, -16383]
+
+
+def test_parse_fpcalc_output():
+    output = b"FILE=-\nDURATION=119.52\nFINGERPRINT=AQADtEmUaEkSRZEGAAAAAA\n"
+    assert _parse_fpcalc_output(output) == (119.52, b"AQADtEmUaEkSRZEGAAAAAA")
+
+
+def test_parse_fpcalc_output_incomplete():
+    with pytest.raises(acoustid.FingerprintGenerationError):
+        _parse_fpcalc_output(b"DURATION=12\n")
+    with pytest.raises(acoustid.FingerprintGenerationError):
+        _parse_fpcalc_output(b"DURATION=long\nFINGERPRINT=AQAD\n")
+
+
+_FAKE_FPCALC = """
+import os, sys
+import soundfile
+
+args = sys.argv[1:]
+with open(os.environ["FAKE_FPCALC_LOG"], "a") as log:
+    log.write(" ".join(args) + "\\n")
+if args[-1] == "-":
+    # fpcalc before 1.4 takes no raw audio
+    if "FAKE_FPCALC_FILES_ONLY" in os.environ:
+        sys.exit(2)
+    rate = int(args[args.index("-rate") + 1])
+    channels = int(args[args.index("-channels") + 1])
+    frames = len(sys.stdin.buffer.read()) // (2 * channels)
+else:
+    info = soundfile.info(args[-1])
+    rate, channels, frames = info.samplerate, info.channels, info.frames
+print(f"DURATION={frames / rate}")
+print(f"FINGERPRINT={rate}:{channels}:{frames}")
+"""
+
+
+@pytest.fixture
+def fake_fpcalc(tmp_path, monkeypatch):
+    """Points pyacoustid at an fpcalc script, which prints the format of the audio it got.
+
+    :returns: the path of the log of the script's arguments, one call per line.
+    """
+    monkeypatch.setattr(acoustid, "have_chromaprint", False)
+    path = tmp_path / "fpcalc"
+    path.write_text(f"#!{sys.executable}\n{_FAKE_FPCALC}")
+    path.chmod(0o755)
+    monkeypatch.setenv(acoustid.FPCALC_ENVVAR, str(path))
+    log = tmp_path / "fpcalc.log"
+    monkeypatch.setenv("FAKE_FPCALC_LOG", str(log))
+    return log
+
+
+def _calls(log):
+    return [line.split() for line in log.read_text().splitlines()]
+
+
+def test_create_fingerprint_pipes_pcm_to_fpcalc(fake_fpcalc):
+    song_data = np.zeros((2, 11025), dtype=np.float32)
+    assert create_fingerprint(song_data, 11025) == (1.0, b"11025:2:11025")
+    (call,) = _calls(fake_fpcalc)
+    assert call[call.index("-format") + 1] == "s16le"
+    assert call[call.index("-length") + 1] == str(FINGERPRINT_FORMAT.max_duration)
+
+
+def test_create_fingerprint_falls_back_to_wav_file(fake_fpcalc, monkeypatch):
+    monkeypatch.setenv("FAKE_FPCALC_FILES_ONLY", "1")
+    song_data = np.zeros(22050, dtype=np.float32)
+    assert create_fingerprint(song_data, 22050) == (1.0, b"22050:1:22050")
+    piped, from_file = _calls(fake_fpcalc)
+    assert piped[-1] == "-"
+    assert from_file[-1].endswith(".wav")
+    # the temporary file is removed afterwards
+    assert not os.path.exists(from_file[-1])
+
+
+def test_create_fingerprint_without_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(acoustid, "have_chromaprint", False)
+    monkeypatch.setenv(acoustid.FPCALC_ENVVAR, str(tmp_path / "missing"))
+    with pytest.raises(acoustid.NoBackendError) as error:
+        create_fingerprint(np.zeros(11025, dtype=np.float32), 11025)
+    assert isinstance(error.value.__cause__, FileNotFoundError)
+
+
+def test_create_fingerprint_with_chromaprint(tmp_path, monkeypatch):
+    calls = []
+
+    def fingerprint(samplerate, channels, pcmiter, maxlength):
+        calls.append((samplerate, channels, b"".join(pcmiter), maxlength))
+        return b"AQAD"
+
+    monkeypatch.setattr(acoustid, "have_chromaprint", True)
+    monkeypatch.setattr(acoustid, "fingerprint", fingerprint)
+    # fpcalc is not needed then
+    monkeypatch.setenv(acoustid.FPCALC_ENVVAR, str(tmp_path / "missing"))
+    song_data = np.full((2, 22050), 0.5, dtype=np.float32)
+    assert create_fingerprint(song_data, 44100) == (0.5, b"AQAD")
+    ((samplerate, channels, pcm, maxlength),) = calls
+    assert (samplerate, channels, maxlength) == (
+        44100,
+        2,
+        FINGERPRINT_FORMAT.max_duration,
+    )
+    assert pcm == _to_pcm16(song_data)[0]
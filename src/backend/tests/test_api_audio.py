@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import soundfile
+from api import audio
+from flask import Flask
+from modules.feature_store import FeatureStore
+from modules.pcm_cache import PcmCache
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.delenv("SERVICE_ACOUSTID_API_KEY", raising=False)
+    monkeypatch.delenv("SERVICE_SHAZAM_API_KEY", raising=False)
+    monkeypatch.setattr(
+        audio, "FeatureStore", lambda: FeatureStore(str(tmp_path / "features"))
+    )
+    monkeypatch.setattr(audio, "pcm_cache", PcmCache(str(tmp_path / "pcm")))
+    app = Flask(__name__)
+    app.register_blueprint(audio.audio_bp, url_prefix="/api/audio")
+    return app
+
+
+def _split(app, data):
+    with app.test_request_context("/api/audio/split", method="POST", json=data):
+        return app.make_response(audio.split())
+
+
+@pytest.mark.parametrize("coarse_to_fine", [False, True])
+def test_split_twice_with_stored_features(tmp_path, app, coarse_to_fine):
+    path = str(tmp_path / "mix.wav")
+    rng = np.random.default_rng(0)
+    samplerate = 22050
+    songs = [
+        0.3 * np.sin(2 * np.pi * frequency * np.arange(samplerate * 70) / samplerate)
+        + 0.05 * rng.standard_normal(samplerate * 70)
+        for frequency in (220, 440, 330, 550)
+    ]
+    # longer than one block of the coarse stage, so its features are stored
+    soundfile.write(path, np.concatenate(songs), samplerate)
+
+    request = {
+        "filePath": path,
+        "presetName": "NORMAL",
+        "coarseToFine": coarse_to_fine,
+    }
+    first = _split(app, request)
+    # the second split loads the features from the feature store
+    second = _split(app, request)
+    assert first.status_code == second.status_code == 200
+    assert first.get_json() == second.get_json()
+    assert len(second.get_json()["segments"]) > 0
+
+
+def test_split_rejects_coarse_to_fine_with_beat_sync(tmp_path, app):
+    path = str(tmp_path / "tone.wav")
+    soundfile.write(path, np.zeros(22050), 22050)
+    request = {
+        "filePath": path,
+        "presetName": "NORMAL",
+        "coarseToFine": True,
+        "beatSync": True,
+    }
+    response = _split(app, request)
+    assert response.status_code == 400
+    assert response.get_data(as_text=True) == "BE.INCOMPATIBLE_OPTIONS"
@@ -0,0 +1,373 @@
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+import pytest
+import soundfile
+import soxr
+from modules.audio_stream_io import (
+    AudioFormat,
+    AudioSegment,
+    FFmpegDecoder,
+    LibrosaDecoder,
+    ReadAheadStream,
+    SoundfileDecoder,
+    open_audio_file,
+    overlap_bounds,
+    overlapping_stream,
+    read_audio_file_to_numpy,
+    read_audio_file_to_stream,
+    resample_stream,
+)
+
+
+def _slow_stream(count, delay=0.0):
+    for idx in range(count):
+        time.sleep(delay)
+        yield np.full(4, idx)
+
+
+def _failing_stream():
+    yield np.zeros(4)
+    raise ValueError("decoding failed")
+
+
+def test_read_ahead_stream_yields_all_blocks():
+    blocks = list(ReadAheadStream(_slow_stream(10), depth=3))
+    assert len(blocks) == 10
+    assert [block[0] for block in blocks] == list(range(10))
+
+
+def test_read_ahead_stream_passes_on_exceptions():
+    stream = ReadAheadStream(_failing_stream())
+    with pytest.raises(ValueError):
+        list(stream)
+
+
+def test_read_ahead_stream_decode_bound():
+    stream = ReadAheadStream(_slow_stream(5, delay=0.02), depth=2)
+    for _ in stream:
+        pass
+    assert stream.decode_stall > 0.05
+    assert stream.decode_stall > stream.compute_stall
+
+
+def test_read_ahead_stream_compute_bound():
+    stream = ReadAheadStream(_slow_stream(5), depth=1)
+    for _ in stream:
+        time.sleep(0.02)
+    assert stream.compute_stall > 0.05
+    assert stream.compute_stall > stream.decode_stall
+
+
+def test_resample_stream_block_sizes():
+    blocks = [np.ones(1000, dtype=np.float32) for _ in range(7)]
+    resampled = list(resample_stream(iter(blocks), 44100, 22050, 768))
+    assert all(block.shape[0] == 768 for block in resampled[:-1])
+    assert 0 < resampled[-1].shape[0] <= 768
+    assert sum(block.shape[0] for block in resampled) == 3500
+
+
+def test_resample_stream_matches_resampling_at_once():
+    audio = np.sin(np.arange(48000) / 7).astype(np.float32)
+    blocks = np.array_split(audio, 6)
+    resampled = np.concatenate(list(resample_stream(iter(blocks), 48000, 11025, 512)))
+    assert np.allclose(resampled, soxr.resample(audio, 48000, 11025), atol=1e-6)
+
+
+def test_resample_stream_same_rate_only_splits():
+    blocks = [np.arange(10, dtype=np.float32), np.arange(10, 15, dtype=np.float32)]
+    resampled = list(resample_stream(iter(blocks), 22050, 22050, 4))
+    assert np.array_equal(np.concatenate(resampled), np.arange(15))
+    assert [block.shape[0] for block in resampled] == [4, 4, 4, 3]
+
+
+def test_resample_stream_skip():
+    blocks = [np.arange(10, dtype=np.float32), np.arange(10, 15, dtype=np.float32)]
+    resampled = list(resample_stream(iter(blocks), 22050, 22050, 4, skip=6))
+    assert np.array_equal(np.concatenate(resampled), np.arange(6, 15))
+    assert [block.shape[0] for block in resampled] == [4, 4, 1]
+
+
+@pytest.mark.parametrize("samplerate", [22050, 44100, 48000])
+def test_read_audio_file_to_stream_start_block(tmp_path, samplerate):
+    path = str(tmp_path / "noise.wav")
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.3 * rng.standard_normal(samplerate * 10), samplerate)
+    for analysis_sample_rate in [None, 22050]:
+        stream, _, _ = read_audio_file_to_stream(
+            path, block_len=32, analysis_sample_rate=analysis_sample_rate
+        )
+        blocks = list(stream)
+        for start_block in [1, 5]:
+            stream, _, _ = read_audio_file_to_stream(
+                path,
+                block_len=32,
+                analysis_sample_rate=analysis_sample_rate,
+                start_block=start_block,
+            )
+            started = list(stream)
+            assert len(started) == len(blocks) - start_block
+            for block, expected in zip(started, blocks[start_block:]):
+                assert np.allclose(block, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("channels", [(), (2,)])
+def test_overlapping_stream(channels):
+    rng = np.random.default_rng(1)
+    lengths = [64, 64, 64, 30]
+    blocks = [rng.standard_normal(channels + (length,)) for length in lengths]
+    windows = []
+    for window in overlapping_stream(iter(blocks)):
+        assert not window.flags.writeable
+        windows.append(window.copy())
+
+    expected = []
+    for curr_block, next_block in zip(blocks, blocks[1:]):
+        for curr_start, next_end in overlap_bounds(
+            curr_block.shape[-1], next_block.shape[-1]
+        ):
+            expected.append(
+                np.concatenate(
+                    (curr_block[..., curr_start:], next_block[..., :next_end]), axis=-1
+                )
+            )
+    expected.append(blocks[-1])
+    assert len(windows) == len(expected)
+    for window, block in zip(windows, expected):
+        assert np.array_equal(window, block)
+
+
+def test_overlapping_stream_shares_buffer():
+    blocks = [np.full(64, idx, dtype=np.float32) for idx in range(4)]
+    windows = overlapping_stream(iter(blocks))
+    first = next(windows)
+    for window in windows:
+        assert np.shares_memory(window, first)
+
+
+@pytest.mark.parametrize("extension", ["wav", "flac", "ogg", "mp3"])
+def test_read_audio_file_to_numpy_matches_librosa(tmp_path, extension):
+    if extension.upper() not in soundfile.available_formats():
+        pytest.skip(f"libsndfile cannot write {extension}")
+    path = str(tmp_path / f"noise.{extension}")
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.1 * rng.standard_normal((44100 * 3, 2)), 44100)
+    for mono in [False, True]:
+        audio, sr = read_audio_file_to_numpy(path, mono=mono, offset=0.7, duration=1.5)
+        expected, expected_sr = librosa.load(
+            path, mono=mono, offset=0.7, duration=1.5, sr=22050
+        )
+        assert sr == expected_sr
+        assert np.allclose(audio, expected, atol=1e-6)
+
+
+def test_read_audio_file_to_stream_matches_librosa(tmp_path):
+    path = str(tmp_path / "noise.wav")
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.1 * rng.standard_normal((44100 * 3, 2)), 44100)
+    for mono in [False, True]:
+        stream, _, hop_length = read_audio_file_to_stream(path, block_len=16, mono=mono)
+        expected = librosa.stream(
+            path,
+            block_length=16,
+            frame_length=hop_length,
+            hop_length=hop_length,
+            mono=mono,
+        )
+        for block, expected_block in zip(stream, expected, strict=True):
+            assert np.array_equal(block, expected_block)
+
+
+def test_audio_segment_reads_parts_in_format(tmp_path):
+    path = str(tmp_path / "noise.wav")
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.1 * rng.standard_normal((44100 * 10, 2)), 44100)
+
+    with AudioSegment(path, offset=2, duration=6) as segment:
+        audio = segment.read(AudioFormat(11025, 1, max_duration=4))
+        expected, _ = read_audio_file_to_numpy(
+            path, mono=True, offset=2, duration=4, sample_rate=11025
+        )
+        assert np.allclose(audio, expected, atol=1e-6)
+
+        stereo = segment.read(AudioFormat(44100, 2), start=-1.5, duration=4)
+        expected, _ = read_audio_file_to_numpy(
+            path, offset=6.5, duration=1.5, sample_rate=44100
+        )
+        assert np.array_equal(stereo, expected)
+        assert segment.read(AudioFormat(44100, 1), start=6).shape == (0,)
+
+
+@pytest.mark.parametrize("decoder", [SoundfileDecoder, LibrosaDecoder])
+def test_decoder_blocks(tmp_path, decoder):
+    path = str(tmp_path / "noise.wav")
+    rng = np.random.default_rng(0)
+    audio = 0.1 * rng.standard_normal((22050, 2))
+    soundfile.write(path, audio, 22050)
+    expected = soundfile.read(path, dtype="float32")[0].T
+    with decoder(path) as opened:
+        assert opened.samplerate == 22050
+        assert opened.channels == 2
+        assert opened.frames == 22050
+        blocks = list(opened.blocks(4000, offset=1000, frames=10000))
+        assert [block.shape for block in blocks] == [(2, 4000), (2, 4000), (2, 2000)]
+        assert np.array_equal(np.concatenate(blocks, axis=-1), expected[:, 1000:11000])
+        assert np.array_equal(opened.read(20000), expected[:, 20000:])
+
+
+def test_open_audio_file_selects_by_container(tmp_path):
+    rng = np.random.default_rng(0)
+    audio = 0.1 * rng.standard_normal(22050)
+    wav_path = str(tmp_path / "noise.wav")
+    soundfile.write(wav_path, audio, 22050)
+    with open_audio_file(wav_path) as decoder:
+        assert isinstance(decoder, SoundfileDecoder)
+    with open_audio_file(wav_path, decoders=[LibrosaDecoder]) as decoder:
+        assert isinstance(decoder, LibrosaDecoder)
+
+    if "MP3" not in soundfile.available_formats():
+        pytest.skip("libsndfile cannot write mp3")
+    mp3_path = str(tmp_path / "noise.mp3")
+    soundfile.write(mp3_path, audio, 22050)
+    with open_audio_file(mp3_path) as decoder:
+        expected = FFmpegDecoder if FFmpegDecoder.available() else SoundfileDecoder
+        assert isinstance(decoder, expected)
+
+
+def test_open_audio_file_falls_back(tmp_path):
+    path = str(tmp_path / "noise.wav")
+    soundfile.write(path, np.zeros(100), 22050)
+    with open_audio_file(path, decoders=[_FailingDecoder, SoundfileDecoder]) as decoder:
+        assert isinstance(decoder, SoundfileDecoder)
+    with pytest.raises(RuntimeError):
+        open_audio_file(path, decoders=[_FailingDecoder, _FailingDecoder])
+
+
+_FAKE_FFPROBE = """
+import json, os, sys
+import soundfile
+
+try:
+    info = soundfile.info(sys.argv[-1])
+except Exception as error:
+    sys.stderr.write(f"{sys.argv[-1]}: {error}")
+    sys.exit(1)
+# containers without an exact length only have an estimate of the duration
+duration = info.duration + float(os.environ.get("FAKE_FFPROBE_DURATION_ERROR", 0))
+stream = {"sample_rate": str(info.samplerate), "channels": info.channels}
+json.dump({"streams": [stream], "format": {"duration": f"{duration:.6f}"}}, sys.stdout)
+"""
+
+_FAKE_FFMPEG = """
+import os, sys
+import soundfile
+
+args = sys.argv[1:]
+audio, samplerate = soundfile.read(args[args.index("-i") + 1], dtype="float32", always_2d=True)
+assert int(args[args.index("-ar") + 1]) == samplerate
+assert int(args[args.index("-ac") + 1]) == audio.shape[1]
+if "-ss" in args:
+    audio = audio[round(float(args[args.index("-ss") + 1]) * samplerate) :]
+if "FAKE_FFMPEG_FAIL" in os.environ:
+    # more messages than a pipe holds, then the half of the audio
+    sys.stderr.write("damaged frame\\n" * 20000 + "decoding failed")
+    sys.stderr.flush()
+    audio = audio[: len(audio) // 2]
+data = audio.astype("<f4").tobytes()
+for start in range(0, len(data), 4096):
+    sys.stdout.buffer.write(data[start : start + 4096])
+sys.exit(1 if "FAKE_FFMPEG_FAIL" in os.environ else 0)
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Puts ``ffprobe`` and ``ffmpeg`` scripts on the path, which decode with libsndfile."""
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    for name, script in [("ffprobe", _FAKE_FFPROBE), ("ffmpeg", _FAKE_FFMPEG)]:
+        path = directory / name
+        path.write_text(f"#!{sys.executable}\n{script}")
+        path.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{directory}{os.pathsep}{os.environ['PATH']}")
+    assert FFmpegDecoder.available()
+
+
+@pytest.fixture
+def noise_file(tmp_path):
+    path = str(tmp_path / "noise.wav")
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.1 * rng.standard_normal((22050, 2)), 22050)
+    return path
+
+
+def test_ffmpeg_decoder_blocks(fake_ffmpeg, noise_file):
+    expected = soundfile.read(noise_file, dtype="float32")[0].T
+    with FFmpegDecoder(noise_file) as opened:
+        assert opened.samplerate == 22050
+        assert opened.channels == 2
+        assert opened.frames == 22050
+        blocks = list(opened.blocks(4000, offset=1000, frames=10000))
+        assert [block.shape for block in blocks] == [(2, 4000), (2, 4000), (2, 2000)]
+        assert np.array_equal(np.concatenate(blocks, axis=-1), expected[:, 1000:11000])
+        assert np.array_equal(opened.read(20000), expected[:, 20000:])
+        assert np.array_equal(opened.read(), expected)
+        assert opened.read(30000).shape == (2, 0)
+
+
+def test_ffmpeg_decoder_corrects_estimated_length(fake_ffmpeg, noise_file, monkeypatch):
+    monkeypatch.setenv("FAKE_FFPROBE_DURATION_ERROR", "0.05")
+    with FFmpegDecoder(noise_file) as opened:
+        assert opened.frames > 22050
+        # decoding only a part of the file keeps the estimate
+        opened.read(1000)
+        assert opened.frames > 22050
+        opened.read()
+        assert opened.frames == 22050
+
+
+def test_ffmpeg_decoder_stops_process_on_close(fake_ffmpeg, tmp_path):
+    path = str(tmp_path / "noise.wav")
+    # much more audio than the pipe holds, so the process waits for it to be read
+    soundfile.write(path, np.zeros((22050 * 20, 2)), 22050)
+    opened = FFmpegDecoder(path)
+    blocks = opened.blocks(1024)
+    assert next(blocks).shape == (2, 1024)
+    process = opened._processes[0]
+    opened.close()
+    assert process.poll() is not None
+    assert process.stdout.closed
+    assert opened._processes == []
+    # finalizing the blocks afterwards finds the process stopped
+    blocks.close()
+
+    # so does closing the blocks before the decoder
+    blocks = opened.blocks(1024, offset=22050)
+    assert next(blocks).shape == (2, 1024)
+    process = opened._processes[0]
+    blocks.close()
+    assert process.poll() is not None
+    assert opened._processes == []
+
+
+def test_ffmpeg_decoder_errors(fake_ffmpeg, noise_file, tmp_path, monkeypatch):
+    path = str(tmp_path / "text.wav")
+    with open(path, "w") as file:
+        file.write("no audio")
+    with pytest.raises(RuntimeError, match="ffprobe cannot read"):
+        FFmpegDecoder(path)
+
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "1")
+    with FFmpegDecoder(noise_file) as opened:
+        with pytest.raises(RuntimeError, match="decoding failed"):
+            list(opened.blocks(4000))
+        assert opened._processes == []
+        assert opened.frames == 22050
+
+
+class _FailingDecoder(SoundfileDecoder):
+    def __init__(self, audiofile):
+        raise RuntimeError(f"cannot open {audiofile}")
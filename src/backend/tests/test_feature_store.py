@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+from modules.feature_store import FeatureStore
+
+
+def _write(path, content):
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+def test_key_depends_on_file_and_parameters(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    first = str(tmp_path / "first.wav")
+    second = str(tmp_path / "second.wav")
+    _write(first, b"audio")
+    _write(second, b"audio")
+
+    key = store.key(first, 22050, 1024, "SPECTRAL")
+    assert key == store.key(first, 22050, 1024, "SPECTRAL")
+    assert key != store.key(second, 22050, 1024, "SPECTRAL")
+    assert key != store.key(first, 16000, 743, "SPECTRAL")
+    assert key != store.key(first, 22050, 1024, "CHROMA")
+    assert key != store.key(first, 22050, 1024, "SPECTRAL", block_len=256)
+
+    # changed files are analysed again
+    _write(first, b"other audio")
+    assert key != store.key(first, 22050, 1024, "SPECTRAL")
+    key = store.key(first, 22050, 1024, "SPECTRAL")
+    os.utime(first, ns=(0, os.stat(first).st_mtime_ns + 1))
+    assert key != store.key(first, 22050, 1024, "SPECTRAL")
+
+
+def test_writer_stores_overlapping_windows(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    rng = np.random.default_rng(0)
+    frames = rng.random((8, 100)).astype(np.float32)
+    silence = rng.random(102) < 0.5
+    windows = [(0, 40, 42), (10, 40, 42), (20, 40, 42), (60, 40, 42)]
+
+    writer = store.writer("key")
+    for offset, num_frames, length in windows:
+        writer.add(
+            frames[:, offset : offset + num_frames],
+            offset,
+            length,
+            silence[offset : offset + length],
+        )
+    assert store.load("key") is None
+    writer.commit()
+
+    features, table, stored_silence = store.load("key")
+    assert isinstance(features, np.memmap)
+    assert features.dtype == np.float32
+    assert np.array_equal(features, frames)
+    assert table.tolist() == [list(window) for window in windows]
+    assert np.array_equal(stored_silence, silence)
+    assert sorted(os.listdir(store.directory)) == [
+        "key.features.npy",
+        "key.silence.npy",
+        "key.windows.npy",
+    ]
+
+
+def test_writer_discard(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    writer = store.writer("key")
+    writer.add(np.zeros((8, 10)), 0, 12, np.ones(12, dtype=bool))
+    writer.discard()
+    assert store.load("key") is None
+    assert os.listdir(store.directory) == []
+
+
+def _add_entry(store, key, num_frames):
+    writer = store.writer(key)
+    writer.add(np.zeros((8, num_frames), dtype=np.float32), 0, num_frames, np.ones(1))
+    writer.commit()
+
+
+def test_least_recently_used_entries_are_removed(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"))
+    _add_entry(store, "first", 100)
+    entry_size = store._size("first")
+    store.max_bytes = 2 * entry_size
+    _add_entry(store, "second", 100)
+    for age, key in enumerate(["first", "second"]):
+        os.utime(os.path.join(store.directory, key + ".windows.npy"), (age, age))
+    # loading an entry marks it as recently used
+    assert store.load("first") is not None
+    _add_entry(store, "third", 100)
+    assert store.load("second") is None
+    assert store.load("first") is not None
+    assert store.load("third") is not None
+    assert len(os.listdir(store.directory)) == 6
+
+    # entries larger than the budget are not stored
+    _add_entry(store, "large", 1000)
+    assert store.load("large") is None
+    assert len(os.listdir(store.directory)) == 6
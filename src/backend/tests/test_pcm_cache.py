@@ -0,0 +1,184 @@
+import os
+
+import numpy as np
+import soundfile
+from modules.audio_stream_io import (
+    open_audio_file,
+    read_audio_file_to_numpy,
+    read_audio_file_to_stream,
+)
+from modules.pcm_cache import PcmCache
+
+
+def _write_wav(path, seconds=3, samplerate=8000, seed=0):
+    rng = np.random.default_rng(seed)
+    audio = 0.3 * rng.standard_normal((seconds * samplerate, 2))
+    soundfile.write(path, audio, samplerate, subtype="FLOAT")
+
+
+def _entries(cache):
+    if not os.path.exists(cache.directory):
+        return []
+    return sorted(os.listdir(cache.directory))
+
+
+def test_open_decodes_file_into_cache(tmp_path):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path)
+    cache = PcmCache(str(tmp_path / "pcm"))
+    with open_audio_file(path) as decoder:
+        expected = decoder.read()
+
+    with cache.open(path) as decoder:
+        assert decoder.name == "cache"
+        assert (decoder.samplerate, decoder.channels) == (8000, 2)
+        assert decoder.frames == expected.shape[-1]
+        assert np.array_equal(decoder.read(), expected)
+        assert np.array_equal(decoder.read(1000, 500), expected[:, 1000:1500])
+        blocks = list(decoder.blocks(10000, 3000))
+        assert [block.shape[-1] for block in blocks] == [10000, 10000, 1000]
+        assert np.array_equal(np.concatenate(blocks, axis=-1), expected[:, 3000:])
+    key = cache.key(path)
+    assert _entries(cache) == [key + ".f32", key + ".json"]
+
+    # another cache on the same directory memory-maps the entry from disk
+    with PcmCache(cache.directory).open(path) as decoder:
+        assert decoder.name == "cache"
+        assert np.array_equal(decoder.read(), expected)
+
+
+def test_reads_are_kept_in_memory(tmp_path):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path)
+    cache = PcmCache(str(tmp_path / "pcm"), hot_bytes=2 * 2 * 8000 * 4)
+    with cache.open(path) as decoder:
+        first = decoder.read(0, 8000)
+        assert not first.flags.writeable
+        assert decoder.read(0, 8000) is first
+        second = decoder.read(8000, 8000)
+        assert decoder.read(0, 8000) is first
+        # the least recently read range is dropped
+        decoder.read(16000, 8000)
+        assert decoder.read(8000, 8000) is not second
+        assert decoder.read(0, 8000) is not first
+
+
+def test_changed_files_are_decoded_again(tmp_path):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path)
+    cache = PcmCache(str(tmp_path / "pcm"))
+    cache.open(path).close()
+    old_key = cache.key(path)
+
+    _write_wav(path, seconds=2, seed=1)
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    key = cache.key(path)
+    assert key != old_key
+    with cache.open(path) as decoder:
+        audio = decoder.read()
+    assert np.array_equal(audio, read_audio_file_to_numpy(path, sample_rate=None)[0])
+    assert _entries(cache) == [key + ".f32", key + ".json"]
+
+
+def test_least_recently_used_entries_are_removed(tmp_path):
+    paths = [str(tmp_path / f"audio{i}.wav") for i in range(3)]
+    for i, path in enumerate(paths):
+        _write_wav(path, seed=i)
+    entry_size = 3 * 8000 * 2 * 4
+    cache = PcmCache(str(tmp_path / "pcm"), max_bytes=2 * entry_size)
+
+    cache.open(paths[0]).close()
+    cache.open(paths[1]).close()
+    os.utime(os.path.join(cache.directory, cache.key(paths[0]) + ".json"), (0, 0))
+    os.utime(os.path.join(cache.directory, cache.key(paths[1]) + ".json"), (1, 1))
+    # using an entry marks it as recently used
+    PcmCache(cache.directory).open(paths[0]).close()
+    cache.open(paths[2]).close()
+    keys = [cache.key(path) for path in paths]
+    assert _entries(cache) == sorted(
+        key + extension for key in [keys[0], keys[2]] for extension in [".f32", ".json"]
+    )
+
+    # files larger than the budget are not cached
+    small_cache = PcmCache(str(tmp_path / "small"), max_bytes=entry_size - 1)
+    with small_cache.open(paths[0]) as decoder:
+        assert decoder.name != "cache"
+    assert _entries(small_cache) == []
+
+
+def test_opening_an_entry_marks_it_as_used(tmp_path):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path)
+    cache = PcmCache(str(tmp_path / "pcm"))
+    cache.open(path).close()
+    meta_path = os.path.join(cache.directory, cache.key(path) + ".json")
+    os.utime(meta_path, (0, 0))
+    cache.open(path).close()
+    assert os.path.getmtime(meta_path) > 0
+
+
+def test_removed_entries_are_unmapped(tmp_path):
+    paths = [str(tmp_path / f"audio{i}.wav") for i in range(2)]
+    for i, path in enumerate(paths):
+        _write_wav(path, seed=i)
+    expected, _ = read_audio_file_to_numpy(paths[0], sample_rate=None)
+    cache = PcmCache(str(tmp_path / "pcm"), max_bytes=3 * 8000 * 2 * 4)
+
+    with cache.open(paths[0]) as decoder:
+        assert np.array_equal(decoder.read(0, 1000), expected[:, :1000])
+        entry = cache._entries[cache.key(paths[0])]
+        cache.open(paths[1]).close()
+        assert entry._samples is None
+        assert _entries(cache) == [
+            cache.key(paths[1]) + extension for extension in [".f32", ".json"]
+        ]
+        # the file is decoded instead
+        assert np.array_equal(decoder.read(0, 1000), expected[:, :1000])
+        blocks = list(decoder.blocks(10000))
+        assert np.array_equal(np.concatenate(blocks, axis=-1), expected)
+
+
+def test_empty_files_are_not_cached(tmp_path):
+    path = str(tmp_path / "empty.wav")
+    soundfile.write(path, np.zeros((0, 2)), 8000, subtype="FLOAT")
+    cache = PcmCache(str(tmp_path / "pcm"))
+    with cache.open(path) as decoder:
+        assert decoder.name != "cache"
+        assert decoder.read().shape == (2, 0)
+    assert _entries(cache) == []
+
+
+def test_streaming_writes_file_into_cache(tmp_path):
+    path = str(tmp_path / "audio.wav")
+    _write_wav(path)
+    cache = PcmCache(str(tmp_path / "pcm"))
+    expected, _ = read_audio_file_to_numpy(path, sample_rate=None)
+
+    # streams that are closed early leave no entry behind
+    stream, _, _ = read_audio_file_to_stream(path, block_len=8, pcm_cache=cache)
+    next(stream)
+    stream.close()
+    assert _entries(cache) == []
+
+    stream, samplerate, hop_length = read_audio_file_to_stream(
+        path, block_len=8, pcm_cache=cache
+    )
+    block_size = 8 * hop_length
+    first = next(stream)
+    # the streamed part can be read from the cache already, the rest is decoded
+    for offset, duration in [(0, block_size), (block_size, block_size)]:
+        audio, _ = read_audio_file_to_numpy(
+            path,
+            offset=offset / samplerate,
+            duration=duration / samplerate,
+            sample_rate=None,
+            pcm_cache=cache,
+        )
+        assert np.array_equal(audio, expected[:, offset : offset + duration])
+    blocks = [first] + list(stream)
+    assert np.array_equal(np.concatenate(blocks, axis=-1), expected)
+
+    key = cache.key(path)
+    assert _entries(cache) == [key + ".f32", key + ".json"]
+    stream, _, _ = read_audio_file_to_stream(path, block_len=8, pcm_cache=cache)
+    assert np.array_equal(np.concatenate(list(stream), axis=-1), expected)
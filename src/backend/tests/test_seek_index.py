@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile
+from modules.audio_stream_io import SoundfileDecoder
+from modules.seek_index import FileRange, build_mp3_seek_index, mp3_seek_index
+
+pytestmark = pytest.mark.skipif(
+    "MP3" not in soundfile.available_formats(), reason="libsndfile cannot write mp3"
+)
+
+
+def _write_mp3(path, samplerate, channels, seconds=20):
+    rng = np.random.default_rng(0)
+    time = np.arange(samplerate * seconds) / samplerate
+    tone = 0.3 * np.sin(2 * np.pi * 440 * time * (1 + time / seconds))
+    audio = tone[:, np.newaxis] + 0.05 * rng.standard_normal((len(time), channels))
+    soundfile.write(path, audio, samplerate)
+
+
+@pytest.mark.parametrize("samplerate,channels", [(44100, 2), (48000, 2), (22050, 1)])
+def test_mp3_seek_index_matches_decoding_from_the_start(tmp_path, samplerate, channels):
+    path = str(tmp_path / "tone.mp3")
+    _write_mp3(path, samplerate, channels)
+    expected = soundfile.read(path, dtype="float32", always_2d=True)[0].T
+
+    index = mp3_seek_index(path)
+    assert index.frames == expected.shape[-1]
+    # libsndfile's MP3 samples differ in rounding between reads of different sizes
+    with SoundfileDecoder(path) as decoder:
+        for offset in [0, 1, 1151, 1152, 12345, samplerate * 7 + 3]:
+            audio = decoder.read(offset, samplerate)
+            assert np.allclose(
+                audio, expected[:, offset : offset + samplerate], rtol=0, atol=1e-6
+            )
+        end = expected.shape[-1] - 1000
+        assert np.allclose(decoder.read(end), expected[:, end:], rtol=0, atol=1e-6)
+        blocks = list(decoder.blocks(4096, end - 5000))
+        assert [block.shape[-1] for block in blocks] == [4096, 1904]
+        assert np.allclose(
+            np.concatenate(blocks, axis=-1),
+            expected[:, end - 5000 :],
+            rtol=0,
+            atol=1e-6,
+        )
+
+
+def test_mp3_seek_index_without_info_tag(tmp_path):
+    path = str(tmp_path / "tone.mp3")
+    _write_mp3(path, 44100, 2)
+    with open(path, "rb") as file:
+        data = file.read()
+    tagged = build_mp3_seek_index(data)
+    assert tagged.start > 0
+
+    # without the info frame, decoding starts at the first frame
+    stripped = build_mp3_seek_index(data[tagged.offsets[0] :])
+    assert stripped.start == 0
+    assert len(stripped.offsets) == len(tagged.offsets)
+    assert stripped.frames == len(tagged.offsets) * 1152
+
+    # libsndfile estimates the length of files without info tag from their first frame
+    stripped_path = str(tmp_path / "stripped.mp3")
+    with open(stripped_path, "wb") as file:
+        file.write(data[tagged.offsets[0] :])
+    with SoundfileDecoder(stripped_path) as decoder:
+        audio = decoder.read()
+        assert audio.shape[-1] == stripped.frames
+        expected = decoder.read(0, 44100 * 3)
+        assert np.array_equal(decoder.read(44100 * 2, 44100), expected[:, 44100 * 2 :])
+
+
+def test_mp3_seek_index_rejects_unknown_files(tmp_path):
+    path = str(tmp_path / "tone.mp3")
+    _write_mp3(path, 44100, 2, seconds=2)
+    with open(path, "rb") as file:
+        data = file.read()
+    assert build_mp3_seek_index(b"RIFF" + bytes(100)) is None
+
+    # an info tag of an unknown encoder does not tell the encoder delay
+    encoder = data.index(b"LAME")
+    assert build_mp3_seek_index(data[:encoder] + b"ABCD" + data[encoder + 4 :]) is None
+
+
+def test_mp3_seek_index_skips_damaged_files(tmp_path):
+    path = str(tmp_path / "tone.mp3")
+    _write_mp3(path, 44100, 2, seconds=30)
+    with open(path, "rb") as file:
+        data = file.read()
+    index = build_mp3_seek_index(data)
+
+    # trailing tags are not frames, but the file can be indexed
+    tagged = build_mp3_seek_index(data + b"TAG" + bytes(125))
+    assert np.array_equal(tagged.offsets, index.offsets)
+    assert tagged.frames == index.frames
+
+    # junk in the middle of the file is skipped by the decoder, which keeps the full length
+    middle = int(index.offsets[len(index.offsets) // 2])
+    damaged_path = str(tmp_path / "damaged.mp3")
+    with open(damaged_path, "wb") as file:
+        file.write(data[:middle] + bytes(range(1, 38)) + data[middle:])
+    assert mp3_seek_index(damaged_path) is None
+    expected = soundfile.read(damaged_path, dtype="float32", always_2d=True)[0].T
+    assert expected.shape[-1] == index.frames
+    with SoundfileDecoder(damaged_path) as decoder:
+        assert decoder.frames == expected.shape[-1]
+        assert decoder.read().shape[-1] == expected.shape[-1]
+
+
+def test_mp3_seek_index_is_cached_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "tone.mp3")
+    _write_mp3(path, 44100, 2, seconds=2)
+    index = mp3_seek_index(path)
+    assert mp3_seek_index(path) is index
+
+    _write_mp3(path, 44100, 2, seconds=3)
+    changed = mp3_seek_index(path)
+    assert changed is not index
+    assert changed.frames == soundfile.info(path).frames
+
+
+def test_file_range(tmp_path):
+    path = str(tmp_path / "data")
+    with open(path, "wb") as file:
+        file.write(bytes(range(100)))
+    file_range = FileRange(path, 40)
+    assert file_range.read(2) == bytes([40, 41])
+    assert file_range.tell() == 2
+    assert file_range.seek(0, os.SEEK_END) == 60
+    file_range.seek(10)
+    buffer = bytearray(3)
+    assert file_range.readinto(buffer) == 3
+    assert buffer == bytes([50, 51, 52])
+    file_range.close()
@@ -0,0 +1,854 @@
+import os
+import pickle
+from itertools import pairwise
+
+import librosa
+import numpy as np
+import pytest
+import soundfile
+from modules import segmentation
+from modules.audio_stream_io import overlapping_stream, read_audio_file_to_stream
+from modules.feature_store import FeatureStore
+from modules.segmentation import (
+    SPECTRAL_PRESETS,
+    BandedSSM,
+    FeatureProjection,
+    FeatureType,
+    Precision,
+    Preset,
+    Projection,
+    SelfSimilarityBuilder,
+    SilenceGaps,
+    StackedWindow,
+    TransitionVoter,
+    beat_sync_feature_sequence,
+    compute_novelty_ssm,
+    compute_self_similarity,
+    compute_self_similarity_batch,
+    create_gaussian_checkerboard_kernel,
+    extract_chroma,
+    extract_chroma_spectro,
+    extract_energy_flux,
+    extract_feature,
+    extract_spectro,
+    filter_peaks,
+    get_gaussian_checkerboard_kernel,
+    get_mel_filterbank,
+    median_downsample_feature_sequence,
+    overlapping_feature_stream,
+    segment_beat_sequence,
+    segment_energy_flux_sequence,
+    segment_feature_batch,
+    segment_feature_sequence,
+    segment_file,
+    segment_file_coarse_to_fine,
+    segment_file_presets,
+    segment_file_sharded,
+    select_peaks,
+    silence_envelope,
+    smooth_downsample_feature_sequence,
+    track_beats,
+)
+from scipy import signal
+
+
+def _reference_novelty(ssm, n=8, var=0.5):
+    """Straightforward row-by-row novelty computation the vectorized engine is checked against."""
+    kernel = create_gaussian_checkerboard_kernel(n, var=var)
+    N = ssm.shape[0]
+    M = 2 * n + 1
+    nov = np.zeros(N)
+    ssm_padded = np.pad(ssm, n, mode="reflect")
+    for i in range(N):
+        nov[i] = np.sum(ssm_padded[i : i + M, i : i + M] * kernel)
+    return (nov - np.min(nov)) / (np.max(nov) - np.min(nov))
+
+
+def _random_ssm(size, seed=0):
+    feature = np.random.default_rng(seed).random((12, size))
+    return np.dot(np.transpose(feature), feature)
+
+
+@pytest.mark.filterwarnings("error::RuntimeWarning")
+def test_compute_novelty_ssm_constant():
+    # e.g. the SSM of a constant window
+    assert np.array_equal(compute_novelty_ssm(np.ones((10, 10)), n=8), np.zeros(10))
+    nov = compute_novelty_ssm(np.stack((np.ones((12, 12)), _random_ssm(12))), n=8)
+    assert np.array_equal(nov[0], np.zeros(12))
+    assert np.isclose(nov[1].max(), 1)
+
+
+def test_compute_novelty_ssm_matches_reference():
+    for size in [40, 17, 500]:
+        ssm = _random_ssm(size)
+        for n in [1, 4, 8]:
+            assert np.allclose(
+                compute_novelty_ssm(ssm, n=n, precision=Precision.FLOAT64),
+                _reference_novelty(ssm, n=n),
+                atol=1e-12,
+            )
+
+
+def test_compute_novelty_ssm_smaller_than_kernel():
+    ssm = _random_ssm(5)
+    assert np.allclose(
+        compute_novelty_ssm(ssm, n=8, precision=Precision.FLOAT64),
+        _reference_novelty(ssm, n=8),
+    )
+
+
+def test_compute_novelty_ssm_exclude():
+    nov = compute_novelty_ssm(_random_ssm(100), n=8, exclude=True)
+    assert np.all(nov[:8] == 0)
+    assert np.all(nov[-8:] == 0)
+
+
+def test_get_gaussian_checkerboard_kernel_cached():
+    kernel = get_gaussian_checkerboard_kernel(8, var=0.5)
+    assert kernel is get_gaussian_checkerboard_kernel(8, var=0.5)
+    assert not kernel.flags.writeable
+    assert np.array_equal(kernel, create_gaussian_checkerboard_kernel(8, var=0.5))
+
+
+def test_banded_ssm_from_feature_matches_dense():
+    feature = np.random.default_rng(1).random((12, 60))
+    banded = BandedSSM.from_feature(feature, 16)
+    dense = np.dot(np.transpose(feature), feature)
+    assert banded.band.shape == (17, 60)
+    for offset in range(-16, 17):
+        assert np.allclose(banded.diagonal(offset), np.diagonal(dense, offset=offset))
+    band_mask = np.abs(np.subtract.outer(np.arange(60), np.arange(60))) <= 16
+    assert np.allclose(banded.to_dense(), np.where(band_mask, dense, 0))
+
+
+def test_compute_novelty_ssm_banded_matches_dense():
+    for size in [5, 17, 300]:
+        feature = np.random.default_rng(2).random((12, size))
+        dense = np.dot(np.transpose(feature), feature)
+        banded = BandedSSM.from_feature(feature, 16)
+        assert np.allclose(
+            compute_novelty_ssm(banded, n=8),
+            compute_novelty_ssm(dense, n=8),
+            atol=1e-12,
+        )
+
+
+def test_compute_novelty_ssm_banded_too_narrow():
+    banded = BandedSSM.from_feature(np.ones((2, 40)), 8)
+    with pytest.raises(ValueError):
+        compute_novelty_ssm(banded, n=8)
+
+
+def test_compute_self_similarity_banded():
+    feature = np.random.default_rng(3).random((16, 800))
+    dense, sr = compute_self_similarity(feature, 22050, filter_len=41, downsampling=8)
+    banded, banded_sr = compute_self_similarity(
+        feature, 22050, filter_len=41, downsampling=8, band_width=16
+    )
+    assert sr == banded_sr
+    assert banded.size == dense.shape[0]
+    assert np.allclose(banded.diagonal(5), np.diagonal(dense, offset=5))
+
+
+def test_compute_novelty_ssm_batch():
+    for size in [5, 300]:
+        features = np.random.default_rng(2).random((3, 12, size))
+        banded = BandedSSM.from_feature(features, 16)
+        dense = np.einsum("kij,kil->kjl", features, features)
+        novelty = compute_novelty_ssm(banded, n=8, exclude=True)
+        assert novelty.shape == (3, size)
+        assert np.allclose(novelty, compute_novelty_ssm(dense, n=8, exclude=True))
+        for nov, feature in zip(novelty, features):
+            single = compute_novelty_ssm(BandedSSM.from_feature(feature, 16), n=8)
+            assert np.allclose(nov[8:-8], single[8:-8], atol=1e-6)
+
+
+def test_compute_self_similarity_batch():
+    features = np.random.default_rng(3).random((4, 16, 800))
+    for downsampling, filter_len, precision in [
+        (8, 41, Precision.FLOAT64),
+        (32, 25, Precision.FLOAT32),
+        (4, 49, Precision.FLOAT32),
+    ]:
+        batch, batch_sr = compute_self_similarity_batch(
+            features, 22050, filter_len, downsampling, precision=precision
+        )
+        assert batch.band.shape == (4, 17, -(-800 // downsampling))
+        for band, feature in zip(batch.band, features):
+            expected, sr = compute_self_similarity(
+                feature,
+                22050,
+                filter_len,
+                downsampling,
+                band_width=16,
+                precision=precision,
+            )
+            assert batch_sr == sr
+            assert np.allclose(band, expected.band, atol=1e-6)
+
+
+def test_segment_feature_batch():
+    rng = np.random.default_rng(7)
+    features = rng.random((5, 12, 1024))
+    for idx, feature in enumerate(features):
+        feature[:, 300 + 100 * idx :] += 4 * rng.random((12, 1))
+    for preset in [Preset.NORMAL, Preset.EXTRA_LENIENT]:
+        kwargs = dict(
+            filter_len=preset.filter_length,
+            downsampling=preset.downsampling,
+            threshold=preset.peak_threshold,
+        )
+        offsets = [0, 256, 512, 768, 1024]
+        batch = segment_feature_batch(features, 22050, offsets, **kwargs)
+        assert len(batch) == len(features)
+        for peaks, feature, offset in zip(batch, features, offsets):
+            expected = segment_feature_sequence(feature, 22050, offset=offset, **kwargs)
+            assert np.array_equal(peaks, expected)
+            assert len(peaks) > 0
+
+
+def _write_synthetic_mix(path, samplerate=22050, song_duration=20, songs=4):
+    """Write a stereo file of consecutive 'songs', each a different chord with noise."""
+    rng = np.random.default_rng(4)
+    time = np.arange(song_duration * samplerate) / samplerate
+    audio = []
+    for song in range(songs):
+        base = 110 * 2 ** (song * 5 / 12)
+        tone = sum(np.sin(2 * np.pi * base * ratio * time) for ratio in [1, 1.25, 1.5])
+        audio.append(0.2 * tone + 0.01 * rng.standard_normal(time.shape))
+    audio = np.concatenate(audio)
+    soundfile.write(path, np.stack((audio, audio), axis=1), samplerate)
+
+
+@pytest.mark.parametrize(
+    "feature_type", [FeatureType.SPECTRAL, FeatureType.ENERGY_FLUX]
+)
+def test_overlapping_feature_stream_matches_blocks(feature_type):
+    rng = np.random.default_rng(5)
+    hop_length = 256
+    block_len = 64
+    blocks = [
+        rng.standard_normal((2, block_len * hop_length)).astype(np.float32)
+        for _ in range(4)
+    ]
+    blocks.append(rng.standard_normal((2, 5000)).astype(np.float32))
+
+    streamed = list(
+        overlapping_feature_stream(iter(blocks), 22050, hop_length, feature_type)
+    )
+    expected = [
+        extract_feature(block, 22050, hop_length, feature_type)
+        for block in overlapping_stream(iter(blocks))
+    ]
+    assert len(streamed) == len(expected)
+    for idx, (window, feature) in enumerate(zip(streamed, expected)):
+        assert window.offset == idx * block_len * 0.25
+        assert np.allclose(window.feature, feature)
+
+
+def test_segment_file_stream_features(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+    streamed = list(segment_file(path, block_len=256))
+    per_block = list(segment_file(path, block_len=256, stream_features=False))
+    assert np.allclose(streamed, per_block)
+    assert len(streamed) > 1
+
+
+def test_segment_file_batch_size(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+    for preset in [Preset.NORMAL, Preset.EXTRA_LENIENT]:
+        expected = list(segment_file(path, preset, block_len=256))
+        for stream_features in [True, False]:
+            batched = list(
+                segment_file(
+                    path,
+                    preset,
+                    block_len=256,
+                    stream_features=stream_features,
+                    batch_size=4,
+                )
+            )
+            assert np.allclose(batched, expected)
+
+
+@pytest.mark.parametrize("samplerate", [22050, 44100])
+def test_segment_file_sharded(tmp_path, samplerate):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path, samplerate=samplerate, songs=6)
+    expected = list(segment_file(path, block_len=256))
+    assert len(expected) > 1
+    for workers, shard_blocks in [(1, 1), (1, 3), (2, None)]:
+        sharded = list(
+            segment_file_sharded(
+                path, block_len=256, workers=workers, shard_blocks=shard_blocks
+            )
+        )
+        assert np.allclose(sharded, expected)
+
+
+def test_select_peaks_without_peaks():
+    peaks = select_peaks(np.zeros(50), downsampling=8, offset=16)
+    assert peaks.size == 0
+    assert peaks.dtype.kind == "i"
+
+
+def test_preset_pickle():
+    for preset in Preset:
+        assert pickle.loads(pickle.dumps(preset)) is preset
+
+
+def test_segment_file_feature_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+    store = FeatureStore(str(tmp_path / "store"))
+    expected = list(segment_file(path, block_len=256))
+    expected_presets = [
+        list(segment_file(path, preset=preset, block_len=256))
+        for preset in [Preset.STRICT, Preset.LENIENT]
+    ]
+    assert list(segment_file(path, block_len=256, feature_store=store)) == expected
+    assert len(os.listdir(store.directory)) == 3
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the file should not be decoded again")
+
+    monkeypatch.setattr(segmentation, "read_audio_file_to_stream", fail)
+    assert list(segment_file(path, block_len=256, feature_store=store)) == expected
+    for preset, expected in zip([Preset.STRICT, Preset.LENIENT], expected_presets):
+        segments = segment_file(path, preset=preset, block_len=256, feature_store=store)
+        assert list(segments) == expected
+
+
+def test_segment_file_presets_matches_segment_file(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+    segments = segment_file_presets(path, block_len=256)
+    # the energy and harmonic presets need passes of their own, so they are only used if
+    # requested
+    assert list(segments) == list(SPECTRAL_PRESETS)
+    assert Preset.ENERGY_NORMAL not in SPECTRAL_PRESETS
+    assert Preset.HARMONIC not in SPECTRAL_PRESETS
+    for preset in SPECTRAL_PRESETS:
+        expected = list(segment_file(path, preset=preset, block_len=256))
+        assert np.allclose(segments[preset], expected)
+
+    subset = segment_file_presets(path, [Preset.NORMAL], block_len=256)
+    assert list(subset) == [Preset.NORMAL]
+    assert subset[Preset.NORMAL] == segments[Preset.NORMAL]
+
+
+@pytest.mark.filterwarnings("error::RuntimeWarning")
+@pytest.mark.parametrize(
+    "preset,max_refined_share",
+    [(Preset.NORMAL, 0.6), (Preset.LENIENT, 0.6), (Preset.EXTRA_LENIENT, 1)],
+)
+def test_segment_file_coarse_to_fine(tmp_path, preset, max_refined_share):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path, song_duration=40, songs=6)
+    stats = {}
+    segments = list(
+        segment_file_coarse_to_fine(path, preset, block_len=1024, stats=stats)
+    )
+    starts = [start for start, _ in segments]
+    assert np.allclose(starts, [0, 40, 80, 120, 160, 200], atol=1)
+    assert np.isclose(sum(segments[-1]), 240, atol=0.5)
+    assert 0 < stats["refined_share"] <= max_refined_share
+
+
+def test_self_similarity_builder_shared_stacked_window():
+    feature = np.random.default_rng(11).random((12, 1500)).astype(np.float32)
+    for preset in Preset:
+        builder = SelfSimilarityBuilder(
+            22050, preset.filter_length, preset.downsampling, band_width=16
+        )
+        shared = SelfSimilarityBuilder(
+            22050, preset.filter_length, preset.downsampling, band_width=16
+        )
+        for offset in range(0, 1000, 128):
+            window = feature[:, offset : offset + 512]
+            ssm, _ = builder.update(window, offset)
+            shared_ssm, _ = shared.update(window, offset, stacked=StackedWindow(window))
+            assert np.allclose(ssm.band, shared_ssm.band, atol=1e-5)
+
+
+def test_self_similarity_builder_matches_compute_self_similarity():
+    feature = np.random.default_rng(6).random((12, 1500))
+    for downsampling, filter_len, band_width, precision in [
+        (8, 41, 16, Precision.FLOAT64),
+        (2, 57, None, Precision.FLOAT64),
+        (4, 49, 16, Precision.FLOAT32),
+    ]:
+        builder = SelfSimilarityBuilder(
+            22050, filter_len, downsampling, band_width=band_width, precision=precision
+        )
+        for offset in [0, 128, 256, 384, 512, 1000, 1024]:
+            window = feature[:, offset : offset + 512]
+            built, built_sr = builder.update(window, offset)
+            expected, sr = compute_self_similarity(
+                window,
+                22050,
+                filter_len,
+                downsampling,
+                band_width=band_width,
+                precision=precision,
+            )
+            if band_width is not None:
+                built, expected = built.band, expected.band
+            assert built_sr == sr
+            assert np.allclose(built, expected)
+
+
+def test_self_similarity_builder_short_final_window():
+    feature = np.random.default_rng(6).random((12, 1500))
+    builder = SelfSimilarityBuilder(22050, 33, 16, band_width=16)
+    # the reused columns of the final window start beyond its end at the highest lags
+    for offset, length in [(0, 1024), (512, 100)]:
+        window = feature[:, offset : offset + length]
+        built, _ = builder.update(window, offset)
+        expected, _ = compute_self_similarity(window, 22050, 33, 16, band_width=16)
+        assert np.allclose(built.band, expected.band)
+
+
+def test_segment_file_stats(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+    stats = {}
+    prefetched = list(segment_file(path, block_len=256, stats=stats))
+    assert stats["decode_stall"] >= 0
+    assert stats["compute_stall"] >= 0
+    assert np.allclose(prefetched, list(segment_file(path, block_len=256, prefetch=0)))
+
+
+def test_transition_voter_matches_filter_peaks():
+    rng = np.random.default_rng(7)
+    offsets = np.arange(0, 4000, 100)
+    votes = [offset + rng.choice(np.arange(0, 400, 8), size=3) for offset in offsets]
+
+    voter = TransitionVoter(n=3)
+    streamed = []
+    for offset, peaks in zip(offsets, votes):
+        final = voter.finalize(before=offset)
+        assert all(transition < offset for transition in final)
+        streamed.extend(final)
+        voter.vote(peaks)
+    streamed.extend(voter.finalize())
+
+    assert streamed == list(filter_peaks(np.concatenate(votes), n=3))
+
+
+def test_transition_voter_waits_for_votes():
+    voter = TransitionVoter(n=2)
+    voter.vote([10, 20])
+    assert voter.finalize(before=10) == []
+    voter.vote([20])
+    assert voter.finalize(before=15) == []
+    assert voter.finalize(before=30) == [20]
+    assert voter.finalize() == []
+
+
+def test_segment_file_analysis_sample_rate(tmp_path):
+    native_path = str(tmp_path / "mix_22050.wav")
+    high_rate_path = str(tmp_path / "mix_48000.wav")
+    _write_synthetic_mix(native_path)
+    _write_synthetic_mix(high_rate_path, samplerate=48000)
+
+    native = list(segment_file(native_path, block_len=256))
+    resampled = list(segment_file(high_rate_path, block_len=256))
+    assert len(native) == len(resampled)
+    # times are in seconds of the original file, independent of its sample rate
+    assert np.allclose(native, resampled, atol=0.1)
+
+
+def test_precision_presets_keep_peaks(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path, songs=6)
+    audio, samplerate = soundfile.read(path, dtype="float32")
+    feature = extract_spectro(np.transpose(audio), samplerate, 1024)
+
+    reference = segment_feature_sequence(
+        feature, samplerate, threshold=0.4, precision=Precision.FLOAT64
+    )
+    assert len(reference) > 0
+    peaks = segment_feature_sequence(
+        feature, samplerate, threshold=0.4, precision=Precision.FLOAT32
+    )
+    assert np.array_equal(peaks, reference)
+
+
+def test_precision_presets_ssm_tolerance():
+    feature = np.random.default_rng(8).random((16, 600)).astype(np.float32)
+    reference, _ = compute_self_similarity(feature, 22050, precision=Precision.FLOAT64)
+    ssm, _ = compute_self_similarity(feature, 22050, precision=Precision.FLOAT32)
+    assert ssm.dtype == np.float32
+    assert np.allclose(ssm, reference, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "filter_len,downsampling", [(41, 8), (57, 2), (25, 32), (4, 3)]
+)
+def test_smooth_downsample_matches_convolution(filter_len, downsampling):
+    feature = np.random.default_rng(9).random((24, 1001))
+    smoothed, sr = smooth_downsample_feature_sequence(
+        feature, 22050, filter_len, downsampling
+    )
+    length = filter_len + 1 - filter_len % 2
+    kernel = np.ones((1, length))
+    expected = signal.convolve(feature, kernel, mode="same")[:, ::downsampling] / length
+    assert sr == 22050 / downsampling
+    assert smoothed.shape == expected.shape
+    assert np.allclose(smoothed, expected)
+
+
+@pytest.mark.parametrize("filter_len,downsampling", [(41, 8), (25, 32), (4, 3)])
+def test_median_downsample_matches_medfilt(filter_len, downsampling):
+    feature = np.random.default_rng(10).random((12, 777))
+    smoothed, sr = median_downsample_feature_sequence(
+        feature, 22050, filter_len, downsampling
+    )
+    length = filter_len + 1 - filter_len % 2
+    expected = signal.medfilt2d(feature, [1, length])[:, ::downsampling]
+    assert sr == 22050 / downsampling
+    assert np.array_equal(smoothed, expected)
+
+
+def test_extract_features_match_librosa():
+    audio = np.random.default_rng(12).standard_normal((2, 30000)).astype(np.float32)
+    mono = librosa.to_mono(audio)
+    mel = librosa.feature.melspectrogram(
+        y=mono, sr=22050, hop_length=512, center=False, n_fft=2048
+    )
+    chroma = librosa.feature.chroma_stft(
+        y=mono, sr=22050, hop_length=512, center=False, n_fft=2048
+    )
+    assert np.allclose(extract_spectro(audio, 22050, 512), mel)
+    assert np.allclose(extract_chroma(audio, 22050, 512), chroma)
+
+    stacked = extract_chroma_spectro(audio, 22050, 512)
+    assert stacked.shape == (12 + mel.shape[0], mel.shape[1])
+    assert np.allclose(stacked[:12], chroma)
+    assert np.allclose(stacked[12:], mel / np.max(mel, axis=0))
+    assert np.array_equal(
+        extract_feature(audio, 22050, 512, FeatureType.CHROMA_SPECTRAL), stacked
+    )
+
+
+def test_get_mel_filterbank_cached():
+    filterbank = get_mel_filterbank(22050, 2048)
+    assert filterbank is get_mel_filterbank(22050, 2048)
+    assert filterbank is not get_mel_filterbank(16000, 2048)
+    assert not filterbank.flags.writeable
+
+
+def test_silence_envelope():
+    rng = np.random.default_rng(13)
+    audio = np.concatenate(
+        [
+            0.2 * rng.standard_normal(1024),
+            1e-4 * rng.standard_normal(1024),
+            np.zeros(1024),
+            # a single click is not silent
+            np.eye(1, 1024, 500)[0] * 0.5,
+            np.zeros(100),
+        ]
+    )
+    silence = silence_envelope(audio, 256)
+    assert silence.tolist() == [False] * 4 + [True] * 8 + [True, False, True, True]
+
+
+def test_silence_gaps_across_windows():
+    silence = np.zeros(100, dtype=bool)
+    silence[:10] = True  # start of the file
+    silence[30:34] = True  # too short
+    silence[40:75] = True
+    silence[95:] = True  # end of the file
+    gaps = SilenceGaps(min_length=5)
+    found = []
+    for offset in range(0, 100, 10):
+        found += gaps.update(silence[offset : offset + 40], offset)
+        if gaps.pending is not None:
+            assert silence[gaps.pending]
+    assert found == [(40, 75)]
+    assert gaps.pending == 95
+
+
+def test_transition_voter_accept():
+    voter = TransitionVoter(n=1)
+    voter.vote([10, 48, 120])
+    voter.accept(60, 45, 80)
+    assert voter.finalize(before=50) == [10]
+    voter.vote([75, 90])
+    assert voter.finalize() == [60, 90, 120]
+
+
+def test_segment_file_silence_gaps(tmp_path, monkeypatch):
+    path = str(tmp_path / "gaps.wav")
+    rng = np.random.default_rng(14)
+    time = np.arange(20 * 22050) / 22050
+    parts = []
+    for song in range(3):
+        tone = np.sin(2 * np.pi * 110 * 2 ** (song * 5 / 12) * time)
+        parts.append(0.2 * tone + 0.01 * rng.standard_normal(time.shape))
+        # a near-silent gap of 20 seconds, e.g. between the sides of a record
+        parts.append(1e-4 * rng.standard_normal(time.shape))
+    soundfile.write(path, np.concatenate(parts[:-1]), 22050)
+
+    analysed = []
+    segment = segmentation.segment_feature_sequence
+
+    def count(feature, *args, **kwargs):
+        analysed.append(feature.shape[1])
+        return segment(feature, *args, **kwargs)
+
+    monkeypatch.setattr(segmentation, "segment_feature_sequence", count)
+    segments = list(segment_file(path, block_len=256))
+    starts = [start for start, _ in segments]
+    assert np.allclose(starts, [0, 30, 70], atol=0.5)
+    # windows in the middle of the gaps are skipped
+    stream, samplerate, hop_length = read_audio_file_to_stream(
+        path, block_len=256, analysis_sample_rate=22050
+    )
+    windows = list(
+        overlapping_feature_stream(stream, samplerate, hop_length, FeatureType.SPECTRAL)
+    )
+    assert len(analysed) < len(windows) - 8
+
+
+@pytest.mark.filterwarnings("error::RuntimeWarning")
+def test_segment_file_skips_constant_windows(tmp_path, monkeypatch):
+    path = str(tmp_path / "held.wav")
+    rng = np.random.default_rng(17)
+    time = np.arange(20 * 22050) / 22050
+    tone = 0.2 * np.sin(2 * np.pi * 220 * time) + 0.01 * rng.standard_normal(time.shape)
+    # a held sample, too loud to count as silence
+    held = np.full(40 * 22050, 0.3)
+    soundfile.write(path, np.concatenate((tone, held, tone)), 22050)
+
+    analysed = []
+    segment = segmentation.segment_feature_sequence
+
+    def count(feature, *args, **kwargs):
+        analysed.append(feature.shape[1])
+        return segment(feature, *args, **kwargs)
+
+    monkeypatch.setattr(segmentation, "segment_feature_sequence", count)
+    segments = list(segment_file(path, block_len=256))
+    assert np.isclose(sum(segments[-1]), 80, atol=0.5)
+    stream, samplerate, hop_length = read_audio_file_to_stream(
+        path, block_len=256, analysis_sample_rate=22050
+    )
+    windows = list(
+        overlapping_feature_stream(stream, samplerate, hop_length, FeatureType.SPECTRAL)
+    )
+    assert not any(segmentation._mostly_silent(window.silence) for window in windows)
+    assert len(analysed) < len(windows) - 8
+
+
+def test_extract_energy_flux():
+    audio = np.random.default_rng(15).standard_normal((2, 30000)).astype(np.float32)
+    feature = extract_energy_flux(audio, 22050, 512)
+    assert feature.dtype == np.float32
+    assert feature.shape == (2, extract_spectro(audio, 22050, 512).shape[1])
+    frames = librosa.util.frame(
+        librosa.to_mono(audio), frame_length=2048, hop_length=512
+    )
+    energy = 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=0))
+    assert np.allclose(feature[0], energy, atol=1e-4)
+    assert np.array_equal(
+        extract_feature(audio, 22050, 512, FeatureType.ENERGY_FLUX), feature
+    )
+    assert extract_energy_flux(audio[:, :1000], 22050, 512).shape == (2, 0)
+
+
+def test_segment_energy_flux_sequence():
+    loudness = np.full(1500, -15.0)
+    loudness[500:560] = -45  # a gap
+    loudness[1000:1060] = -20  # a quiet passage
+    feature = np.stack((loudness, loudness + 1)).astype(np.float32)
+    peaks = segment_energy_flux_sequence(
+        feature, 22050, 1024, threshold=0.5, offset=100
+    )
+    assert len(peaks) == 1
+    assert 600 <= peaks[0] < 660
+    # transitions lie on the grid of the downsampled frames
+    assert (peaks[0] - 100) % 8 == 0
+    assert len(segment_energy_flux_sequence(feature[:, :0], 22050, 1024)) == 0
+
+    # the surroundings the frames are compared to cover the same time at any hop length,
+    # so a long gap is one dip, whose middle lies less than half of them from its edges
+    loudness = np.full(3000, -15.0)
+    loudness[1000:1280] = -45
+    feature = np.stack((loudness, loudness + 1)).astype(np.float32)
+    assert segment_energy_flux_sequence(feature, 22050, 1024).tolist() == [1024]
+    stretched = np.repeat(feature, 2, axis=1)
+    assert segment_energy_flux_sequence(stretched, 22050, 512).tolist() == [2024]
+
+
+def test_segment_file_energy_preset(tmp_path):
+    path = str(tmp_path / "gaps.wav")
+    rng = np.random.default_rng(16)
+    time = np.arange(20 * 22050) / 22050
+    parts = []
+    for song in range(3):
+        tone = np.sin(2 * np.pi * 110 * 2 ** (song * 5 / 12) * time)
+        parts.append(0.2 * tone + 0.01 * rng.standard_normal(time.shape))
+        # 3 seconds of noise, too loud to count as silence
+        parts.append(0.01 * rng.standard_normal(3 * 22050))
+    soundfile.write(path, np.concatenate(parts[:-1]), 22050)
+
+    segments = list(segment_file(path, Preset.ENERGY_NORMAL, block_len=256))
+    starts = [start for start, _ in segments]
+    assert np.allclose(starts, [0, 21.5, 44.5], atol=1)
+    assert segment_file_presets(path, [Preset.ENERGY_NORMAL], block_len=256) == {
+        Preset.ENERGY_NORMAL: segments
+    }
+
+
+def test_segment_file_harmonic_preset(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+    segments = list(segment_file(path, Preset.HARMONIC, block_len=256))
+    starts = [start for start, _ in segments]
+    assert np.allclose(starts, [0, 20, 40, 60], atol=1)
+
+    store = FeatureStore(str(tmp_path / "features"))
+    for _ in range(2):
+        stored = segment_file(path, Preset.HARMONIC, block_len=256, feature_store=store)
+        assert list(stored) == segments
+    presets = segment_file_presets(
+        path, [Preset.NORMAL, Preset.HARMONIC], block_len=256
+    )
+    assert presets[Preset.HARMONIC] == segments
+    assert presets[Preset.NORMAL] == list(segment_file(path, block_len=256))
+
+
+def test_transition_voter_tolerance():
+    voter = TransitionVoter(n=3, tolerance=4)
+    voter.vote([100, 300])
+    voter.vote([103, 200])
+    voter.vote([103])
+    # a vote at 106 could still count for the transition at 103
+    assert voter.finalize(before=106) == []
+    voter.vote([110, 306])
+    assert voter.finalize(before=150) == [103]
+    assert voter.finalize() == []
+
+
+def test_track_beats():
+    rng = np.random.default_rng(17)
+    envelope = 0.1 * rng.random(2000)
+    envelope[5::12] += 1
+    assert track_beats(envelope, 22050, 1024).tolist() == list(range(5, 2000, 12))
+    # every beat only depends on its surroundings
+    beats = track_beats(envelope[600:1400], 22050, 1024)
+    assert beats.tolist() == list(range(5, 800, 12))
+    assert len(track_beats(envelope[:20], 22050, 1024)) == 0
+
+    # the tempo range is the same at any hop length: at half the hop length, beats 12 frames
+    # apart are too fast, so every second one is taken
+    envelope[5::24] += 1
+    beats = track_beats(envelope, 22050, 512)
+    assert beats.tolist() == list(range(5, 2000, 24))
+
+
+def test_beat_sync_feature_sequence():
+    rng = np.random.default_rng(18)
+    feature = 0.1 * rng.random((16, 1000), dtype=np.float32)
+    feature[:, 3::10] += 1
+    synced, beat_frames = beat_sync_feature_sequence(feature, 22050, 1024)
+    assert synced.dtype == np.float32
+    assert beat_frames[0] == 0
+    assert synced.shape == (16, len(beat_frames))
+    assert np.allclose(np.diff(beat_frames[1:]), 10)
+    bounds = np.append(beat_frames, 1000)
+    for column, (start, stop) in enumerate(pairwise(bounds)):
+        assert np.allclose(synced[:, column], np.mean(feature[:, start:stop], axis=1))
+
+
+def test_segment_beat_sequence():
+    rng = np.random.default_rng(19)
+    beat_seq = rng.random((16, 200))
+    beat_seq[:, 100:] = rng.random((16, 1)) + 0.01 * rng.random((16, 100))
+    beat_frames = np.arange(0, 2000, 10)
+    peaks = segment_beat_sequence(beat_seq, beat_frames, 22050, offset=7)
+    assert len(peaks) > 0
+    assert all((peak - 7) in beat_frames for peak in peaks)
+
+
+def _write_drum_mix(path, tempi=(120, 150, 135), song_duration=30, samplerate=22050):
+    """Write a mono file of 'songs', each a tone with a noise burst on every beat."""
+    rng = np.random.default_rng(20)
+    time = np.arange(song_duration * samplerate) / samplerate
+    decay = np.exp(-np.arange(2000) / 300)
+    parts = []
+    for song, tempo in enumerate(tempi):
+        tone = np.sin(2 * np.pi * 110 * 2 ** (song * 5 / 12) * time)
+        drums = np.zeros_like(time)
+        for beat in np.arange(0, len(time), samplerate * 60 / tempo).astype(int):
+            hit = decay[: len(time) - beat]
+            drums[beat : beat + len(hit)] += hit * rng.standard_normal(len(hit))
+        parts.append(0.2 * tone + 0.3 * drums + 0.01 * rng.standard_normal(time.shape))
+    soundfile.write(path, np.concatenate(parts), samplerate)
+
+
+def test_segment_file_beat_sync(tmp_path):
+    path = str(tmp_path / "drums.wav")
+    _write_drum_mix(path)
+
+    segments = list(segment_file(path, block_len=256, beat_sync=True))
+    starts = [start for start, _ in segments]
+    assert np.allclose(starts, [0, 30, 60], atol=1.5)
+    presets = [Preset.STRICT, Preset.NORMAL]
+    assert segment_file_presets(path, presets, block_len=256, beat_sync=True) == {
+        preset: list(segment_file(path, preset, block_len=256, beat_sync=True))
+        for preset in presets
+    }
+
+
+def _cosine_similarity(feature):
+    feature = feature / np.linalg.norm(feature, axis=0)
+    return np.transpose(feature) @ feature
+
+
+def test_feature_projection():
+    rng = np.random.default_rng(21)
+    # 128 bands, but only 4 independent spectra
+    feature = (rng.random((128, 4)) @ rng.random((4, 500))).astype(np.float32)
+    other = (rng.random((128, 4)) @ rng.random((4, 300))).astype(np.float32)
+
+    assert FeatureProjection(Projection.NONE)(feature) is feature
+    assert FeatureProjection(dim=200)(feature) is feature
+
+    random = FeatureProjection(Projection.RANDOM, dim=16)
+    projected = random(feature)
+    assert projected.shape == (16, 500)
+    assert projected.dtype == np.float32
+    assert np.array_equal(
+        FeatureProjection(Projection.RANDOM, dim=16)(other), random(other)
+    )
+
+    pca = FeatureProjection(Projection.PCA, dim=4)
+    projected = pca(feature)
+    assert projected.shape == (4, 500)
+    assert np.allclose(
+        _cosine_similarity(projected), _cosine_similarity(feature), atol=1e-4
+    )
+    # the fit is kept for all further windows
+    matrix = pca._matrix
+    pca(other)
+    assert pca._matrix is matrix
+
+
+def test_segment_file_projection(tmp_path):
+    path = str(tmp_path / "mix.wav")
+    _write_synthetic_mix(path)
+
+    expected = [start for start, _ in segment_file(path, block_len=256)]
+    options = {"block_len": 256, "projection": Projection.PCA, "projection_dim": 32}
+    starts = [start for start, _ in segment_file(path, **options)]
+    assert all(np.min(np.abs(np.subtract(starts, start))) < 1 for start in expected)
+    presets = [Preset.STRICT, Preset.NORMAL]
+    assert segment_file_presets(path, presets, **options) == {
+        preset: list(segment_file(path, preset, **options)) for preset in presets
+    }
@@ -0,0 +1,59 @@
+import base64
+
+import numpy as np
+import soundfile
+from modules.apis import shazam
+from modules.audio_stream_io import AudioSegment, read_audio_file_to_numpy
+
+
+class _Response:
+    def json(self):
+        return {}
+
+
+def _sent_segments(monkeypatch):
+    sent = []
+
+    def send_lookup_request(payload, apikey):
+        sent.append(np.frombuffer(base64.b64decode(payload), dtype="<i2"))
+        return _Response()
+
+    monkeypatch.setattr(shazam, "_send_lookup_request", send_lookup_request)
+    return sent
+
+
+def test_lookup_offsets():
+    second = shazam.SAMPLE_RATE
+    assert list(shazam._lookup_offsets(25 * second, True)) == [
+        0,
+        10 * second,
+        20 * second,
+    ]
+    assert list(shazam._lookup_offsets(25 * second, False)) == [
+        -4 * second,
+        -14 * second,
+        -24 * second,
+    ]
+    # the first segment is looked up even if the song is shorter
+    assert list(shazam._lookup_offsets(2 * second, False)) == [-4 * second]
+
+
+def test_lookup_segment_sends_same_segments_as_lookup(tmp_path, monkeypatch):
+    path = str(tmp_path / "noise.wav")
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.1 * rng.standard_normal((44100 * 40, 2)), 44100)
+    sent = _sent_segments(monkeypatch)
+
+    song_data, _ = read_audio_file_to_numpy(
+        path, offset=1.5, duration=33, sample_rate=44100
+    )
+    for from_start, windows in [(True, 4), (False, 3)]:
+        assert shazam.lookup(song_data, "key", from_start) is None
+        expected = list(sent)
+        sent.clear()
+        with AudioSegment(path, 1.5, 33) as segment:
+            assert shazam.lookup_segment(segment, "key", from_start) is None
+        assert len(sent) == len(expected) == windows
+        for segment_data, expected_data in zip(sent, expected):
+            assert np.array_equal(segment_data, expected_data)
+        sent.clear()
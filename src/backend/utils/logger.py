@@ -1,4 +1,4 @@
-"""The logger module provides wrapper functions to log errors and warnings."""
+"""The logger module provides wrapper functions to log errors, warnings and information."""
 
 from flask import current_app as app
 
@@ -18,3 +18,11 @@ def log_warning(message: str):
     :param message: The warning message.
     """
     app.logger.warning(f"Warning: {message}")
+
+
+def log_info(message: str):
+    """Log an informational message.
+
+    :param message: The message.
+    """
+    app.logger.info(message)
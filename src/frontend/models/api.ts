@@ -36,6 +36,44 @@ export interface PostAudioGetSegmentBody {
   duration?: number
 }
 
+export interface PostAudioSplitPresets200PresetsItem {
+  offset?: number
+  duration?: number
+}
+
+/**
+ * The segments for every requested preset, by preset name.
+ */
+export type PostAudioSplitPresets200Presets = { [key: string]: PostAudioSplitPresets200PresetsItem[] }
+
+export interface PostAudioSplitPresets200 {
+  /** The segments for every requested preset, by preset name. */
+  presets?: PostAudioSplitPresets200Presets
+}
+
+export type PostAudioSplitPresetsBodyPresetNamesItem = typeof PostAudioSplitPresetsBodyPresetNamesItem[keyof typeof PostAudioSplitPresetsBodyPresetNamesItem]
+
+// eslint-disable-next-line @typescript-eslint/no-redeclare
+export const PostAudioSplitPresetsBodyPresetNamesItem = {
+  EXTRA_STRICT: 'EXTRA_STRICT',
+  STRICT: 'STRICT',
+  NORMAL: 'NORMAL',
+  LENIENT: 'LENIENT',
+  EXTRA_LENIENT: 'EXTRA_LENIENT',
+  ENERGY_STRICT: 'ENERGY_STRICT',
+  ENERGY_NORMAL: 'ENERGY_NORMAL',
+  ENERGY_LENIENT: 'ENERGY_LENIENT',
+  HARMONIC: 'HARMONIC',
+} as const
+
+export interface PostAudioSplitPresetsBody {
+  filePath: string
+  /** The presets to split the file with. Defaults to all presets except the energy and harmonic presets, which need analysis passes of their own. */
+  presetNames?: PostAudioSplitPresetsBodyPresetNamesItem[]
+  /** Whether to aggregate the features per beat before comparing them. Ignored for the energy presets. Defaults to false. */
+  beatSync?: boolean
+}
+
 export interface PostAudioSplit200SegmentsItem {
   offset?: number
   duration?: number
@@ -57,11 +95,19 @@ export const PostAudioSplitBodyPresetName = {
   NORMAL: 'NORMAL',
   LENIENT: 'LENIENT',
   EXTRA_LENIENT: 'EXTRA_LENIENT',
+  ENERGY_STRICT: 'ENERGY_STRICT',
+  ENERGY_NORMAL: 'ENERGY_NORMAL',
+  ENERGY_LENIENT: 'ENERGY_LENIENT',
+  HARMONIC: 'HARMONIC',
 } as const
 
 export interface PostAudioSplitBody {
   filePath: string
   presetName?: PostAudioSplitBodyPresetName
+  /** Whether to segment the file in a cheap coarse pass first and only analyse the regions around its candidates at full resolution. Meant for long recordings. Defaults to false. */
+  coarseToFine?: boolean
+  /** Whether to aggregate the features per beat before comparing them, which makes the analysis cheaper for music with a clear beat. Cannot be combined with coarseToFine. Ignored for the energy presets. Defaults to false. */
+  beatSync?: boolean
 }
 
 export interface Metadata {
@@ -87,6 +133,18 @@ export function getAudioStreamSplittingAPI() {
     )
   }
 
+  /**
+   * @summary Split the file at the given file location with several presets at once, without identifying the segments.
+   */
+  const postAudioSplitPresets = <TData = AxiosResponse<PostAudioSplitPresets200>>(
+    postAudioSplitPresetsBody: PostAudioSplitPresetsBody, options?: AxiosRequestConfig,
+  ): Promise<TData> => {
+    return axios.post(
+      '/audio/split-presets',
+      postAudioSplitPresetsBody, options,
+    )
+  }
+
   /**
    * @summary Get the given segment for the given file.
    */
@@ -114,8 +172,9 @@ export function getAudioStreamSplittingAPI() {
     )
   }
 
-  return { postAudioSplit, postAudioGetSegment, postAudioStore }
+  return { postAudioSplit, postAudioSplitPresets, postAudioGetSegment, postAudioStore }
 }
 export type PostAudioSplitResult = AxiosResponse<PostAudioSplit200>
+export type PostAudioSplitPresetsResult = AxiosResponse<PostAudioSplitPresets200>
 export type PostAudioGetSegmentResult = AxiosResponse<Blob>
 export type PostAudioStoreResult = AxiosResponse<PostAudioStore200>